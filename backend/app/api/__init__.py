@@ -1,7 +1,7 @@
 """
 api模块初始化
 """
-from .routes import photos_router, ai_router, summary_router, export_router
+from .routes import photos_router, ai_router, summary_router, export_router, thumbs_router, jobs_router, dedup_router
 from .schemas import *
 
 __all__ = [
@@ -9,4 +9,7 @@ __all__ = [
     "ai_router", 
     "summary_router",
     "export_router",
+    "thumbs_router",
+    "jobs_router",
+    "dedup_router",
 ]
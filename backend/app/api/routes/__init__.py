@@ -5,10 +5,16 @@ from .photos import router as photos_router
 from .ai import router as ai_router
 from .summary import router as summary_router
 from .export import router as export_router
+from .thumbs import router as thumbs_router
+from .jobs import router as jobs_router
+from .dedup import router as dedup_router
 
 __all__ = [
     "photos_router",
     "ai_router",
     "summary_router",
     "export_router",
+    "thumbs_router",
+    "jobs_router",
+    "dedup_router",
 ]
@@ -5,7 +5,8 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
-from ...db import get_db
+from ...db import get_db, ClassificationCacheRepository
+from ...core.executors import run_heavy
 from ...services import AIService
 from ..schemas import ApiResponse, ClassifyRequest
 
@@ -20,8 +21,10 @@ async def classify_photos(request: ClassifyRequest, db: Session = Depends(get_db
     对指定照片进行AI分类
     - 使用多模态大模型识别图片内容
     - 自动分配类别和标签
-    - 支持并发处理（4线程）
+    - 异步并发请求（共享连接，按服务商配置限速和并发上限）
     - 可选跳过已分类照片
+    - 连拍模式（cluster_bursts）：连拍组只分类代表照片，结果复制给组内其他照片
+    - 分类后端（backend）：remote远程AI、local本地CPU预分类、hybrid本地优先+低置信度交给远程AI
     """
     logger.info(f"收到分类请求: photo_ids={request.photo_ids[:5] if len(request.photo_ids) > 5 else request.photo_ids}... (共{len(request.photo_ids)}个)")
     try:
@@ -29,10 +32,13 @@ async def classify_photos(request: ClassifyRequest, db: Session = Depends(get_db
             return ApiResponse(data=None, message="请先选择要分类的照片", error="未选择照片")
         
         ai_service = AIService(db)
-        result = ai_service.classify_photos(
+        result = await run_heavy(
+            ai_service.classify_photos,
             photo_ids=request.photo_ids,
             max_workers=request.max_workers,
             skip_classified=request.skip_classified,
+            cluster_bursts=request.cluster_bursts,
+            backend=request.backend,
         )
         return ApiResponse(data=result, message=result.get("message", "分类完成"))
     except Exception as e:
@@ -46,8 +52,21 @@ async def classify_photos(request: ClassifyRequest, db: Session = Depends(get_db
 
 
 @router.get("/categories", response_model=ApiResponse, summary="获取可用类别列表")
-async def get_categories(db: Session = Depends(get_db)):
+def get_categories(db: Session = Depends(get_db)):
     """获取所有可用的照片类别"""
     ai_service = AIService(db)
     categories = ai_service.get_categories()
     return ApiResponse(data=categories, message="获取成功")
+
+
+@router.get("/cache", response_model=ApiResponse, summary="AI分类缓存统计")
+def get_cache_stats(db: Session = Depends(get_db)):
+    """缓存条数、累计命中次数，以及本次服务运行以来的命中/未命中计数"""
+    return ApiResponse(data=ClassificationCacheRepository(db).get_stats(), message="获取成功")
+
+
+@router.delete("/cache", response_model=ApiResponse, summary="清空AI分类缓存")
+def clear_cache(db: Session = Depends(get_db)):
+    """清空缓存（下次分类将重新调用AI）"""
+    deleted = ClassificationCacheRepository(db).clear()
+    return ApiResponse(data={"deleted": deleted}, message=f"已清空 {deleted} 条缓存")
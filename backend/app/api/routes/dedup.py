@@ -0,0 +1,66 @@
+"""
+近似重复/连拍检测API路由
+"""
+import asyncio
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from ...db import get_db
+from ...services.dedup_service import DedupService
+from ...services.job_service import get_job_manager
+from ..schemas import ApiResponse
+
+
+router = APIRouter(prefix="/dedup", tags=["近似重复检测"])
+
+
+@router.get("/clusters", response_model=ApiResponse, summary="近似重复照片组")
+async def list_clusters(
+    max_distance: Optional[int] = Query(None, ge=0, le=7, description="感知哈希汉明距离阈值（默认使用配置）"),
+    date_from: Optional[datetime] = Query(None, description="开始日期"),
+    date_to: Optional[datetime] = Query(None, description="结束日期"),
+    min_size: int = Query(2, ge=2, description="最少成员数"),
+    bursts_only: bool = Query(False, description="只返回连拍组"),
+    offset: int = Query(0, ge=0, description="跳过的组数"),
+    limit: int = Query(100, ge=1, le=1000, description="返回的组数"),
+    db: Session = Depends(get_db),
+):
+    """
+    按感知哈希查找近似重复照片组（连拍、重复导出的JPG等）
+    - 组按成员数从多到少排列，组内照片按拍摄时间排序
+    - representative_id 为组内与其他照片最相似的一张
+    - 只读取后台任务保存的分组（POST /dedup/clusters 重新计算）；
+      computed_at 为空表示尚未计算，stale 为true表示计算后照片有变化
+    """
+    try:
+        result = await asyncio.to_thread(
+            DedupService(db).find_clusters,
+            max_distance=max_distance,
+            date_from=date_from,
+            date_to=date_to,
+            min_size=min_size,
+            bursts_only=bursts_only,
+            offset=offset,
+            limit=limit,
+        )
+        return ApiResponse(data=result, message=f"找到 {result['total_clusters']} 组近似重复照片")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/clusters", response_model=ApiResponse, summary="重新计算近似重复照片组")
+async def compute_clusters(
+    max_distance: Optional[int] = Query(None, ge=0, le=7, description="感知哈希汉明距离阈值（默认使用配置）"),
+):
+    """对全部照片重新分组并保存（后台任务，进度见 /jobs/{job_id}）"""
+    job = await asyncio.to_thread(get_job_manager().submit, "dedup_clusters", {"max_distance": max_distance})
+    return ApiResponse(data=job, message="任务已创建")
+
+
+@router.post("/backfill", response_model=ApiResponse, summary="补算感知哈希")
+async def backfill_hashes():
+    """为旧版本导入、没有感知哈希的照片补算（后台任务，进度见 /jobs/{job_id}）"""
+    job = await asyncio.to_thread(get_job_manager().submit, "dedup_backfill", {})
+    return ApiResponse(data=job, message="任务已创建")
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 
 from ...db import get_db
 from ...services import ExportService
+from ...core.executors import run_heavy
 from ..schemas import ApiResponse, ExportRequest
 
 
@@ -21,7 +22,8 @@ async def export_selected(request: ExportRequest, db: Session = Depends(get_db))
     """
     try:
         export_service = ExportService(db)
-        result = export_service.export_selected(
+        result = await run_heavy(
+            export_service.export_selected,
             export_dir=request.export_dir,
             include_raw=request.include_raw,
             as_zip=request.as_zip,
@@ -0,0 +1,147 @@
+"""
+后台任务API路由
+扫描、整理、导出、AI分类以后台任务方式执行，接口立即返回任务ID
+"""
+import json
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from ...core.config import get_settings
+from ...services import ScannerService
+from ...services.job_service import get_job_manager, JOB_HANDLERS
+from ..schemas import (
+    ApiResponse,
+    ScanRequest,
+    ImportRequest,
+    ExportRequest,
+    ClassifyRequest,
+)
+
+
+router = APIRouter(prefix="/jobs", tags=["后台任务"])
+
+
+async def _submit(job_type: str, params: dict) -> ApiResponse:
+    """创建任务（写库操作放到线程中执行，不阻塞事件循环）"""
+    job = await asyncio.to_thread(get_job_manager().submit, job_type, params)
+    return ApiResponse(data=job, message="任务已创建")
+
+
+@router.post("/scan", response_model=ApiResponse, summary="创建扫描任务")
+async def create_scan_job(request: ScanRequest):
+    """
+    后台扫描目录
+    - 进度通过 GET /jobs/{job_id}/events（SSE）获取
+    - 结果只包含统计和 photo_ids，不返回完整照片列表
+    """
+    try:
+        ScannerService.check_directory(request.sd_path)
+    except ValueError as e:
+        return ApiResponse(data=None, message=str(e), error=str(e))
+    return await _submit("scan", request.model_dump(mode="json"))
+
+
+@router.post("/organize", response_model=ApiResponse, summary="创建整理任务")
+async def create_organize_job(request: ImportRequest):
+    """后台整理照片到本地图库"""
+    return await _submit("organize", request.model_dump(mode="json"))
+
+
+@router.post("/export", response_model=ApiResponse, summary="创建导出任务")
+async def create_export_job(request: ExportRequest):
+    """后台导出精选照片"""
+    return await _submit("export", request.model_dump(mode="json"))
+
+
+@router.post("/classify", response_model=ApiResponse, summary="创建AI分类任务")
+async def create_classify_job(request: ClassifyRequest):
+    """后台AI分类照片"""
+    if not request.photo_ids:
+        return ApiResponse(data=None, message="请先选择要分类的照片", error="未选择照片")
+    return await _submit("classify", request.model_dump(mode="json"))
+
+
+@router.get("", response_model=ApiResponse, summary="任务列表")
+async def list_jobs(
+    job_type: Optional[str] = Query(None, description="任务类型筛选"),
+    limit: int = Query(50, ge=1, le=200, description="返回数量"),
+):
+    """最近的任务（不含结果）"""
+    if job_type and job_type not in JOB_HANDLERS:
+        raise HTTPException(status_code=400, detail=f"未知的任务类型: {job_type}")
+    jobs = await asyncio.to_thread(get_job_manager().list_jobs, limit, job_type)
+    return ApiResponse(data=jobs)
+
+
+@router.get("/{job_id}", response_model=ApiResponse, summary="查询任务状态")
+async def get_job(job_id: str):
+    """任务状态和进度（不含结果）"""
+    job = await asyncio.to_thread(get_job_manager().get, job_id, False)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return ApiResponse(data=job)
+
+
+@router.get("/{job_id}/result", response_model=ApiResponse, summary="获取任务结果")
+async def get_job_result(job_id: str):
+    """任务结果（任务未结束时 data.result 为空）"""
+    job = await asyncio.to_thread(get_job_manager().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    result = job.get("result") or {}
+    return ApiResponse(data=job, message=result.get("message", job["status"]))
+
+
+@router.post("/{job_id}/cancel", response_model=ApiResponse, summary="取消任务")
+async def cancel_job(job_id: str):
+    """
+    取消任务
+    - 排队中的任务不再执行
+    - 运行中的扫描会停止并保留已入库的照片；其他运行中的任务无法中途取消
+    """
+    if not get_job_manager().cancel(job_id):
+        job = await asyncio.to_thread(get_job_manager().get, job_id, False)
+        if job is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        return ApiResponse(data=job, message="任务已结束")
+    return ApiResponse(data=get_job_manager().live_status(job_id), message="已请求取消任务")
+
+
+@router.get("/{job_id}/events", summary="任务进度推送（SSE）")
+async def job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events 推送任务进度
+    - progress 事件：任务状态与进度（扫描任务含各阶段计数、吞吐量、预计剩余时间）
+    - done 事件：任务结束，附带结果，随后关闭连接
+    """
+    manager = get_job_manager()
+    if manager.live_status(job_id) is None:
+        job = await asyncio.to_thread(manager.get, job_id, False)
+        if job is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+
+    interval = get_settings().job_progress_interval
+
+    def sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+    async def event_stream():
+        # 运行中只读内存状态，不访问数据库
+        while True:
+            live = manager.live_status(job_id)
+            if live is None:
+                break
+            if await request.is_disconnected():
+                return
+            yield sse("progress", live)
+            await asyncio.sleep(interval)
+        job = await asyncio.to_thread(manager.get, job_id)
+        yield sse("done", job)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,18 +1,23 @@
 """
 照片相关API路由
 包含：扫描、导入、查询、更新、删除
+普通接口为同步函数（在线程池中执行），扫描/整理等耗时操作通过 run_heavy 分派到独立线程池
 """
 import os
 from typing import Optional
 from datetime import datetime
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 
-from ...db import get_db, PhotosRepository
+from ...db import get_db, PhotosRepository, PhotoProjection
 from ...services import ScannerService, OrganizerService
 from ...core.config import get_settings
+from ...core.executors import run_heavy
+from ...core.fast_json import api_json_response
+from ...core.thumbs import thumb_filename, thumb_exists, delete_thumbs, get_thumb_store
+from .thumbs import thumb_response
 from ..schemas import (
     ApiResponse,
     ScanRequest,
@@ -38,7 +43,7 @@ async def scan_directory(request: ScanRequest, db: Session = Depends(get_db)):
     """
     try:
         scanner = ScannerService(db)
-        result = scanner.scan_directory(request.sd_path)
+        result = await run_heavy(scanner.scan_directory, request.sd_path)
         return ApiResponse(data=result, message=result.get("message", "扫描完成"))
     except ValueError as e:
         return ApiResponse(data=None, message=str(e), error=str(e))
@@ -53,7 +58,7 @@ async def scan_preview(request: ScanPreviewRequest, db: Session = Depends(get_db
     """
     try:
         scanner = ScannerService(db)
-        result = scanner.get_scan_preview(request.sd_path)
+        result = await run_heavy(scanner.get_scan_preview, request.sd_path)
         return ApiResponse(data=result, message="预览完成")
     except Exception as e:
         return ApiResponse(data=None, message=str(e), error=str(e))
@@ -69,7 +74,8 @@ async def import_to_library(request: ImportRequest, db: Session = Depends(get_db
     """
     try:
         organizer = OrganizerService(db)
-        result = organizer.organize_to_library(
+        result = await run_heavy(
+            organizer.organize_to_library,
             library_root=request.library_root,
             photo_ids=request.photo_ids,
             date_from=request.date_from,
@@ -81,9 +87,10 @@ async def import_to_library(request: ImportRequest, db: Session = Depends(get_db
 
 
 @router.get("", response_model=ApiResponse, summary="查询照片列表")
-async def list_photos(
+def list_photos(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(50, ge=1, le=200, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的next_cursor，传空字符串取第一页"),
     date_from: Optional[datetime] = Query(None, description="开始日期"),
     date_to: Optional[datetime] = Query(None, description="结束日期"),
     category: Optional[str] = Query(None, description="类别筛选"),
@@ -92,29 +99,58 @@ async def list_photos(
     focal_max: Optional[float] = Query(None, description="最大焦距"),
     iso_min: Optional[int] = Query(None, description="最小ISO"),
     iso_max: Optional[int] = Query(None, description="最大ISO"),
+    fields: Optional[str] = Query(None, description="返回字段：逗号分隔的字段名，或预设 grid（网格所需字段）/full（默认，全部字段）"),
     db: Session = Depends(get_db),
 ):
     """
     分页查询照片列表，支持多种筛选条件
+    - 默认按页码分页（可跳页，深页较慢）
+    - 传入 cursor 时使用游标分页：按 (拍摄时间, id) 从上一页末尾继续，任意深度与第一页一样快；
+      返回 next_cursor（没有更多时为null），total 为缓存的总数
+    - 只查询 fields 所需的列并直接序列化结果行（不创建ORM对象），网格浏览传 fields=grid 可减小响应
     """
+    filters = dict(
+        date_from=date_from,
+        date_to=date_to,
+        category=category,
+        is_selected=is_selected,
+        focal_min=focal_min,
+        focal_max=focal_max,
+        iso_min=iso_min,
+        iso_max=iso_max,
+    )
+    try:
+        projection = PhotoProjection.parse(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         repo = PhotosRepository(db)
-        photos, total = repo.list_photos(
-            page=page,
-            page_size=page_size,
-            date_from=date_from,
-            date_to=date_to,
-            category=category,
-            is_selected=is_selected,
-            focal_min=focal_min,
-            focal_max=focal_max,
-            iso_min=iso_min,
-            iso_max=iso_max,
-        )
         
-        return ApiResponse(
+        if cursor is not None:
+            try:
+                rows, next_cursor = repo.list_photos_keyset(
+                    cursor=cursor or None, page_size=page_size, columns=projection.columns, **filters
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            total = repo.count_photos_cached(**filters)
+            return api_json_response(
+                data={
+                    "photos": projection.to_dicts(rows),
+                    "total": total,
+                    "page_size": page_size,
+                    "next_cursor": next_cursor,
+                    "has_more": next_cursor is not None,
+                },
+                message=f"查询到 {len(rows)} 张照片"
+            )
+        
+        rows, total = repo.list_photos(page=page, page_size=page_size, columns=projection.columns, **filters)
+        
+        return api_json_response(
             data={
-                "photos": [p.to_dict() for p in photos],
+                "photos": projection.to_dicts(rows),
                 "total": total,
                 "page": page,
                 "page_size": page_size,
@@ -122,12 +158,14 @@ async def list_photos(
             },
             message=f"查询到 {total} 张照片"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/{photo_id}", response_model=ApiResponse, summary="获取单张照片详情")
-async def get_photo(photo_id: int, db: Session = Depends(get_db)):
+def get_photo(photo_id: int, db: Session = Depends(get_db)):
     """获取单张照片的详细信息"""
     repo = PhotosRepository(db)
     photo = repo.get_by_id(photo_id)
@@ -139,7 +177,7 @@ async def get_photo(photo_id: int, db: Session = Depends(get_db)):
 
 
 @router.patch("/{photo_id}", response_model=ApiResponse, summary="更新照片信息")
-async def update_photo(
+def update_photo(
     photo_id: int,
     request: PhotoUpdateRequest,
     db: Session = Depends(get_db),
@@ -172,32 +210,33 @@ async def update_photo(
 
 
 @router.get("/categories/list", response_model=ApiResponse, summary="获取所有类别")
-async def get_categories(db: Session = Depends(get_db)):
+def get_categories(db: Session = Depends(get_db)):
     """获取所有可用的照片类别"""
     from ...services.ai_service import CATEGORIES
     return ApiResponse(data=CATEGORIES, message="获取成功")
 
 
 @router.delete("/batch", response_model=ApiResponse, summary="批量删除照片")
-async def batch_delete_photos(request: BatchDeleteRequest, db: Session = Depends(get_db)):
+def batch_delete_photos(
+    request: BatchDeleteRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
     """
     批量删除照片记录
     - 仅删除数据库记录和缩略图
     - 不会删除原始文件
+    - 打包缩略图存储中死数据过多时，在后台压缩回收空间
     """
     try:
         repo = PhotosRepository(db)
         result = repo.batch_delete_photos(request.photo_ids)
         
-        # 删除缩略图文件
-        settings = get_settings()
+        # 删除缩略图文件（所有变体）
         for sha1 in result.get("sha1_list", []):
-            thumb_path = settings.thumbs_path / f"{sha1}.jpg"
-            if thumb_path.exists():
-                try:
-                    thumb_path.unlink()
-                except Exception:
-                    pass
+            delete_thumbs(sha1)
+        
+        background_tasks.add_task(get_thumb_store().maybe_compact, get_settings().thumb_pack_compact_ratio)
         
         return ApiResponse(
             data={"deleted": result["deleted"]},
@@ -208,7 +247,7 @@ async def batch_delete_photos(request: BatchDeleteRequest, db: Session = Depends
 
 
 @router.patch("/batch", response_model=ApiResponse, summary="批量更新照片")
-async def batch_update_photos(request: BatchUpdateRequest, db: Session = Depends(get_db)):
+def batch_update_photos(request: BatchUpdateRequest, db: Session = Depends(get_db)):
     """
     批量更新照片属性
     - 可批量修改类别、精选状态等
@@ -231,7 +270,7 @@ async def batch_update_photos(request: BatchUpdateRequest, db: Session = Depends
 
 
 @router.get("/system/drives", response_model=ApiResponse, summary="获取系统驱动器列表")
-async def get_system_drives():
+def get_system_drives():
     """
     获取Windows系统可用驱动器列表
     用于文件夹选择器
@@ -262,7 +301,7 @@ async def get_system_drives():
 
 
 @router.get("/system/browse", response_model=ApiResponse, summary="浏览目录")
-async def browse_directory(path: str = Query("", description="目录路径")):
+def browse_directory(path: str = Query("", description="目录路径")):
     """
     浏览指定目录下的子目录和文件
     用于文件夹选择器
@@ -270,7 +309,7 @@ async def browse_directory(path: str = Query("", description="目录路径")):
     try:
         if not path:
             # 返回驱动器列表
-            return await get_system_drives()
+            return get_system_drives()
         
         target_path = Path(path)
         if not target_path.exists():
@@ -312,10 +351,15 @@ async def browse_directory(path: str = Query("", description="目录路径")):
 
 
 @router.get("/{photo_id}/full", summary="获取照片原图")
-async def get_full_image(photo_id: int, db: Session = Depends(get_db)):
+def get_full_image(
+    photo_id: int,
+    variant: str = Query("original", pattern="^(original|lightbox)$", description="original=原图，lightbox=大图预览缩略图"),
+    db: Session = Depends(get_db),
+):
     """
     返回照片原图文件
-    优先使用 library_path（已整理到本地的），否则使用 file_path（SD卡上的）
+    - variant=lightbox 时优先返回本地大图预览缩略图，不存在则回退到原图
+    - 原图优先使用 library_path（已整理到本地的），否则使用 file_path（SD卡上的）
     """
     repo = PhotosRepository(db)
     photo = repo.get_by_id(photo_id)
@@ -323,6 +367,11 @@ async def get_full_image(photo_id: int, db: Session = Depends(get_db)):
     if not photo:
         raise HTTPException(status_code=404, detail="照片不存在")
     
+    # 大图预览：直接使用本地缩略图，避免从SD卡读取原图
+    if variant == "lightbox":
+        if thumb_exists(photo.sha1, "lightbox"):
+            return thumb_response(thumb_filename(photo.sha1, "lightbox"))
+    
     # 优先使用整理后的路径
     image_path = None
     if photo.library_path:
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 
 from ...db import get_db
 from ...services import SummaryService
+from ...core.executors import run_heavy
 from ..schemas import ApiResponse, SummaryRequest
 
 
@@ -23,7 +24,8 @@ async def generate_summary(request: SummaryRequest, db: Session = Depends(get_db
     """
     try:
         summary_service = SummaryService(db)
-        result = summary_service.generate_summary(
+        result = await run_heavy(
+            summary_service.generate_summary,
             date_from=request.date_from,
             date_to=request.date_to,
             save_history=request.save_history,
@@ -34,7 +36,7 @@ async def generate_summary(request: SummaryRequest, db: Session = Depends(get_db
 
 
 @router.get("/quick-stats", response_model=ApiResponse, summary="获取快速统计")
-async def get_quick_stats(db: Session = Depends(get_db)):
+def get_quick_stats(db: Session = Depends(get_db)):
     """获取快速统计数据（首页展示用）"""
     try:
         summary_service = SummaryService(db)
@@ -45,7 +47,7 @@ async def get_quick_stats(db: Session = Depends(get_db)):
 
 
 @router.get("/history", response_model=ApiResponse, summary="获取历史总结列表")
-async def get_history_list(
+def get_history_list(
     limit: int = Query(20, ge=1, le=100, description="返回数量限制"),
     db: Session = Depends(get_db),
 ):
@@ -59,7 +61,7 @@ async def get_history_list(
 
 
 @router.get("/history/{history_id}", response_model=ApiResponse, summary="获取历史总结详情")
-async def get_history_detail(history_id: int, db: Session = Depends(get_db)):
+def get_history_detail(history_id: int, db: Session = Depends(get_db)):
     """获取历史总结的完整详情"""
     try:
         summary_service = SummaryService(db)
@@ -74,7 +76,7 @@ async def get_history_detail(history_id: int, db: Session = Depends(get_db)):
 
 
 @router.delete("/history/{history_id}", response_model=ApiResponse, summary="删除历史总结")
-async def delete_history(history_id: int, db: Session = Depends(get_db)):
+def delete_history(history_id: int, db: Session = Depends(get_db)):
     """删除指定的历史总结"""
     try:
         summary_service = SummaryService(db)
@@ -0,0 +1,94 @@
+"""
+缩略图访问路由
+替代 StaticFiles 挂载：URL保持 /static/thumbs/{filename} 不变，
+由后端按存储布局/存储后端解析实际位置；缩略图缺失时按需渲染
+"""
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, Response
+from sqlalchemy.orm import Session
+
+from ...db import get_db, PhotosRepository
+from ...core.config import get_settings
+from ...core.thumbs import parse_thumb_filename, get_thumb_store, thumb_media_type
+from ...services.thumbnail_service import get_thumbnail_renderer, pick_source_path
+
+
+router = APIRouter(prefix="/static/thumbs", tags=["缩略图"])
+
+# 缩略图按内容SHA1命名，内容不会变化，可长期缓存
+CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+# 渲染中返回503（img触发error事件，前端按 Retry-After 稍后重试即可拿到真正的缩略图）
+RENDERING_HEADERS = {"Cache-Control": "no-store", "Retry-After": "1"}
+
+
+@router.get("/{filename}", summary="获取缩略图")
+async def get_thumbnail(filename: str, db: Session = Depends(get_db)):
+    """
+    返回缩略图文件
+    - 文件名格式：{sha1}.jpg 或 {sha1}_{grid|lightbox}.{jpg|webp|avif}
+    - 自动兼容分片布局和旧的平铺布局
+    - 打包存储中的缩略图按偏移直接读取返回
+    - 缩略图缺失时按需渲染：同一照片的并发请求只渲染一次，
+      在 thumb_render_wait 秒内未完成则返回503（带 Retry-After）
+    - 渲染失败过的照片直接返回500，不再重复解码
+    - 存储查询、原图检查和读取缩略图都会访问磁盘，放到线程池中执行，不阻塞事件循环
+    """
+    parsed = parse_thumb_filename(filename)
+    if parsed is None:
+        raise HTTPException(status_code=404, detail="缩略图不存在")
+    
+    store = get_thumb_store()
+    if await asyncio.to_thread(store.exists, filename):
+        return await asyncio.to_thread(thumb_response, filename)
+    
+    sha1, _ = parsed
+    photo = await asyncio.to_thread(PhotosRepository(db).get_by_sha1, sha1)
+    if not photo:
+        raise HTTPException(status_code=404, detail="缩略图不存在")
+    
+    source_path = await asyncio.to_thread(pick_source_path, photo.file_path, photo.library_path)
+    if source_path is None:
+        raise HTTPException(status_code=404, detail="原图不存在，无法生成缩略图")
+    
+    renderer = get_thumbnail_renderer()
+    if renderer.has_failed(sha1):
+        raise HTTPException(status_code=500, detail="缩略图生成失败")
+    
+    future = renderer.request(sha1, source_path)
+    if future is not None:
+        try:
+            # shield：超时只放弃等待，不取消渲染任务（其他请求可能也在等）
+            await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)),
+                timeout=get_settings().thumb_render_wait,
+            )
+        except asyncio.TimeoutError:
+            pass
+        except Exception:
+            raise HTTPException(status_code=500, detail="缩略图生成失败")
+    
+    if await asyncio.to_thread(store.exists, filename):
+        return await asyncio.to_thread(thumb_response, filename)
+    if renderer.has_failed(sha1):
+        raise HTTPException(status_code=500, detail="缩略图生成失败")
+    
+    raise HTTPException(status_code=503, detail="缩略图生成中", headers=RENDERING_HEADERS)
+
+
+def thumb_response(filename: str):
+    """
+    构造缩略图响应：单文件直接 FileResponse，打包存储读取字节后返回
+    不存在时抛出404
+    """
+    store = get_thumb_store()
+    
+    thumb_path = store.local_path(filename)
+    if thumb_path is not None:
+        return FileResponse(thumb_path, media_type=thumb_media_type(filename), headers=CACHE_HEADERS)
+    
+    content = store.read(filename)
+    if content is None:
+        raise HTTPException(status_code=404, detail="缩略图不存在")
+    return Response(content=content, media_type=thumb_media_type(filename), headers=CACHE_HEADERS)
@@ -63,8 +63,10 @@ class PhotoListQuery(BaseModel):
 class ClassifyRequest(BaseModel):
     """AI分类请求"""
     photo_ids: List[int] = Field(..., description="要分类的照片ID列表")
-    max_workers: int = Field(4, ge=1, le=8, description="并发线程数")
+    max_workers: Optional[int] = Field(None, ge=1, le=64, description="并发请求数（默认使用AI_MAX_CONCURRENCY）")
     skip_classified: bool = Field(False, description="跳过已分类照片")
+    cluster_bursts: Optional[bool] = Field(None, description="连拍模式：连拍组只分类代表照片，结果复制给组内其他照片（默认使用AI_CLUSTER_BURSTS）")
+    backend: Optional[str] = Field(None, pattern="^(remote|local|hybrid)$", description="分类后端 remote/local/hybrid（默认使用AI_BACKEND）")
 
 
 # ========== 总结相关 ==========
@@ -4,20 +4,41 @@ core模块初始化
 from .config import get_settings, Settings
 from .utils import (
     calculate_sha1,
+    read_file_once,
     generate_thumbnail,
+    render_thumbnails,
+    store_thumbnails,
+    missing_thumb_widths,
+    compute_dhash,
     parse_exif,
     find_matching_raw,
+    SidecarIndex,
     RAW_EXTENSIONS,
     JPG_EXTENSIONS,
+    SIDECAR_EXTENSIONS,
 )
+from .thumbs import THUMB_VARIANTS, get_thumb_store, thumb_exists, read_thumb, delete_thumbs, thumb_url
 
 __all__ = [
     "get_settings",
     "Settings",
     "calculate_sha1",
+    "read_file_once",
     "generate_thumbnail",
+    "render_thumbnails",
+    "store_thumbnails",
+    "missing_thumb_widths",
+    "compute_dhash",
     "parse_exif",
     "find_matching_raw",
+    "SidecarIndex",
     "RAW_EXTENSIONS",
     "JPG_EXTENSIONS",
+    "SIDECAR_EXTENSIONS",
+    "THUMB_VARIANTS",
+    "get_thumb_store",
+    "thumb_exists",
+    "read_thumb",
+    "delete_thumbs",
+    "thumb_url",
 ]
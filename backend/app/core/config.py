@@ -2,7 +2,7 @@
 配置管理模块
 从环境变量/.env文件读取配置
 """
-from typing import List
+from typing import Dict, List
 from pathlib import Path
 from pydantic import Field  # 新增：用于配置验证
 from pydantic_settings import BaseSettings
@@ -39,9 +39,87 @@ class Settings(BaseSettings):
     ai_model: str = "gpt-4o"  # 视觉模型，用于图片分类
     ai_text_model: str = ""   # 文本模型，用于生成总结（留空则使用ai_model）
     
+    # 分类后端：remote=远程AI；local=本地CPU按缩略图和EXIF特征预分类（需安装numpy，只识别夜景/风光/微距/人像）；
+    # hybrid=先本地分类，置信度低于 ai_local_confidence 的照片再交给远程AI
+    ai_backend: str = Field(default="remote", pattern="^(remote|local|hybrid)$")
+    ai_local_confidence: float = Field(default=0.6, ge=0, le=1)
+    
+    # AI服务商限流（对应 ai_base_url 所指向的服务商，按其配额调整）
+    ai_max_concurrency: int = Field(default=8, ge=1)     # 同时进行的请求数
+    ai_rate_limit: float = Field(default=0, ge=0)        # 每秒请求数上限（令牌桶速率，0=不限）
+    ai_rate_burst: int = Field(default=1, ge=1)          # 令牌桶容量（允许的突发请求数）
+    # 按服务商覆盖上面三项（JSON，键为 ai_base_url 的主机名或完整地址，未配置的项使用上面的默认值），例如
+    # AI_PROVIDER_LIMITS='{"api.openai.com": {"max_concurrency": 8, "rate_limit": 5, "rate_burst": 5}, "127.0.0.1:9000": {"max_concurrency": 32}}'
+    ai_provider_limits: Dict[str, Dict[str, float]] = Field(default_factory=dict)
+    ai_max_retries: int = Field(default=4, ge=0)         # 429/5xx/网络错误的最大重试次数
+    ai_backoff_base: float = Field(default=1.0, gt=0)    # 指数退避基础秒数（第n次重试等待 base*2^n 秒，带随机抖动）
+    ai_timeout: float = Field(default=120.0, gt=0)       # 单次请求超时（秒）
+    ai_http2: bool = True                                # 启用HTTP/2（需安装h2，未安装时自动使用HTTP/1.1）
+    ai_batch_size: int = Field(default=1, ge=1, le=16)   # 每个分类请求携带的图片数（>1时批量分类，失败的图片退回单图请求）
+    
+    # AI分类结果缓存（按 照片内容SHA1 + 模型 + Prompt版本）
+    ai_cache_enabled: bool = True
+    ai_cache_max_entries: int = Field(default=200000, ge=0)  # 最大缓存条数，超出时淘汰最久未使用的（0=不限）
+    ai_cache_ttl_days: int = Field(default=0, ge=0)          # 超过该天数未使用即淘汰（0=不按时间淘汰）
+    
+    # 近似重复/连拍检测（感知哈希dHash，64位）
+    dedup_max_distance: int = Field(default=6, ge=0, le=7)       # 汉明距离不超过该值视为近似重复（0~7）
+    dedup_burst_seconds: float = Field(default=2.0, ge=0)        # 组内相邻照片拍摄间隔都不超过该秒数时视为连拍
+    
+    # AI分类连拍模式：拍摄间隔不超过 dedup_burst_seconds 且相邻两张相似的照片为一组，
+    # 每组只把代表照片发给AI，类别、标签、描述复制给组内其他照片
+    ai_cluster_bursts: bool = False
+    ai_burst_max_distance: int = Field(default=12, ge=0, le=32)  # 连拍组内相邻照片的最大汉明距离
+    
     # 缩略图目录
     thumbs_dir: str = "storage/thumbs"
     
+    # 缩略图存储布局：sharded=按SHA1前缀分两级子目录，flat=平铺（旧布局）
+    # 旧的平铺缩略图可用 migrate_thumbs.py 在线迁移
+    thumb_layout: str = Field(default="sharded", pattern="^(sharded|flat)$")
+    
+    # 缩略图存储后端：files=每个缩略图一个文件，packed=追加写入大段文件+偏移索引
+    # packed模式下已有的单文件缩略图仍可读取
+    thumb_store: str = Field(default="files", pattern="^(files|packed)$")
+    thumb_pack_compact_ratio: float = Field(default=0.3, gt=0, le=1)  # 死数据比例超过该值时自动压缩
+    
+    # 缩略图质量/速度策略
+    # fast：宽度足够的变体（通常是grid）直接使用EXIF内嵌缩略图，其余变体JPEG draft解码到目标尺寸后LANCZOS
+    # balanced：draft解码到2倍目标尺寸后LANCZOS
+    # quality：完整解码原图后LANCZOS（最慢）
+    thumb_quality_mode: str = Field(default="fast", pattern="^(fast|balanced|quality)$")
+    
+    # 缩略图金字塔（一次解码同时生成，preview固定为512px JPEG）
+    thumb_grid_width: int = Field(default=256, ge=64)        # 照片墙小图宽度
+    thumb_lightbox_width: int = Field(default=1600, ge=512)  # 大图预览宽度
+    thumb_variant_format: str = Field(default="jpeg", pattern="^(jpeg|webp|avif)$")  # grid/lightbox的编码格式
+    
+    # 扫描流水线配置
+    scan_io_workers: int = Field(default=4, ge=1)         # SHA1/EXIF读取线程数（受磁盘带宽限制）
+    scan_thumb_workers: int = Field(default=0, ge=0)      # 缩略图解码进程数（0=CPU核数）
+    scan_use_process_pool: bool = True                    # 缩略图是否使用进程池（False则使用线程池）
+    scan_queue_size: int = Field(default=32, ge=1)        # 流水线中同时在途的最大文件数（有界队列，每个在途文件占用一份原图缓冲）
+    scan_batch_size: int = Field(default=200, ge=1)       # 数据库批量写入大小
+    scan_defer_thumbnails: bool = False                   # 扫描时只入库元数据，缩略图首次访问时按需渲染
+    
+    # 照片列表
+    photo_count_cache_seconds: float = Field(default=30.0, ge=0)  # 总数缓存秒数（游标分页时总数只用于显示，照片增删改时立即失效）
+    
+    # 接口执行模型
+    api_io_workers: int = Field(default=32, ge=1)     # 同步接口线程池大小（数据库查询、文件读取等短操作）
+    api_heavy_workers: int = Field(default=2, ge=1)   # 同步执行扫描/整理/导出/AI分类/生成总结的线程数
+    
+    # 后台任务（扫描/整理/导出/AI分类）
+    job_workers: int = Field(default=2, ge=1)                # 同时执行的任务数
+    job_retention_days: int = Field(default=30, ge=1)        # 已结束任务的保留天数（启动时清理）
+    job_progress_interval: float = Field(default=0.5, gt=0)  # SSE进度推送间隔（秒）
+    
+    # 缩略图按需渲染
+    thumb_render_workers: int = Field(default=2, ge=1)        # 渲染线程数
+    thumb_render_queue_size: int = Field(default=64, ge=1)    # 同时排队/渲染的最大数量，超出时返回503（前端稍后重试）
+    thumb_render_wait: float = Field(default=2.0, ge=0)       # 请求等待渲染完成的最长秒数，超时返回503（前端稍后重试）
+    thumb_render_failed_ttl: float = Field(default=600, ge=0)  # 渲染失败的照片在该秒数内直接返回失败，之后允许重试（重新扫描入库时立即清除）
+    
     @property
     def database_url(self) -> str:
         """生成数据库连接字符串"""
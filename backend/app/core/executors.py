@@ -0,0 +1,66 @@
+"""
+执行器模块
+统一管理路由中阻塞调用的执行位置，避免阻塞事件循环：
+- 普通接口（数据库查询、文件读取等短操作）声明为同步 def，由线程池执行；
+  线程池大小为 api_io_workers，asyncio.to_thread 使用同一大小的默认执行器
+- 耗时操作（扫描、整理、导出、AI分类、生成总结）在 async 路由中通过 run_heavy()
+  分派到独立的小线程池，避免长时间占满普通接口的线程
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from .config import get_settings
+
+
+T = TypeVar("T")
+
+_heavy_pool: Optional[ThreadPoolExecutor] = None
+_io_pool: Optional[ThreadPoolExecutor] = None
+
+
+def install_executors() -> None:
+    """
+    应用启动时调用（需在事件循环中）：
+    - 设置同步路由线程池（anyio）的并发上限
+    - 设置 asyncio 默认执行器（asyncio.to_thread / run_in_executor(None)）
+    - 创建耗时操作线程池
+    """
+    global _heavy_pool, _io_pool
+    import anyio.to_thread
+
+    settings = get_settings()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.api_io_workers
+
+    _io_pool = ThreadPoolExecutor(max_workers=settings.api_io_workers, thread_name_prefix="api-io")
+    asyncio.get_running_loop().set_default_executor(_io_pool)
+
+    _heavy_pool = ThreadPoolExecutor(max_workers=settings.api_heavy_workers, thread_name_prefix="api-heavy")
+
+
+def _get_heavy_pool() -> ThreadPoolExecutor:
+    global _heavy_pool
+    if _heavy_pool is None:
+        # 未经 lifespan 启动（如脚本或测试客户端）时按需创建
+        _heavy_pool = ThreadPoolExecutor(
+            max_workers=get_settings().api_heavy_workers, thread_name_prefix="api-heavy"
+        )
+    return _heavy_pool
+
+
+async def run_heavy(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在耗时操作线程池中执行同步函数并等待结果"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_heavy_pool(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    """应用关闭时调用：不等待正在执行的耗时操作"""
+    global _heavy_pool, _io_pool
+    if _heavy_pool is not None:
+        _heavy_pool.shutdown(wait=False, cancel_futures=True)
+        _heavy_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False)
+        _io_pool = None
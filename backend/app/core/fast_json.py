@@ -0,0 +1,46 @@
+"""
+JSON序列化模块
+照片列表等大响应直接序列化为字节返回，跳过 pydantic 响应模型校验和 jsonable_encoder 的逐值遍历
+- 安装 orjson 时使用 orjson（C实现，datetime 原生输出为ISO格式）
+- 未安装时回退到标准库 json（紧凑输出，datetime 转为 isoformat）
+"""
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def _default(value: Any) -> Any:
+    """标准库json无法直接序列化的类型"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为UTF-8编码的JSON字节（中文不转义）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """使用 dumps 序列化的JSON响应"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def api_json_response(data: Any = None, message: str = "", error: Any = None) -> FastJSONResponse:
+    """与 ApiResponse 结构相同的快速JSON响应"""
+    return FastJSONResponse({"data": data, "message": message, "error": error})
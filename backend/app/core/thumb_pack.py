@@ -0,0 +1,298 @@
+"""
+打包缩略图存储模块
+把大量小缩略图追加写入少数几个大段文件，避免海量小文件带来的inode和拷贝开销
+
+磁盘结构（thumbs/packs/）：
+- seg_000001.pack ...：段文件，缩略图编码后的字节依次追加
+- index.log：追加式索引日志，每行一条记录
+    PUT <文件名> <段号> <偏移> <长度>
+    DEL <文件名>
+  启动时重放日志即可恢复 文件名 → (段号, 偏移, 长度) 的内存索引
+
+写入只在API进程内进行（扫描时缩略图进程只负责编码，由主进程写入），
+进程内用一把锁保证段文件和索引日志的追加顺序。
+删除只追加DEL记录，空间由 compact() 回收：
+压缩时只在短时间内持锁（选段、切换索引条目、替换索引日志），搬运存活缩略图时不持锁，不阻塞读写。
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Tuple
+
+
+# 段文件达到该大小后切换到新段
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+
+INDEX_FILENAME = "index.log"
+
+
+class PackedThumbStore:
+    """打包缩略图存储：段文件 + 偏移索引"""
+
+    def __init__(self, pack_dir: Path, fallback=None, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        """
+        Args:
+            pack_dir: 段文件与索引所在目录
+            fallback: 回退的文件存储（读取/删除旧的单文件缩略图）
+            segment_max_bytes: 单个段文件的最大大小
+        """
+        self.pack_dir = pack_dir
+        self.pack_dir.mkdir(parents=True, exist_ok=True)
+        self.fallback = fallback
+        self.segment_max_bytes = segment_max_bytes
+
+        self._lock = threading.Lock()
+        # 同一时间只允许一个压缩（压缩期间不持有 _lock）
+        self._compact_lock = threading.Lock()
+        # 文件名 → (段号, 偏移, 长度)
+        self._index: Dict[str, Tuple[int, int, int]] = {}
+        # 段号 → 已删除/被覆盖的字节数（用于判断是否需要压缩）
+        self._dead_bytes: Dict[int, int] = {}
+        # 段号 → 只读文件描述符
+        self._read_fds: Dict[int, int] = {}
+
+        self._load_index()
+        # 已分配的最大段号（写入切换新段和压缩都从这里分配段号）
+        self._last_segment = max(self._segment_numbers(), default=1)
+        self._active_segment = self._last_segment
+        self._active_size = self._segment_size(self._active_segment)
+
+    # ========== 内部工具 ==========
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.pack_dir / f"seg_{segment:06d}.pack"
+
+    def _segment_numbers(self):
+        return [
+            int(p.stem[4:]) for p in self.pack_dir.glob("seg_*.pack")
+            if p.stem[4:].isdigit()
+        ]
+
+    def _segment_size(self, segment: int) -> int:
+        try:
+            return self._segment_path(segment).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _index_path(self) -> Path:
+        return self.pack_dir / INDEX_FILENAME
+
+    def _forget(self, filename: str) -> None:
+        """从内存索引中移除并记为死数据（调用方需持有锁）"""
+        old = self._index.pop(filename, None)
+        if old:
+            self._dead_bytes[old[0]] = self._dead_bytes.get(old[0], 0) + old[2]
+
+    def _load_index(self) -> None:
+        """重放索引日志，恢复内存索引"""
+        index_path = self._index_path()
+        if not index_path.exists():
+            return
+
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                # 最后一行可能因崩溃写了一半，直接忽略
+                if len(parts) == 5 and parts[0] == "PUT":
+                    self._forget(parts[1])
+                    self._index[parts[1]] = (int(parts[2]), int(parts[3]), int(parts[4]))
+                elif len(parts) == 2 and parts[0] == "DEL":
+                    self._forget(parts[1])
+
+        # 死数据按 段大小 - 存活数据 计算（包括压缩中途崩溃留下的未被引用的段）
+        live: Dict[int, int] = {}
+        for segment, _, length in self._index.values():
+            live[segment] = live.get(segment, 0) + length
+        self._dead_bytes = {
+            segment: self._segment_size(segment) - live.get(segment, 0)
+            for segment in self._segment_numbers()
+        }
+
+    def _append_index(self, lines) -> None:
+        with open(self._index_path(), "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+
+    def _read_fd(self, segment: int) -> int:
+        fd = self._read_fds.get(segment)
+        if fd is None:
+            flags = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+            fd = os.open(self._segment_path(segment), flags)
+            self._read_fds[segment] = fd
+        return fd
+
+    def _pread(self, segment: int, offset: int, length: int) -> bytes:
+        """按偏移读取（调用方需持有锁；Windows没有os.pread，退化为seek+read）"""
+        fd = self._read_fd(segment)
+        if hasattr(os, "pread"):
+            return os.pread(fd, length, offset)
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, length)
+
+    def _allocate_segment(self) -> int:
+        """分配一个新段号（调用方需持有锁）"""
+        self._last_segment += 1
+        return self._last_segment
+
+    def _append(self, filename: str, data: bytes) -> str:
+        """追加写入段文件，返回对应的索引日志行（调用方需持有锁）"""
+        if self._active_size and self._active_size + len(data) > self.segment_max_bytes:
+            self._active_segment = self._allocate_segment()
+            self._active_size = 0
+
+        segment = self._active_segment
+        with open(self._segment_path(segment), "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        self._active_size = offset + len(data)
+
+        self._forget(filename)
+        self._index[filename] = (segment, offset, len(data))
+        return f"PUT {filename} {segment} {offset} {len(data)}\n"
+
+    # ========== 存储接口（与 FileThumbStore 一致） ==========
+
+    def local_path(self, filename: str) -> Optional[Path]:
+        """打包存储中的缩略图没有独立文件；仅旧的单文件缩略图返回路径"""
+        with self._lock:
+            if filename in self._index:
+                return None
+        return self.fallback.local_path(filename) if self.fallback else None
+
+    def exists(self, filename: str) -> bool:
+        with self._lock:
+            if filename in self._index:
+                return True
+        return bool(self.fallback and self.fallback.exists(filename))
+
+    def read(self, filename: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._index.get(filename)
+            if entry:
+                return self._pread(*entry)
+        return self.fallback.read(filename) if self.fallback else None
+
+    def put(self, filename: str, data: bytes) -> None:
+        with self._lock:
+            line = self._append(filename, data)
+            self._append_index([line])
+
+    def delete(self, filename: str) -> int:
+        deleted = 0
+        with self._lock:
+            if filename in self._index:
+                self._forget(filename)
+                self._append_index([f"DEL {filename}\n"])
+                deleted += 1
+        if self.fallback:
+            deleted += self.fallback.delete(filename)
+        return deleted
+
+    # ========== 空间回收 ==========
+
+    def dead_ratio(self) -> float:
+        """死数据占全部段文件大小的比例"""
+        with self._lock:
+            total = sum(self._segment_size(s) for s in self._segment_numbers())
+            dead = sum(self._dead_bytes.values())
+        return dead / total if total else 0.0
+
+    def compact(self, threshold: float = 0.0) -> Optional[Dict[str, int]]:
+        """
+        压缩：把死数据比例超过阈值的段中的存活缩略图搬到新段，重写索引日志后删除旧段
+        （崩溃时索引始终指向有效数据；搬运到一半的新段在下次启动时按死数据计入，之后被压缩掉）
+
+        只在选段、切换索引条目和替换索引日志时持锁；从旧段复制数据时不持锁，读写照常进行。
+        复制期间被删除或覆盖的缩略图不再切换，其新副本记为死数据。
+
+        Args:
+            threshold: 单个段的死数据比例超过该值才压缩（0表示压缩所有含死数据的段）
+
+        Returns:
+            {"segments_removed": 删除的段数, "bytes_reclaimed": 删除的旧段总大小}；没有需要压缩的段时返回None
+        """
+        with self._compact_lock:
+            # 1. 选段并取存活条目的快照
+            with self._lock:
+                victims = set()
+                for segment, dead in self._dead_bytes.items():
+                    size = self._segment_size(segment)
+                    if dead > 0 and (not size or dead / size > threshold):
+                        victims.add(segment)
+                if not victims:
+                    return None
+                # 被压缩的段不能再作为写入目标
+                if self._active_segment in victims:
+                    self._active_segment = self._allocate_segment()
+                    self._active_size = 0
+                snapshot = [(name, entry) for name, entry in self._index.items() if entry[0] in victims]
+                target = self._allocate_segment()
+
+            # 2. 不持锁复制存活缩略图（旧段不再被追加写入，新段只有压缩在写）
+            moved: Dict[str, Tuple[Tuple[int, int, int], Tuple[int, int, int]]] = {}
+            target_size = 0
+            fds: Dict[int, int] = {}
+            out = open(self._segment_path(target), "ab")
+            try:
+                for name, (segment, offset, length) in snapshot:
+                    if target_size and target_size + length > self.segment_max_bytes:
+                        out.close()
+                        with self._lock:
+                            target = self._allocate_segment()
+                        target_size = 0
+                        out = open(self._segment_path(target), "ab")
+                    fd = fds.get(segment)
+                    if fd is None:
+                        fd = fds[segment] = os.open(self._segment_path(segment), os.O_RDONLY | getattr(os, "O_BINARY", 0))
+                    if hasattr(os, "pread"):
+                        data = os.pread(fd, length, offset)
+                    else:
+                        os.lseek(fd, offset, os.SEEK_SET)
+                        data = os.read(fd, length)
+                    out.write(data)
+                    moved[name] = ((segment, offset, length), (target, target_size, length))
+                    target_size += length
+                out.flush()
+                os.fsync(out.fileno())
+            finally:
+                out.close()
+                for fd in fds.values():
+                    os.close(fd)
+            if not target_size:
+                # 被压缩的段中已没有存活数据，新段为空
+                self._segment_path(target).unlink(missing_ok=True)
+
+            # 3. 持锁切换索引条目并替换索引日志，此后旧段不再被引用
+            with self._lock:
+                for name, (old, new) in moved.items():
+                    if self._index.get(name) == old:
+                        self._index[name] = new
+                    else:
+                        self._dead_bytes[new[0]] = self._dead_bytes.get(new[0], 0) + new[2]
+
+                tmp_path = self._index_path().with_suffix(".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for name, (segment, offset, length) in self._index.items():
+                        f.write(f"PUT {name} {segment} {offset} {length}\n")
+                os.replace(tmp_path, self._index_path())
+
+                for segment in victims:
+                    fd = self._read_fds.pop(segment, None)
+                    if fd is not None:
+                        os.close(fd)
+                    self._dead_bytes.pop(segment, None)
+
+            # 4. 删除旧段
+            stats = {"segments_removed": 0, "bytes_reclaimed": 0}
+            for segment in victims:
+                try:
+                    stats["bytes_reclaimed"] += self._segment_size(segment)
+                    self._segment_path(segment).unlink()
+                    stats["segments_removed"] += 1
+                except FileNotFoundError:
+                    pass
+            return stats
+
+    def maybe_compact(self, threshold: float) -> Optional[Dict[str, int]]:
+        """压缩死数据比例超过阈值的段（删除照片后在后台调用）"""
+        return self.compact(threshold)
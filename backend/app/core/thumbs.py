@@ -0,0 +1,213 @@
+"""
+缩略图命名与路径模块
+统一管理缩略图金字塔各变体的文件名、磁盘路径和访问URL
+
+存储布局（thumb_layout）：
+- sharded：按SHA1前4位分两级子目录，如 thumbs/ab/cd/abcd....jpg，
+  避免单目录文件过多导致查找和备份变慢
+- flat：所有缩略图平铺在 thumbs/ 下（旧布局）
+读取时总会回退检查旧的平铺路径，因此迁移过程中无需停机
+
+存储后端（thumb_store）：
+- files：上述文件布局
+- packed：见 thumb_pack.py，适合百万级缩略图
+"""
+import os
+import re
+from pathlib import Path
+from functools import lru_cache
+from typing import Optional, Dict, Tuple
+from .config import get_settings
+
+
+# 缩略图金字塔变体
+# grid：照片墙小图；preview：512px预览图（AI分类也使用它）；lightbox：大图预览
+THUMB_VARIANTS = ["grid", "preview", "lightbox"]
+
+# 变体格式 → 文件扩展名
+THUMB_FORMAT_EXT = {"jpeg": "jpg", "webp": "webp", "avif": "avif"}
+
+# 缩略图文件名格式：{sha1}.jpg 或 {sha1}_{variant}.{ext}
+THUMB_FILENAME_RE = re.compile(r"^([0-9a-f]{40})(?:_(grid|lightbox))?\.(jpg|webp|avif)$")
+
+
+def thumb_filename(sha1: str, variant: str = "preview") -> str:
+    """
+    获取缩略图文件名
+    preview 始终为 {sha1}.jpg（兼容已有缩略图和AI分类），
+    其余变体为 {sha1}_{variant}.{ext}，格式由 thumb_variant_format 决定
+    """
+    if variant == "preview":
+        return f"{sha1}.jpg"
+    ext = THUMB_FORMAT_EXT[get_settings().thumb_variant_format]
+    return f"{sha1}_{variant}.{ext}"
+
+
+def parse_thumb_filename(filename: str) -> Optional[Tuple[str, str]]:
+    """
+    解析缩略图文件名
+    
+    Returns:
+        (sha1, 变体名)，文件名不合法返回None
+    """
+    match = THUMB_FILENAME_RE.match(filename)
+    if not match:
+        return None
+    return match.group(1), match.group(2) or "preview"
+
+
+def _sharded_path(thumbs_dir: Path, filename: str) -> Path:
+    """分片路径：thumbs/ab/cd/{filename}"""
+    return thumbs_dir / filename[0:2] / filename[2:4] / filename
+
+
+def thumb_media_type(filename: str) -> str:
+    """根据缩略图文件名获取MIME类型"""
+    ext = filename.rsplit(".", 1)[-1]
+    return {"jpg": "image/jpeg", "webp": "image/webp", "avif": "image/avif"}[ext]
+
+
+class FileThumbStore:
+    """
+    文件系统缩略图存储（每个缩略图一个文件）
+    写入使用当前布局，读取兼容分片与旧的平铺布局
+    """
+    
+    def __init__(self, thumbs_dir: Path, layout: str):
+        self.thumbs_dir = thumbs_dir
+        self.layout = layout
+    
+    def write_path(self, filename: str) -> Path:
+        """当前布局下的写入路径"""
+        if self.layout == "sharded":
+            return _sharded_path(self.thumbs_dir, filename)
+        return self.thumbs_dir / filename
+    
+    def local_path(self, filename: str) -> Optional[Path]:
+        """
+        查找已存在的缩略图文件
+        依次检查当前布局和旧的平铺布局；迁移可能恰好在两次检查之间移动文件，
+        因此最后再检查一次当前布局
+        """
+        if self.layout != "sharded":
+            path = self.thumbs_dir / filename
+            return path if path.is_file() else None
+        
+        sharded = _sharded_path(self.thumbs_dir, filename)
+        for path in (sharded, self.thumbs_dir / filename, sharded):
+            if path.is_file():
+                return path
+        return None
+    
+    def exists(self, filename: str) -> bool:
+        return self.local_path(filename) is not None
+    
+    def read(self, filename: str) -> Optional[bytes]:
+        path = self.local_path(filename)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+    
+    def put(self, filename: str, data: bytes) -> None:
+        """写入缩略图（先写临时文件再原子替换，避免读到写了一半的文件）"""
+        path = self.write_path(filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+    
+    def delete(self, filename: str) -> int:
+        """删除缩略图（分片与平铺布局都会清理），返回删除的文件数"""
+        deleted = 0
+        for path in (_sharded_path(self.thumbs_dir, filename), self.thumbs_dir / filename):
+            try:
+                path.unlink()
+                deleted += 1
+            except OSError:
+                pass
+        return deleted
+    
+    def maybe_compact(self, threshold: float) -> None:
+        """单文件存储删除即释放空间，无需压缩"""
+        return None
+
+
+@lru_cache()
+def get_thumb_store():
+    """
+    获取缩略图存储后端单例
+    - files：每个缩略图一个文件（FileThumbStore）
+    - packed：追加写入大段文件 + 偏移索引（PackedThumbStore），旧文件仍可读取
+    """
+    settings = get_settings()
+    file_store = FileThumbStore(settings.thumbs_path, settings.thumb_layout)
+    if settings.thumb_store == "packed":
+        from .thumb_pack import PackedThumbStore
+        return PackedThumbStore(settings.thumbs_path / "packs", fallback=file_store)
+    return file_store
+
+
+def thumb_exists(sha1: str, variant: str = "preview") -> bool:
+    """缩略图是否已存在"""
+    return get_thumb_store().exists(thumb_filename(sha1, variant))
+
+
+def read_thumb(sha1: str, variant: str = "preview") -> Optional[bytes]:
+    """读取缩略图内容，不存在返回None"""
+    return get_thumb_store().read(thumb_filename(sha1, variant))
+
+
+def delete_thumbs(sha1: str) -> int:
+    """
+    删除某张照片的所有缩略图变体
+    
+    Returns:
+        删除的缩略图数量
+    """
+    store = get_thumb_store()
+    return sum(store.delete(thumb_filename(sha1, variant)) for variant in THUMB_VARIANTS)
+
+
+def thumb_url(sha1: str, variant: str = "preview") -> str:
+    """获取缩略图访问URL（与存储布局无关）"""
+    return f"/static/thumbs/{thumb_filename(sha1, variant)}"
+
+
+def migrate_flat_thumbs(dry_run: bool = False) -> Dict[str, int]:
+    """
+    将平铺布局的缩略图迁移到分片布局
+    使用 os.replace 原子移动，服务运行期间也可安全执行（读取会回退到旧路径）
+    
+    Args:
+        dry_run: 只统计不移动
+    
+    Returns:
+        {"moved": 迁移数量, "duplicates": 目标已存在而删除的旧文件数, "skipped": 非缩略图文件数}
+    """
+    thumbs_dir = get_settings().thumbs_path
+    stats = {"moved": 0, "duplicates": 0, "skipped": 0}
+    
+    with os.scandir(thumbs_dir) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            if parse_thumb_filename(entry.name) is None:
+                stats["skipped"] += 1
+                continue
+            
+            target = _sharded_path(thumbs_dir, entry.name)
+            if target.exists():
+                stats["duplicates"] += 1
+                if not dry_run:
+                    os.remove(entry.path)
+                continue
+            
+            stats["moved"] += 1
+            if not dry_run:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(entry.path, target)
+    
+    return stats
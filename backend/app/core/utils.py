@@ -2,13 +2,17 @@
 通用工具函数模块
 包含：SHA1计算、缩略图生成、EXIF解析等
 """
+import io
+import os
 import hashlib
+import threading
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple, Union
 from PIL import Image
 import piexif
 from .config import get_settings
+from .thumbs import get_thumb_store, thumb_exists, thumb_filename
 
 
 # 支持的RAW格式扩展名
@@ -17,6 +21,9 @@ RAW_EXTENSIONS = [".arw", ".cr2", ".cr3", ".nef", ".dng", ".raf", ".rw2", ".orf"
 # 支持的JPG格式扩展名
 JPG_EXTENSIONS = [".jpg", ".jpeg", ".JPG", ".JPEG"]
 
+# 伴随文件扩展名（XMP编辑记录、HEIF格式的HIF/HEIC副本）
+SIDECAR_EXTENSIONS = [".xmp", ".hif", ".heif", ".heic"]
+
 
 def calculate_sha1(file_path: Path, chunk_size: int = 65536) -> str:
     """
@@ -37,56 +44,246 @@ def calculate_sha1(file_path: Path, chunk_size: int = 65536) -> str:
     return sha1.hexdigest()
 
 
-def generate_thumbnail(jpg_path: Path, sha1: str, width: int = 512) -> Optional[Path]:
+def read_file_once(file_path: Path) -> tuple[bytes, str]:
     """
-    生成缩略图并保存
+    一次性读取整个文件，并在同一份缓冲区上计算SHA1
+    扫描时SHA1、EXIF、缩略图共用这份数据，SD卡只读一遍
+    
+    Args:
+        file_path: 文件路径
+    
+    Returns:
+        (文件内容, 40位SHA1哈希字符串)
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    return data, hashlib.sha1(data).hexdigest()
+
+
+# 各缩略图质量模式下draft解码的过采样倍数（quality模式不使用draft，完整解码）
+# fast：解码到不小于目标尺寸；balanced：解码到不小于2倍目标尺寸，LANCZOS画质更好
+DRAFT_OVERSAMPLE = {"fast": 1, "balanced": 2}
+
+
+# EXIF内嵌缩略图与原图宽高比的允许误差（超出说明内嵌图带黑边或被裁切，不可直接使用）
+EMBEDDED_ASPECT_TOLERANCE = 0.02
+
+
+def _load_embedded_thumbnail(jpg_path: Path, data: Optional[bytes], aspect: float) -> Optional[Image.Image]:
+    """
+    读取EXIF中内嵌的JPEG缩略图
+    只有宽高比与原图一致时才返回，否则返回None（由调用方解码原图）
+    """
+    try:
+        thumb_bytes = piexif.load(data if data is not None else str(jpg_path)).get("thumbnail")
+        if not thumb_bytes:
+            return None
+        img = Image.open(io.BytesIO(thumb_bytes))
+        if abs(img.width / img.height - aspect) <= aspect * EMBEDDED_ASPECT_TOLERANCE:
+            return img
+        img.close()
+    except Exception:
+        pass
+    return None
+
+
+def _encode_thumb_variant(img: Image.Image, variant: str, fmt: str) -> bytes:
+    """按变体格式编码缩略图（preview固定为JPEG）"""
+    buf = io.BytesIO()
+    if variant == "preview" or fmt == "jpeg":
+        img.save(buf, "JPEG", quality=85, optimize=True)
+    elif fmt == "webp":
+        img.save(buf, "WEBP", quality=80, method=4)
+    else:
+        img.save(buf, "AVIF", quality=60)
+    return buf.getvalue()
+
+
+def thumb_target_widths(width: int = 512) -> Dict[str, int]:
+    """缩略图金字塔各变体的目标宽度"""
+    settings = get_settings()
+    return {
+        "grid": settings.thumb_grid_width,
+        "preview": width,
+        "lightbox": settings.thumb_lightbox_width,
+    }
+
+
+def missing_thumb_widths(sha1: str, width: int = 512) -> Dict[str, int]:
+    """尚未生成的缩略图变体及其目标宽度"""
+    return {v: w for v, w in thumb_target_widths(width).items() if not thumb_exists(sha1, v)}
+
+
+def render_thumbnails(
+    jpg_path: Path,
+    widths: Dict[str, int],
+    data: Optional[bytes] = None,
+) -> Dict[str, bytes]:
+    """
+    解码一次原图，渲染并编码多个尺寸的缩略图（不写入存储，可在子进程中执行）
     
     Args:
         jpg_path: 原始JPG文件路径
-        sha1: 文件SHA1（用作缩略图文件名）
-        width: 缩略图宽度（默认512px）
+        widths: {变体名: 目标宽度}
+        data: 已读入内存的文件内容（可选，传入则不再读取磁盘）
     
     Returns:
-        缩略图保存路径，失败返回None
+        {变体名: 编码后的字节}，单个变体失败时不包含该变体
+    
+    Raises:
+        原图无法解码时抛出异常
     """
     settings = get_settings()
-    thumbs_dir = settings.thumbs_path
-    thumbs_dir.mkdir(parents=True, exist_ok=True)
+    source: Union[Path, io.BytesIO] = io.BytesIO(data) if data is not None else jpg_path
+    mode = settings.thumb_quality_mode
+    rendered: Dict[str, bytes] = {}
+    
+    # Image.open 只读取文件头，draft/缩放之前不会解码像素
+    with Image.open(source) as img:
+        # 按原图尺寸计算各变体大小（draft后尺寸会变化）
+        orig_width, orig_height = img.size
+        
+        # grid/lightbox不放大，preview保持原有行为（总是缩放到指定宽度）
+        sizes = {}
+        for variant, w in widths.items():
+            if variant != "preview":
+                w = min(w, orig_width)
+            sizes[variant] = (w, int(orig_height * w / orig_width))
+        
+        # 快速模式：EXIF内嵌缩略图宽度足够的变体（通常是grid）直接由它缩放，
+        # 只有它覆盖不了的变体才解码原图；所有变体都被覆盖时完全跳过原图解码
+        if mode == "fast":
+            embedded = _load_embedded_thumbnail(jpg_path, data, orig_width / orig_height)
+            if embedded is not None:
+                with embedded:
+                    covered = {v: size for v, size in sizes.items() if size[0] <= embedded.width}
+                    _render_variants(embedded, covered, rendered, jpg_path, settings.thumb_variant_format)
+                sizes = {v: size for v, size in sizes.items() if v not in covered}
+        
+        if sizes:
+            # JPEG draft模式：在DCT域按1/2、1/4、1/8直接缩小解码，
+            # 解码结果不小于请求尺寸，后续LANCZOS只需处理小得多的中间图
+            if mode in DRAFT_OVERSAMPLE:
+                factor = DRAFT_OVERSAMPLE[mode]
+                draft_w, draft_h = max(sizes.values())
+                img.draft(None, (draft_w * factor, draft_h * factor))
+            _render_variants(img, sizes, rendered, jpg_path, settings.thumb_variant_format)
+    
+    return rendered
+
+
+def _render_variants(
+    img: Image.Image,
+    sizes: Dict[str, Tuple[int, int]],
+    rendered: Dict[str, bytes],
+    jpg_path: Path,
+    fmt: str,
+) -> None:
+    """从同一源图按 {变体名: (宽, 高)} 缩放并编码，结果写入 rendered"""
+    # 转换为RGB（处理RGBA/P/CMYK等WebP/JPEG不支持的格式）
+    base = img if img.mode in ("RGB", "L") else img.convert("RGB")
+    
+    # 从大到小逐级缩放，每级以上一级结果为源，只解码一次
+    for variant, size in sorted(sizes.items(), key=lambda item: item[1][0], reverse=True):
+        base = base.resize(size, Image.Resampling.LANCZOS)
+        try:
+            rendered[variant] = _encode_thumb_variant(base, variant, fmt)
+        except Exception as e:
+            # 单个变体失败（如Pillow未编译AVIF支持）不影响其他变体
+            print(f"编码缩略图变体失败 {jpg_path} [{variant}]: {e}")
+
+
+def store_thumbnails(sha1: str, rendered: Dict[str, bytes]) -> None:
+    """把渲染好的缩略图写入当前存储后端"""
+    store = get_thumb_store()
+    for variant, thumb_bytes in rendered.items():
+        store.put(thumb_filename(sha1, variant), thumb_bytes)
+
+
+def generate_thumbnail(
+    jpg_path: Path,
+    sha1: str,
+    width: int = 512,
+    data: Optional[bytes] = None,
+) -> bool:
+    """
+    生成缩略图金字塔并保存（一次解码，同时生成 grid / preview / lightbox 三个尺寸）
     
-    thumb_path = thumbs_dir / f"{sha1}.jpg"
+    Args:
+        jpg_path: 原始JPG文件路径
+        sha1: 文件SHA1（用作缩略图文件名）
+        width: preview缩略图宽度（默认512px）
+        data: 已读入内存的文件内容（可选，传入则不再读取磁盘）
     
-    # 如果缩略图已存在，直接返回
-    if thumb_path.exists():
-        return thumb_path
+    Returns:
+        preview缩略图是否可用
+    """
+    # 只生成尚不存在的变体（旧布局中已存在的也算）
+    missing = missing_thumb_widths(sha1, width)
+    if missing:
+        try:
+            store_thumbnails(sha1, render_thumbnails(jpg_path, missing, data))
+        except Exception as e:
+            print(f"生成缩略图失败 {jpg_path}: {e}")
+            return False
     
+    return thumb_exists(sha1, "preview")
+
+
+# 感知哈希（dHash）：缩小为 (DHASH_SIZE+1) x DHASH_SIZE 的灰度图，
+# 逐行比较相邻像素的明暗，得到 DHASH_SIZE*DHASH_SIZE = 64 位哈希
+DHASH_SIZE = 8
+
+# 计算dHash时draft解码的最小尺寸（JPEG在DCT域按1/8缩小，几乎不花时间）
+DHASH_DRAFT_SIZE = (64, 64)
+
+
+def dhash_image(img: Image.Image) -> str:
+    """
+    计算已打开图片的dHash
+    
+    Returns:
+        16位十六进制字符串（64位）
+    """
+    small = img.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.Resampling.BOX)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{DHASH_SIZE * DHASH_SIZE // 4}x}"
+
+
+def compute_dhash(image_path: Path, data: Optional[bytes] = None) -> Optional[str]:
+    """
+    计算照片的感知哈希（用于近似重复/连拍检测）
+    使用draft模式解码到缩略图级别的尺寸，原图和已生成的缩略图得到的哈希基本一致
+    
+    Args:
+        image_path: 图片路径（原图或缩略图）
+        data: 已读入内存的文件内容（可选，传入则不再读取磁盘）
+    
+    Returns:
+        16位十六进制字符串，无法解码时返回None
+    """
     try:
-        with Image.open(jpg_path) as img:
-            # 保持宽高比缩放
-            ratio = width / img.width
-            new_height = int(img.height * ratio)
-            
-            # 使用高质量缩放
-            img_resized = img.resize((width, new_height), Image.Resampling.LANCZOS)
-            
-            # 转换为RGB（处理RGBA等格式）
-            if img_resized.mode in ("RGBA", "P"):
-                img_resized = img_resized.convert("RGB")
-            
-            # 保存缩略图
-            img_resized.save(thumb_path, "JPEG", quality=85, optimize=True)
-            return thumb_path
-            
+        source: Union[Path, io.BytesIO] = io.BytesIO(data) if data is not None else image_path
+        with Image.open(source) as img:
+            img.draft("L", DHASH_DRAFT_SIZE)
+            return dhash_image(img)
     except Exception as e:
-        print(f"生成缩略图失败 {jpg_path}: {e}")
+        print(f"计算感知哈希失败 {image_path}: {e}")
         return None
 
 
-def parse_exif(jpg_path: Path) -> Dict[str, Any]:
+def parse_exif(jpg_path: Path, data: Optional[bytes] = None) -> Dict[str, Any]:
     """
     解析JPG文件的EXIF信息
     
     Args:
         jpg_path: JPG文件路径
+        data: 已读入内存的文件内容（可选，传入则直接从APP1段解析，不再读取磁盘）
     
     Returns:
         包含EXIF信息的字典，缺失字段为None
@@ -102,7 +299,7 @@ def parse_exif(jpg_path: Path) -> Dict[str, Any]:
     }
     
     try:
-        exif_dict = piexif.load(str(jpg_path))
+        exif_dict = piexif.load(data if data is not None else str(jpg_path))
         
         # 拍摄时间
         if piexif.ExifIFD.DateTimeOriginal in exif_dict.get("Exif", {}):
@@ -168,6 +365,7 @@ def parse_exif(jpg_path: Path) -> Dict[str, Any]:
 def find_matching_raw(jpg_path: Path) -> Optional[Path]:
     """
     查找与JPG同名的RAW文件
+    使用进程内共享的目录索引：同一目录只在其修改时间变化（文件增删/改名）后才重新scandir
     
     Args:
         jpg_path: JPG文件路径
@@ -175,17 +373,118 @@ def find_matching_raw(jpg_path: Path) -> Optional[Path]:
     Returns:
         RAW文件路径，不存在返回None
     """
-    stem = jpg_path.stem  # 不含扩展名的文件名
-    parent = jpg_path.parent
+    return _shared_sidecars.find_raw(jpg_path)
+
+
+class SidecarIndex:
+    """
+    目录级伴随文件索引
+    每个目录只做一次 os.scandir，建立 文件名主干 → {扩展名: 路径} 的映射，
+    代替逐个扩展名、逐种大小写的 Path.exists() 检查（每张JPG最多18次stat）
+    主干按 casefold 匹配（IMG_0001.jpg 与 img_0001.ARW 视为同一张）
+    线程安全，可在扫描的I/O线程池中共享
     
-    for ext in RAW_EXTENSIONS:
-        # 尝试大小写变体
-        for case_ext in [ext, ext.upper()]:
-            raw_path = parent / f"{stem}{case_ext}"
-            if raw_path.exists():
-                return raw_path
+    revalidate=True 时每次查找先stat目录，修改时间变化则重新扫描该目录，
+    适合长期存在的索引（一次扫描内的索引不需要）；缓存的目录数超过 MAX_DIRS 时整体清空
+    """
     
-    return None
+    _RAW_RANK = {ext: i for i, ext in enumerate(RAW_EXTENSIONS)}
+    _STEM_EXTENSIONS = set(RAW_EXTENSIONS) | {ext.lower() for ext in JPG_EXTENSIONS}
+    _INDEXED_EXTENSIONS = set(RAW_EXTENSIONS) | set(SIDECAR_EXTENSIONS)
+    MAX_DIRS = 1024
+    
+    def __init__(self, revalidate: bool = False):
+        self._lock = threading.Lock()
+        self._revalidate = revalidate
+        # 目录 → {casefold后的文件名主干: {小写扩展名: 路径}}
+        self._dirs: Dict[str, Dict[str, Dict[str, Path]]] = {}
+        # 目录 → 扫描时的修改时间（仅 revalidate 时使用）
+        self._mtimes: Dict[str, Optional[int]] = {}
+    
+    def split_name(self, name: str) -> tuple[str, str]:
+        """
+        拆分文件名为 (casefold后的主干, 小写扩展名)
+        XMP可能命名为 IMG_0001.ARW.xmp，此时去掉内层扩展名
+        """
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower()
+        if ext in SIDECAR_EXTENSIONS:
+            inner_stem, inner_ext = os.path.splitext(stem)
+            if inner_ext.lower() in self._STEM_EXTENSIONS:
+                stem = inner_stem
+        return stem.casefold(), ext
+    
+    def _scan_dir(self, directory: Path) -> Dict[str, Dict[str, Path]]:
+        """扫描目录，建立主干映射"""
+        mapping: Dict[str, Dict[str, Path]] = {}
+        wanted = self._INDEXED_EXTENSIONS
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    stem, ext = self.split_name(entry.name)
+                    if ext in wanted and entry.is_file():
+                        mapping.setdefault(stem, {})[ext] = Path(entry.path)
+        except OSError:
+            pass
+        return mapping
+    
+    def is_indexed_extension(self, ext: str) -> bool:
+        """小写扩展名是否属于RAW或伴随文件"""
+        return ext in self._INDEXED_EXTENSIONS
+    
+    def add_directory(self, directory: Path, mapping: Dict[str, Dict[str, Path]]) -> None:
+        """直接登记已扫描好的目录映射（目录遍历时顺便构建，免去再次scandir）"""
+        with self._lock:
+            self._dirs[str(directory)] = mapping
+    
+    def _entries_for(self, jpg_path: Path) -> Dict[str, Path]:
+        directory = jpg_path.parent
+        key = str(directory)
+        if self._revalidate:
+            return self._revalidated_entries(directory, key).get(jpg_path.stem.casefold(), {})
+        
+        with self._lock:
+            mapping = self._dirs.get(key)
+        if mapping is None:
+            mapping = self._scan_dir(directory)
+            with self._lock:
+                mapping = self._dirs.setdefault(key, mapping)
+        return mapping.get(jpg_path.stem.casefold(), {})
+    
+    def _revalidated_entries(self, directory: Path, key: str) -> Dict[str, Dict[str, Path]]:
+        """按目录修改时间校验缓存，变化时重新扫描（修改时间在扫描前取得，扫描期间的变化下次会被发现）"""
+        try:
+            mtime: Optional[int] = directory.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            if key in self._dirs and self._mtimes.get(key) == mtime:
+                return self._dirs[key]
+        
+        mapping = self._scan_dir(directory)
+        with self._lock:
+            if len(self._dirs) >= self.MAX_DIRS:
+                self._dirs.clear()
+                self._mtimes.clear()
+            self._dirs[key] = mapping
+            self._mtimes[key] = mtime
+        return mapping
+    
+    def find_raw(self, jpg_path: Path) -> Optional[Path]:
+        """查找与JPG同名的RAW文件（多个时按 RAW_EXTENSIONS 顺序优先）"""
+        entries = self._entries_for(jpg_path)
+        raws = [ext for ext in entries if ext in self._RAW_RANK]
+        if not raws:
+            return None
+        return entries[min(raws, key=self._RAW_RANK.__getitem__)]
+    
+    def find_sidecars(self, jpg_path: Path) -> Dict[str, Path]:
+        """查找与JPG同名的伴随文件，返回 {小写扩展名: 路径}"""
+        return {ext: path for ext, path in self._entries_for(jpg_path).items() if ext in SIDECAR_EXTENSIONS}
+
+
+# find_matching_raw 共用的目录索引
+_shared_sidecars = SidecarIndex(revalidate=True)
 
 
 def format_shutter_speed(shutter: Optional[float]) -> str:
@@ -2,8 +2,14 @@
 db模块初始化
 """
 from .session import get_db, init_db, SessionLocal, Base, engine
-from .models import Photo
-from .photos_repo import PhotosRepository
+from .models import Photo, PhotoStat, PhotoBucketStat, FileFingerprint, Job, ClassificationCache, SchemaMigration
+from .models import DuplicateCluster, DuplicateClusterRun
+from .photos_repo import PhotosRepository, PhotoProjection
+from .stats_repo import PhotoStatsRepository
+from .fingerprints_repo import FingerprintRepository
+from .jobs_repo import JobsRepository
+from .classification_cache_repo import ClassificationCacheRepository
+from .dedup_repo import DedupRepository
 
 __all__ = [
     "get_db",
@@ -12,5 +18,19 @@ __all__ = [
     "Base",
     "engine",
     "Photo",
+    "PhotoStat",
+    "PhotoBucketStat",
+    "FileFingerprint",
+    "Job",
+    "ClassificationCache",
+    "SchemaMigration",
+    "DuplicateCluster",
+    "DuplicateClusterRun",
     "PhotosRepository",
+    "PhotoProjection",
+    "PhotoStatsRepository",
+    "FingerprintRepository",
+    "JobsRepository",
+    "ClassificationCacheRepository",
+    "DedupRepository",
 ]
@@ -0,0 +1,181 @@
+"""
+AI分类缓存数据库操作模块
+按 (照片内容SHA1, 模型, Prompt版本) 读写分类结果，按最近使用时间淘汰
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .models import ClassificationCache
+from .session import dialect_insert
+
+
+# IN查询分块大小（SQLite默认最多999个绑定参数）
+LOOKUP_CHUNK_SIZE = 500
+
+
+class CacheCounters:
+    """进程内命中/未命中计数（服务重启后清零）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+cache_counters = CacheCounters()
+
+
+class ClassificationCacheRepository:
+    """AI分类缓存数据仓库"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_many(self, sha1_list: List[str], model: str, prompt_version: str) -> Dict[str, Dict[str, Any]]:
+        """
+        批量查询缓存，命中的记录更新最近使用时间和命中次数
+
+        Returns:
+            {sha1: 分类结果}
+        """
+        found: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(sha1_list), LOOKUP_CHUNK_SIZE):
+            chunk = sha1_list[i:i + LOOKUP_CHUNK_SIZE]
+            rows = self.db.query(ClassificationCache.sha1, ClassificationCache.result_json).filter(
+                ClassificationCache.sha1.in_(chunk),
+                ClassificationCache.model == model,
+                ClassificationCache.prompt_version == prompt_version,
+            ).all()
+            found.update({row.sha1: row.result_json for row in rows})
+
+        hit_list = list(found)
+        now = datetime.now()
+        for i in range(0, len(hit_list), LOOKUP_CHUNK_SIZE):
+            self.db.query(ClassificationCache).filter(
+                ClassificationCache.sha1.in_(hit_list[i:i + LOOKUP_CHUNK_SIZE]),
+                ClassificationCache.model == model,
+                ClassificationCache.prompt_version == prompt_version,
+            ).update(
+                {
+                    ClassificationCache.hit_count: ClassificationCache.hit_count + 1,
+                    ClassificationCache.last_used_at: now,
+                },
+                synchronize_session=False,
+            )
+        if hit_list:
+            self.db.commit()
+
+        cache_counters.add(hits=len(found), misses=len(sha1_list) - len(found))
+        return found
+
+    def put_many(self, entries: Dict[str, Dict[str, Any]], model: str, prompt_version: str) -> None:
+        """
+        批量写入缓存（已存在则覆盖结果）
+
+        Args:
+            entries: {sha1: 分类结果}
+        """
+        if not entries:
+            return
+
+        now = datetime.now()
+        rows = [
+            {
+                "sha1": sha1,
+                "model": model,
+                "prompt_version": prompt_version,
+                "result_json": result,
+                "hit_count": 0,
+                "created_at": now,
+                "last_used_at": now,
+            }
+            for sha1, result in entries.items()
+        ]
+
+        stmt = dialect_insert(self.db, ClassificationCache.__table__)
+        if self.db.get_bind().dialect.name == "mysql":
+            stmt = stmt.on_duplicate_key_update(
+                result_json=stmt.inserted.result_json,
+                last_used_at=stmt.inserted.last_used_at,
+            )
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["sha1", "model", "prompt_version"],
+                set_={
+                    "result_json": stmt.excluded.result_json,
+                    "last_used_at": stmt.excluded.last_used_at,
+                },
+            )
+        self.db.execute(stmt, rows)
+        self.db.commit()
+
+    def evict(self, max_entries: int, ttl_days: int = 0) -> int:
+        """
+        淘汰缓存：先删除超过保留天数未使用的记录，再按最近使用时间删除超出上限的部分
+
+        Args:
+            max_entries: 最大保留条数（0表示不限）
+            ttl_days: 未使用超过该天数即删除（0表示不按时间淘汰）
+
+        Returns:
+            删除的条数
+        """
+        deleted = 0
+        if ttl_days:
+            deleted += self.db.query(ClassificationCache).filter(
+                ClassificationCache.last_used_at < datetime.now() - timedelta(days=ttl_days)
+            ).delete(synchronize_session=False)
+
+        if max_entries:
+            excess = self.count() - max_entries
+            # 按 (最近使用时间, id) 取最久未使用的记录，分块删除恰好excess条
+            # （同一批写入的记录使用时间相同，按时间阈值删除会把整批一起删掉）
+            while excess > 0:
+                ids = [row.id for row in self.db.query(ClassificationCache.id).order_by(
+                    ClassificationCache.last_used_at, ClassificationCache.id
+                ).limit(min(excess, LOOKUP_CHUNK_SIZE)).all()]
+                if not ids:
+                    break
+                self.db.query(ClassificationCache).filter(
+                    ClassificationCache.id.in_(ids)
+                ).delete(synchronize_session=False)
+                deleted += len(ids)
+                excess -= len(ids)
+
+        if deleted:
+            self.db.commit()
+        return deleted
+
+    def count(self) -> int:
+        return self.db.query(func.count(ClassificationCache.id)).scalar() or 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存统计：条数、累计命中次数，以及本进程的命中/未命中计数"""
+        total_hits = self.db.query(func.sum(ClassificationCache.hit_count)).scalar() or 0
+        return {
+            "entries": self.count(),
+            "total_hits": int(total_hits),
+            "session": cache_counters.to_dict(),
+        }
+
+    def clear(self) -> int:
+        """清空缓存，返回删除条数"""
+        deleted = self.db.query(ClassificationCache).delete(synchronize_session=False)
+        self.db.commit()
+        return deleted
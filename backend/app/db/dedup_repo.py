@@ -0,0 +1,94 @@
+"""
+近似重复分组数据库操作模块
+分组由后台任务计算后整体替换写入，查询按成员数从多到少分页读取
+"""
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .models import Photo, DuplicateCluster, DuplicateClusterRun
+
+
+# 批量写入分块大小
+INSERT_CHUNK_SIZE = 1000
+
+
+class DedupRepository:
+    """近似重复分组数据仓库"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def photo_signature(self) -> Tuple[int, Optional[int], int]:
+        """照片表签名：(照片总数, 最大照片ID, 有感知哈希的照片数)，照片增删或补算哈希后变化"""
+        count, max_id, hashed = self.db.query(
+            func.count(Photo.id), func.max(Photo.id), func.count(Photo.dhash)
+        ).one()
+        return int(count or 0), max_id, int(hashed or 0)
+
+    def replace(self, max_distance: int, clusters: List[Dict[str, Any]], signature: Tuple[int, Optional[int], int]) -> None:
+        """
+        用新的分组结果替换该阈值下的全部分组，并记录计算时的照片表签名
+
+        Args:
+            clusters: 分组列表（photo_ids、representative_id、size、is_burst、start_at、end_at）
+            signature: 计算前取得的 photo_signature()
+        """
+        self.db.query(DuplicateCluster).filter(
+            DuplicateCluster.max_distance == max_distance
+        ).delete(synchronize_session=False)
+
+        rows = [{"max_distance": max_distance, **cluster} for cluster in clusters]
+        for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+            self.db.execute(DuplicateCluster.__table__.insert(), rows[i:i + INSERT_CHUNK_SIZE])
+
+        photo_count, max_photo_id, hashed = signature
+        self.db.merge(DuplicateClusterRun(
+            max_distance=max_distance,
+            photo_count=photo_count,
+            max_photo_id=max_photo_id,
+            hashed=hashed,
+            computed_at=datetime.now(),
+        ))
+        self.db.commit()
+
+    def get_run(self, max_distance: int) -> Optional[DuplicateClusterRun]:
+        """该阈值最近一次的计算记录，未计算过返回None"""
+        return self.db.query(DuplicateClusterRun).filter(
+            DuplicateClusterRun.max_distance == max_distance
+        ).first()
+
+    def list_clusters(
+        self,
+        max_distance: int,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        min_size: int = 2,
+        bursts_only: bool = False,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> Tuple[List[DuplicateCluster], int, int]:
+        """
+        分页查询分组（按成员数从多到少）
+
+        Args:
+            date_from/date_to: 只返回拍摄时间完全落在范围内的组
+
+        Returns:
+            (分组列表, 符合条件的组数, 符合条件的组的照片总数)
+        """
+        filters = [DuplicateCluster.max_distance == max_distance, DuplicateCluster.size >= min_size]
+        if bursts_only:
+            filters.append(DuplicateCluster.is_burst == 1)
+        if date_from:
+            filters.append(DuplicateCluster.start_at >= date_from)
+        if date_to:
+            filters.append(DuplicateCluster.end_at <= date_to)
+
+        total, photos = self.db.query(
+            func.count(DuplicateCluster.id), func.sum(DuplicateCluster.size)
+        ).filter(*filters).one()
+        clusters = self.db.query(DuplicateCluster).filter(*filters).order_by(
+            DuplicateCluster.size.desc(), DuplicateCluster.id
+        ).offset(offset).limit(limit).all()
+        return clusters, int(total or 0), int(photos or 0)
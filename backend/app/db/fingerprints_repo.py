@@ -0,0 +1,94 @@
+"""
+文件指纹数据库操作模块
+用于增量扫描：按 (路径, 大小, 修改时间) 判断文件是否已处理过
+"""
+import hashlib
+from datetime import datetime
+from typing import List, Dict, Tuple
+from sqlalchemy.orm import Session
+from .models import FileFingerprint
+from .session import dialect_insert
+
+
+# IN查询分块大小（SQLite默认最多999个绑定参数）
+LOOKUP_CHUNK_SIZE = 500
+
+
+def hash_path(file_path: str) -> str:
+    """计算路径的SHA1，作为指纹表的索引键"""
+    return hashlib.sha1(file_path.encode("utf-8", errors="surrogateescape")).hexdigest()
+
+
+class FingerprintRepository:
+    """文件指纹数据仓库"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_by_paths(self, file_paths: List[str]) -> Dict[str, FileFingerprint]:
+        """
+        批量获取文件指纹
+        
+        Args:
+            file_paths: 文件路径列表
+        
+        Returns:
+            {文件路径: 指纹记录}
+        """
+        hash_to_path = {hash_path(p): p for p in file_paths}
+        hashes = list(hash_to_path)
+        
+        result = {}
+        for i in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+            chunk = hashes[i:i + LOOKUP_CHUNK_SIZE]
+            rows = self.db.query(FileFingerprint).filter(FileFingerprint.path_hash.in_(chunk)).all()
+            for row in rows:
+                result[hash_to_path[row.path_hash]] = row
+        
+        return result
+    
+    def upsert_many(self, entries: List[Tuple[str, int, int, str]]) -> None:
+        """
+        批量写入/更新文件指纹
+        
+        Args:
+            entries: [(文件路径, 文件大小, 修改时间ns, 内容SHA1), ...]
+        """
+        if not entries:
+            return
+        
+        # 同一路径以最后一次为准
+        rows = [
+            {
+                "path_hash": hash_path(file_path),
+                "file_path": file_path,
+                "file_size": file_size,
+                "mtime_ns": mtime_ns,
+                "sha1": sha1,
+                "updated_at": datetime.now(),
+            }
+            for file_path, file_size, mtime_ns, sha1 in entries
+        ]
+        rows = list({r["path_hash"]: r for r in rows}.values())
+        
+        # 数据库原生upsert，一条语句完成插入或更新
+        stmt = dialect_insert(self.db, FileFingerprint.__table__)
+        if self.db.get_bind().dialect.name == "mysql":
+            stmt = stmt.on_duplicate_key_update(
+                file_size=stmt.inserted.file_size,
+                mtime_ns=stmt.inserted.mtime_ns,
+                sha1=stmt.inserted.sha1,
+                updated_at=stmt.inserted.updated_at,
+            )
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["path_hash"],
+                set_={
+                    "file_size": stmt.excluded.file_size,
+                    "mtime_ns": stmt.excluded.mtime_ns,
+                    "sha1": stmt.excluded.sha1,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            )
+        self.db.execute(stmt, rows)
+        # 注意：不在这里commit，由调用方统一提交
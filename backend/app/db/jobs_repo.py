@@ -0,0 +1,93 @@
+"""
+后台任务数据库操作模块
+"""
+import uuid
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+from sqlalchemy.orm import Session
+from .models import Job
+
+
+class JobsRepository:
+    """后台任务数据仓库"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(self, job_type: str, params: Dict[str, Any]) -> Job:
+        """创建任务（状态为pending）"""
+        job = Job(
+            id=uuid.uuid4().hex,
+            job_type=job_type,
+            status="pending",
+            params_json=params,
+            attempts=0,
+            created_at=datetime.now(),
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def get_by_id(self, job_id: str) -> Optional[Job]:
+        """根据ID获取任务"""
+        return self.db.query(Job).filter(Job.id == job_id).first()
+
+    def list_recent(self, limit: int = 50, job_type: Optional[str] = None) -> List[Job]:
+        """按创建时间倒序获取最近的任务"""
+        query = self.db.query(Job)
+        if job_type:
+            query = query.filter(Job.job_type == job_type)
+        return query.order_by(Job.created_at.desc()).limit(limit).all()
+
+    def list_unfinished(self) -> List[Job]:
+        """获取未结束的任务（按创建时间顺序），用于重启后恢复"""
+        return self.db.query(Job).filter(
+            Job.status.in_(["pending", "running"])
+        ).order_by(Job.created_at).all()
+
+    def mark_running(self, job_id: str) -> Optional[Job]:
+        """标记任务开始执行，执行次数+1"""
+        job = self.get_by_id(job_id)
+        if job:
+            job.status = "running"
+            job.started_at = datetime.now()
+            job.attempts = (job.attempts or 0) + 1
+            self.db.commit()
+        return job
+
+    def requeue(self, job_id: str, progress: Optional[Dict[str, Any]] = None) -> None:
+        """把中断的任务放回队列（服务关闭时调用，下次启动恢复执行）"""
+        self.db.query(Job).filter(Job.id == job_id).update(
+            {Job.status: "pending", Job.progress_json: progress}, synchronize_session=False
+        )
+        self.db.commit()
+
+    def finish(
+        self,
+        job_id: str,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        progress: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Job]:
+        """标记任务结束（completed/failed/cancelled）"""
+        job = self.get_by_id(job_id)
+        if job:
+            job.status = status
+            job.result_json = result
+            job.error = error
+            if progress is not None:
+                job.progress_json = progress
+            job.finished_at = datetime.now()
+            self.db.commit()
+        return job
+
+    def delete_finished_before(self, before: datetime) -> int:
+        """删除指定时间之前结束的任务，返回删除数量"""
+        count = self.db.query(Job).filter(
+            Job.status.in_(["completed", "failed", "cancelled"]),
+            Job.finished_at < before,
+        ).delete(synchronize_session=False)
+        self.db.commit()
+        return count
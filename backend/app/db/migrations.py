@@ -0,0 +1,119 @@
+"""
+数据库结构迁移
+create_all 只会创建不存在的表，已有数据库上的新增列、索引变化由这里的迁移按版本依次执行
+- 已执行的版本记录在 schema_migrations 表中，每个版本只执行一次
+- 迁移函数都是幂等的（先检查列/索引是否存在）：新建的数据库上表结构已是最新，执行时什么也不做
+- 新增迁移：在 MIGRATIONS 末尾追加 (版本号, 说明, 函数)，版本号递增；
+  新增的列、索引同时写在 models.py 的模型定义中
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from .session import Base
+from .models import SchemaMigration
+
+
+# ========== 幂等的结构变更 ==========
+
+def add_column(conn: Connection, table_name: str, column_name: str) -> None:
+    """按模型定义为已有表添加可空列（已存在则跳过）"""
+    existing = {col["name"] for col in inspect(conn).get_columns(table_name)}
+    if column_name in existing:
+        return
+    column = Base.metadata.tables[table_name].c[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type} NULL"))
+    print(f"已为表 {table_name} 添加列 {column_name}")
+
+
+def create_index(conn: Connection, table_name: str, index_name: str) -> None:
+    """按模型定义创建索引（已存在则跳过）"""
+    existing = {index["name"] for index in inspect(conn).get_indexes(table_name)}
+    if index_name in existing:
+        return
+    table = Base.metadata.tables[table_name]
+    index = next(index for index in table.indexes if index.name == index_name)
+    index.create(conn)
+    print(f"已为表 {table_name} 创建索引 {index_name}")
+
+
+def drop_index(conn: Connection, table_name: str, index_name: str) -> None:
+    """删除已被替换的旧索引（不存在则跳过）"""
+    existing = {index["name"] for index in inspect(conn).get_indexes(table_name)}
+    if index_name not in existing:
+        return
+    on_table = f" ON {table_name}" if conn.dialect.name == "mysql" else ""
+    conn.execute(text(f"DROP INDEX {index_name}{on_table}"))
+    print(f"已删除表 {table_name} 的旧索引 {index_name}")
+
+
+# ========== 迁移列表 ==========
+
+def _add_photo_dhash(conn: Connection) -> None:
+    add_column(conn, "photos", "dhash")
+
+
+def _photo_taken_at_id_index(conn: Connection) -> None:
+    # (taken_at, id) 复合索引覆盖原单列索引
+    create_index(conn, "photos", "idx_photos_taken_at_id")
+    drop_index(conn, "photos", "idx_photos_taken_at")
+
+
+def _photo_filter_indexes(conn: Connection) -> None:
+    # 类别/精选的复合索引覆盖原单列索引
+    for name in (
+        "idx_photos_category_taken_at",
+        "idx_photos_selected_taken_at",
+        "idx_photos_focal_length",
+        "idx_photos_iso",
+        "idx_photos_camera_taken_at",
+        "idx_photos_taken_at_params",
+    ):
+        create_index(conn, "photos", name)
+    drop_index(conn, "photos", "idx_photos_category")
+    drop_index(conn, "photos", "idx_photos_selected")
+
+
+def _build_photo_stats(conn: Connection) -> None:
+    # 统计聚合表（按日期的类别/相机表 photo_stats、焦距/ISO/光圈分段表 photo_bucket_stats）
+    # 由 create_all 创建，这里按已有照片填充
+    from .stats_repo import PhotoStatsRepository
+    PhotoStatsRepository(conn).rebuild()
+
+
+# (版本号, 说明, 迁移函数)
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "photos 添加感知哈希列 dhash", _add_photo_dhash),
+    (2, "photos 添加 (taken_at, id) 分页索引", _photo_taken_at_id_index),
+    (3, "photos 添加筛选组合索引和统计覆盖索引", _photo_filter_indexes),
+    (4, "按已有照片填充统计聚合表 photo_stats、photo_bucket_stats", _build_photo_stats),
+]
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """
+    执行尚未执行的迁移（每个迁移在独立事务中执行并记录版本）
+
+    Returns:
+        本次执行的版本号列表
+    """
+    with engine.connect() as conn:
+        applied = set(conn.execute(select(SchemaMigration.version)).scalars())
+
+    executed = []
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.now(),
+            ))
+        print(f"已执行数据库迁移 {version}: {description}")
+        executed.append(version)
+    return executed
@@ -4,8 +4,9 @@
 """
 from datetime import datetime
 from typing import Optional, List, TYPE_CHECKING
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, DateTime, Float, JSON, Index
 from .session import Base
+from ..core.thumbs import thumb_url
 
 if TYPE_CHECKING:
     # 类型检查时使用的类型提示
@@ -47,6 +48,7 @@ class Photo(Base):
     
     # 去重
     sha1 = Column(String(40), nullable=False, unique=True, comment="JPG内容SHA1哈希")
+    dhash = Column(String(16), nullable=True, comment="感知哈希dHash（64位十六进制），用于近似重复/连拍检测")
     
     # 时间戳
     created_at = Column(DateTime, nullable=False, default=datetime.now, comment="创建时间")
@@ -54,9 +56,17 @@ class Photo(Base):
     
     # 索引
     __table_args__ = (
-        Index("idx_photos_taken_at", "taken_at"),
-        Index("idx_photos_category", "category"),
-        Index("idx_photos_selected", "is_selected"),
+        # 照片列表按 (taken_at, id) 倒序分页（游标分页直接从索引位置继续读取）
+        Index("idx_photos_taken_at_id", "taken_at", "id"),
+        # 按类别/精选筛选的照片列表：等值列在前，排序列在后，筛选后无需再排序
+        Index("idx_photos_category_taken_at", "category", "taken_at", "id"),
+        Index("idx_photos_selected_taken_at", "is_selected", "taken_at", "id"),
+        # 焦距/ISO范围筛选
+        Index("idx_photos_focal_length", "focal_length"),
+        Index("idx_photos_iso", "iso"),
+        # 统计（get_statistics）的覆盖索引：按日期范围分组统计相机、焦距/ISO/光圈分段时只读索引
+        Index("idx_photos_camera_taken_at", "camera_model", "taken_at"),
+        Index("idx_photos_taken_at_params", "taken_at", "focal_length", "iso", "aperture"),
     )
     
     def to_dict(self) -> dict:
@@ -83,12 +93,218 @@ class Photo(Base):
             "caption": self.caption,
             "is_selected": bool(self.is_selected),
             "sha1": self.sha1,
-            "thumb_url": f"/static/thumbs/{self.sha1}.jpg",
+            "thumb_url": thumb_url(self.sha1),
+            "grid_url": thumb_url(self.sha1, "grid"),
+            "lightbox_url": thumb_url(self.sha1, "lightbox"),
             "created_at": created_at.isoformat() if created_at else None,
             "updated_at": updated_at.isoformat() if updated_at else None,
         }
 
 
+class PhotoStat(Base):
+    """
+    照片统计聚合模型（按日期的类别/相机汇总）
+    按 (拍摄日期, 类别, 相机) 预先汇总照片数，统计任意日期范围时只需对少量行求和；
+    焦距/ISO/光圈分段各自按日期汇总在 photo_bucket_stats 中（各维度分开汇总，行数不随维度组合膨胀）；
+    照片增删改时在同一事务中重算受影响日期的行（见 stats_repo.py）
+    """
+    __tablename__ = "photo_stats"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    
+    day = Column(Date, nullable=True, comment="拍摄日期（没有拍摄时间的照片为NULL）")
+    category = Column(String(50), nullable=False, comment="照片类别")
+    camera_model = Column(String(255), nullable=True, comment="相机型号")
+    
+    photo_count = Column(Integer, nullable=False, default=0, comment="照片数")
+    raw_count = Column(Integer, nullable=False, default=0, comment="含RAW的照片数")
+    selected_count = Column(Integer, nullable=False, default=0, comment="精选照片数")
+    
+    __table_args__ = (
+        Index("idx_photo_stats_day", "day"),
+    )
+
+
+class PhotoBucketStat(Base):
+    """
+    照片分段统计聚合模型
+    按 (拍摄日期, 维度, 分段) 预先汇总照片数，维度为 focal_lengths/isos/apertures；
+    没有对应参数的照片不计入该维度
+    """
+    __tablename__ = "photo_bucket_stats"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    
+    day = Column(Date, nullable=True, comment="拍摄日期（没有拍摄时间的照片为NULL）")
+    dimension = Column(String(16), nullable=False, comment="维度：focal_lengths/isos/apertures")
+    bucket = Column(String(32), nullable=False, comment="分段名称")
+    
+    photo_count = Column(Integer, nullable=False, default=0, comment="照片数")
+    
+    __table_args__ = (
+        Index("idx_photo_bucket_stats_day", "day"),
+    )
+
+
+class FileFingerprint(Base):
+    """
+    文件指纹模型
+    记录已扫描文件的 (路径, 大小, 修改时间) → 内容SHA1
+    重新扫描时指纹未变的文件直接跳过，无需再次读取和计算哈希
+    """
+    __tablename__ = "file_fingerprints"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    
+    # 路径较长且为Text类型，无法直接建唯一索引，使用路径的SHA1作为索引键
+    path_hash = Column(String(40), nullable=False, unique=True, comment="文件路径SHA1")
+    file_path = Column(Text, nullable=False, comment="文件路径")
+    file_size = Column(BigInteger, nullable=False, comment="文件大小(字节)")
+    mtime_ns = Column(BigInteger, nullable=False, comment="文件修改时间(纳秒)")
+    
+    # 对应photos.sha1
+    sha1 = Column(String(40), nullable=False, comment="文件内容SHA1")
+    
+    updated_at = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now, comment="更新时间")
+
+
+class SchemaMigration(Base):
+    """
+    数据库迁移记录模型
+    记录已执行的结构迁移版本（见 migrations.py）
+    """
+    __tablename__ = "schema_migrations"
+    
+    version = Column(Integer, primary_key=True, autoincrement=False, comment="迁移版本号")
+    description = Column(String(255), nullable=False, comment="迁移说明")
+    applied_at = Column(DateTime, nullable=False, default=datetime.now, comment="执行时间")
+
+
+class ClassificationCache(Base):
+    """
+    AI分类结果缓存
+    按 (照片内容SHA1, 模型, Prompt版本) 缓存分类结果：缩略图由内容SHA1唯一确定，
+    同一张照片重新导入或出现在多张卡上时无需再次调用AI
+    """
+    __tablename__ = "classification_cache"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    
+    sha1 = Column(String(40), nullable=False, comment="照片内容SHA1")
+    model = Column(String(100), nullable=False, comment="视觉模型名称")
+    prompt_version = Column(String(16), nullable=False, comment="分类Prompt版本")
+    
+    result_json = Column(JSON, nullable=False, comment="分类结果JSON（category/tags/caption）")
+    
+    hit_count = Column(Integer, nullable=False, default=0, comment="命中次数")
+    created_at = Column(DateTime, nullable=False, default=datetime.now, comment="创建时间")
+    last_used_at = Column(DateTime, nullable=False, default=datetime.now, comment="最近使用时间（LRU淘汰依据）")
+    
+    __table_args__ = (
+        Index("uq_classification_cache_key", "sha1", "model", "prompt_version", unique=True),
+        Index("idx_classification_cache_last_used", "last_used_at"),
+    )
+
+
+class DuplicateCluster(Base):
+    """
+    近似重复照片组
+    由后台任务按汉明距离阈值对全部照片分组后写入，查询时直接读取，不在请求中计算
+    """
+    __tablename__ = "duplicate_clusters"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    max_distance = Column(Integer, nullable=False, comment="分组使用的汉明距离阈值")
+    representative_id = Column(Integer, nullable=False, comment="代表照片ID（与组内其他照片最相似的一张）")
+    photo_ids = Column(JSON, nullable=False, comment="组内照片ID（按拍摄时间排序）")
+    size = Column(Integer, nullable=False, comment="成员数")
+    is_burst = Column(Integer, nullable=False, default=0, comment="是否连拍 0/1")
+    start_at = Column(DateTime, nullable=True, comment="组内最早拍摄时间")
+    end_at = Column(DateTime, nullable=True, comment="组内最晚拍摄时间")
+
+    __table_args__ = (
+        Index("idx_duplicate_clusters_distance_size", "max_distance", "size"),
+    )
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        return {
+            "photo_ids": self.photo_ids,
+            "representative_id": self.representative_id,
+            "size": self.size,
+            "is_burst": bool(self.is_burst),
+            "start": self.start_at.isoformat() if self.start_at else None,
+            "end": self.end_at.isoformat() if self.end_at else None,
+        }
+
+
+class DuplicateClusterRun(Base):
+    """
+    近似重复分组的计算记录（每个汉明距离阈值一条）
+    保存计算时照片表的签名，用于判断分组结果是否已过期
+    """
+    __tablename__ = "duplicate_cluster_runs"
+
+    max_distance = Column(Integer, primary_key=True, autoincrement=False, comment="汉明距离阈值")
+
+    photo_count = Column(Integer, nullable=False, comment="计算时的照片总数")
+    max_photo_id = Column(Integer, nullable=True, comment="计算时的最大照片ID")
+    hashed = Column(Integer, nullable=False, comment="参与分组的照片数（有感知哈希）")
+
+    computed_at = Column(DateTime, nullable=False, default=datetime.now, comment="计算时间")
+
+
+class Job(Base):
+    """
+    后台任务模型
+    扫描/整理/导出/AI分类作为后台任务执行，任务状态持久化到数据库，
+    服务重启后未完成的任务会重新排队执行
+    """
+    __tablename__ = "jobs"
+    
+    # 任务ID（uuid4 hex）
+    id = Column(String(32), primary_key=True, comment="任务ID")
+    
+    job_type = Column(String(32), nullable=False, comment="任务类型：scan/organize/export/classify")
+    status = Column(String(16), nullable=False, default="pending", comment="状态：pending/running/completed/failed/cancelled")
+    
+    params_json = Column(JSON, nullable=True, comment="任务参数JSON")
+    progress_json = Column(JSON, nullable=True, comment="最近一次进度快照JSON")
+    result_json = Column(JSON, nullable=True, comment="任务结果JSON")
+    error = Column(Text, nullable=True, comment="失败原因")
+    
+    # 执行次数（重启后恢复执行会递增）
+    attempts = Column(Integer, nullable=False, default=0, comment="执行次数")
+    
+    created_at = Column(DateTime, nullable=False, default=datetime.now, comment="创建时间")
+    started_at = Column(DateTime, nullable=True, comment="开始时间")
+    finished_at = Column(DateTime, nullable=True, comment="结束时间")
+    
+    __table_args__ = (
+        Index("idx_jobs_status_created", "status", "created_at"),
+        Index("idx_jobs_type_created", "job_type", "created_at"),
+    )
+    
+    def to_dict(self, include_result: bool = True) -> dict:
+        """转换为字典"""
+        data = {
+            "job_id": self.id,
+            "job_type": self.job_type,
+            "status": self.status,
+            "params": self.params_json,
+            "progress": self.progress_json,
+            "error": self.error,
+            "attempts": self.attempts,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+        if include_result:
+            data["result"] = self.result_json
+        return data
+
+
 class SummaryHistory(Base):
     """
     拍摄总结历史记录模型
@@ -2,11 +2,182 @@
 照片数据库操作模块
 实现CRUD操作
 """
+import json
+import time
+import base64
+import threading
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, case
+from sqlalchemy import and_, func, select, tuple_
 from .models import Photo
+from ..core.config import get_settings
+from ..core.thumbs import thumb_url
+from .session import dialect_insert
+from .stats_repo import PhotoStatsRepository
+
+
+# 照片列表的排序：拍摄时间倒序，id保证同一时间的照片顺序稳定（对应 idx_photos_taken_at_id 等索引）
+LIST_ORDER = (Photo.taken_at.desc(), Photo.id.desc())
+
+
+def encode_cursor(photo: Photo) -> str:
+    """把一页最后一张照片的排序键 (taken_at, id) 编码为不透明的游标字符串"""
+    taken_at: Optional[datetime] = photo.taken_at  # type: ignore
+    payload = {"t": taken_at.isoformat() if taken_at else None, "i": photo.id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Optional[datetime], int]:
+    """
+    解析游标
+    
+    Returns:
+        (taken_at, id)
+    
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        taken_at = datetime.fromisoformat(payload["t"]) if payload["t"] else None
+        return taken_at, int(payload["i"])
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+class CountCache:
+    """
+    照片总数缓存（进程内，按筛选条件分别缓存）
+    大图库上 COUNT(*) 需要扫描整个索引，游标分页时总数只用于显示，允许短时间内不精确；
+    照片增删改时清空
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple, tuple[int, float]] = {}
+    
+    def get(self, key: tuple) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+    
+    def put(self, key: tuple, total: int, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (total, time.monotonic() + ttl)
+    
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache()
+
+
+def _taken_days(photos: list) -> set:
+    """照片（对象或字典）的拍摄日期集合"""
+    days = set()
+    for photo in photos:
+        taken_at = photo.get("taken_at") if isinstance(photo, dict) else photo.taken_at
+        days.add(taken_at.date() if taken_at else None)
+    return days
+
+
+def _column(name: str):
+    return lambda row: getattr(row, name)
+
+
+# 照片列表可返回的字段：字段名 → (依赖的列, 从结果行取值的函数)，顺序与 Photo.to_dict 一致
+# 日期时间字段保留datetime对象，由JSON编码器输出为ISO格式
+PHOTO_FIELDS: Dict[str, tuple] = {
+    "id": ((Photo.id,), _column("id")),
+    "file_name": ((Photo.file_name,), _column("file_name")),
+    "file_path": ((Photo.file_path,), _column("file_path")),
+    "raw_path": ((Photo.raw_path,), _column("raw_path")),
+    "library_path": ((Photo.library_path,), _column("library_path")),
+    "taken_at": ((Photo.taken_at,), _column("taken_at")),
+    "camera_model": ((Photo.camera_model,), _column("camera_model")),
+    "lens": ((Photo.lens,), _column("lens")),
+    "focal_length": ((Photo.focal_length,), _column("focal_length")),
+    "iso": ((Photo.iso,), _column("iso")),
+    "aperture": ((Photo.aperture,), _column("aperture")),
+    "shutter": ((Photo.shutter,), _column("shutter")),
+    "category": ((Photo.category,), _column("category")),
+    "tags": ((Photo.tags_json,), lambda row: row.tags_json or []),
+    "caption": ((Photo.caption,), _column("caption")),
+    "is_selected": ((Photo.is_selected,), lambda row: bool(row.is_selected)),
+    "sha1": ((Photo.sha1,), _column("sha1")),
+    "thumb_url": ((Photo.sha1,), lambda row: thumb_url(row.sha1)),
+    "grid_url": ((Photo.sha1,), lambda row: thumb_url(row.sha1, "grid")),
+    "lightbox_url": ((Photo.sha1,), lambda row: thumb_url(row.sha1, "lightbox")),
+    "created_at": ((Photo.created_at,), _column("created_at")),
+    "updated_at": ((Photo.updated_at,), _column("updated_at")),
+}
+
+# 字段预设：grid 为网格缩略图所需字段（不含路径、标签、描述等大字段，详情通过 GET /photos/{id} 获取）
+FIELD_PRESETS: Dict[str, tuple] = {
+    "grid": (
+        "id", "file_name", "taken_at", "focal_length", "iso", "category",
+        "is_selected", "sha1", "thumb_url", "grid_url",
+    ),
+    "full": tuple(PHOTO_FIELDS),
+}
+
+
+class PhotoProjection:
+    """
+    照片列表的列投影：只查询所需字段的列，直接从结果行构造字典（不创建ORM对象）
+
+    用法:
+        projection = PhotoProjection.parse("grid")
+        rows, total = repo.list_photos(columns=projection.columns)
+        photos = projection.to_dicts(rows)
+    """
+
+    def __init__(self, fields: List[str]):
+        self.fields = fields
+        # 游标分页需要每行的排序键 (taken_at, id)
+        columns = [Photo.id, Photo.taken_at]
+        for name in fields:
+            for column in PHOTO_FIELDS[name][0]:
+                if not any(column is c for c in columns):
+                    columns.append(column)
+        self.columns = columns
+        self._getters = [(name, PHOTO_FIELDS[name][1]) for name in fields]
+
+    @classmethod
+    def parse(cls, fields: Optional[str]) -> "PhotoProjection":
+        """
+        解析字段选择参数
+
+        Args:
+            fields: 逗号分隔的字段名或预设名（grid/full），可混用；为空时返回全部字段
+
+        Raises:
+            ValueError: 包含未知字段
+        """
+        names: List[str] = []
+        for item in (fields or "full").split(","):
+            item = item.strip()
+            if not item:
+                continue
+            if item in FIELD_PRESETS:
+                candidates = FIELD_PRESETS[item]
+            elif item in PHOTO_FIELDS:
+                candidates = (item,)
+            else:
+                raise ValueError(f"未知字段: {item}")
+            names.extend(name for name in candidates if name not in names)
+        if "id" not in names:
+            names.insert(0, "id")
+        return cls(names)
+
+    def to_dicts(self, rows: list) -> List[Dict[str, Any]]:
+        getters = self._getters
+        return [{name: get(row) for name, get in getters} for row in rows]
 
 
 class PhotosRepository:
@@ -14,6 +185,8 @@ class PhotosRepository:
     
     def __init__(self, db: Session):
         self.db = db
+        # 统计聚合表：照片增删改时在同一事务中重算受影响日期
+        self.stats = PhotoStatsRepository(db)
     
     def upsert_by_sha1(self, photo_data: Dict[str, Any]) -> tuple[Photo, bool]:
         """
@@ -47,8 +220,10 @@ class PhotosRepository:
             category=photo_data.get("category", "未分类"),
             tags_json=photo_data.get("tags"),
             sha1=sha1,
+            dhash=photo_data.get("dhash"),
         )
         self.db.add(photo)
+        self.stats.move({}, self.stats.photo_entry(photo))
         # 注意：不在这里commit，由调用方统一提交（支持批量操作）
         return photo, True
     
@@ -94,6 +269,7 @@ class PhotosRepository:
                 category=photo_data.get("category", "未分类"),
                 tags_json=photo_data.get("tags"),
                 sha1=sha1,
+                dhash=photo_data.get("dhash"),
             )
             new_photos.append(photo)
             existing_sha1s.add(sha1)  # 防止同批次重复
@@ -102,14 +278,110 @@ class PhotosRepository:
         # 批量插入
         if new_photos:
             self.db.add_all(new_photos)
+            self.db.flush()
+            self.stats.refresh_days(_taken_days(new_photos))
             self.db.commit()
+            count_cache.invalidate()
         
         return {"new": new_count, "duplicates": dup_count}
     
-    def list_photos(
+    def bulk_upsert_by_sha1(self, photos_data: List[Dict[str, Any]], chunk_size: int = 500) -> Dict[str, Any]:
+        """
+        批量按SHA1去重插入照片（扫描入库使用）
+        使用数据库原生upsert：SQLite为 INSERT ... ON CONFLICT DO NOTHING，
+        MySQL为 INSERT ... ON DUPLICATE KEY UPDATE（无实际更新）
+        每批只需3条语句：查询已存在SHA1、批量插入、回查精简字段
+        
+        Args:
+            photos_data: 照片数据列表
+            chunk_size: IN查询分块大小
+        
+        Returns:
+            {"new": 新插入数量, "duplicates": 重复数量, "with_raw": 新插入中含RAW数量,
+             "photos": [精简照片字典]}
+        """
+        sha1_list = list(dict.fromkeys(p["sha1"] for p in photos_data))
+        
+        # 1. 查询已存在的SHA1
+        existing_sha1s = set()
+        for i in range(0, len(sha1_list), chunk_size):
+            chunk = sha1_list[i:i + chunk_size]
+            existing_sha1s.update(
+                row[0] for row in self.db.execute(select(Photo.sha1).where(Photo.sha1.in_(chunk)))
+            )
+        
+        # 2. 批量插入新记录（同批次重复的只保留第一条）
+        rows = []
+        seen = set(existing_sha1s)
+        for photo_data in photos_data:
+            sha1 = photo_data["sha1"]
+            if sha1 in seen:
+                continue
+            seen.add(sha1)
+            rows.append({
+                "file_name": photo_data.get("file_name"),
+                "file_path": photo_data.get("file_path"),
+                "raw_path": photo_data.get("raw_path"),
+                "taken_at": photo_data.get("taken_at"),
+                "camera_model": photo_data.get("camera_model"),
+                "lens": photo_data.get("lens"),
+                "focal_length": photo_data.get("focal_length"),
+                "iso": photo_data.get("iso"),
+                "aperture": photo_data.get("aperture"),
+                "shutter": photo_data.get("shutter"),
+                "category": photo_data.get("category", "未分类"),
+                "tags_json": photo_data.get("tags"),
+                "sha1": sha1,
+                "dhash": photo_data.get("dhash"),
+            })
+        
+        if rows:
+            stmt = dialect_insert(self.db, Photo.__table__)
+            if self.db.get_bind().dialect.name == "mysql":
+                # 冲突时把sha1更新为自身，相当于DO NOTHING
+                stmt = stmt.on_duplicate_key_update(sha1=stmt.inserted.sha1)
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=["sha1"])
+            self.db.execute(stmt, rows)
+            self.stats.refresh_days(_taken_days(rows))
+            count_cache.invalidate()
+        
+        # 3. 回查精简字段，直接构造返回结果（不加载ORM对象、不调用to_dict）
+        photos = self.get_scan_rows_by_sha1_list(sha1_list, chunk_size)
+        
+        # 新插入数按回查到的、步骤1时尚不存在的记录统计（不按尝试插入的行数），含RAW数按实际入库的 raw_path 统计
+        inserted = [p for p in photos if p["sha1"] not in existing_sha1s]
+        
+        return {
+            "new": len(inserted),
+            "duplicates": len(photos_data) - len(inserted),
+            "with_raw": sum(1 for p in inserted if p["raw_path"]),
+            "photos": photos,
+        }
+    
+    def get_scan_rows_by_sha1_list(self, sha1_list: List[str], chunk_size: int = 500) -> List[Dict[str, Any]]:
+        """
+        根据SHA1列表获取扫描结果所需的精简字段
+        
+        Returns:
+            [{"id", "sha1", "file_name", "raw_path", "thumb_url"}, ...]
+        """
+        photos = []
+        for i in range(0, len(sha1_list), chunk_size):
+            chunk = sha1_list[i:i + chunk_size]
+            query = select(Photo.id, Photo.sha1, Photo.file_name, Photo.raw_path).where(Photo.sha1.in_(chunk))
+            for row in self.db.execute(query):
+                photos.append({
+                    "id": row.id,
+                    "sha1": row.sha1,
+                    "file_name": row.file_name,
+                    "raw_path": row.raw_path,
+                    "thumb_url": thumb_url(row.sha1),
+                })
+        return photos
+    
+    def _filter_conditions(
         self,
-        page: int = 1,
-        page_size: int = 50,
         date_from: Optional[datetime] = None,
         date_to: Optional[datetime] = None,
         category: Optional[str] = None,
@@ -118,26 +390,8 @@ class PhotosRepository:
         focal_max: Optional[float] = None,
         iso_min: Optional[int] = None,
         iso_max: Optional[int] = None,
-    ) -> tuple[List[Photo], int]:
-        """
-        分页查询照片列表
-        
-        Args:
-            page: 页码（从1开始）
-            page_size: 每页数量
-            date_from: 开始日期
-            date_to: 结束日期
-            category: 类别筛选
-            is_selected: 精选筛选
-            focal_min/focal_max: 焦距范围
-            iso_min/iso_max: ISO范围
-        
-        Returns:
-            (照片列表, 总数)
-        """
-        query = self.db.query(Photo)
-        
-        # 构建筛选条件
+    ) -> list:
+        """照片列表的筛选条件"""
         conditions = []
         
         if date_from:
@@ -157,17 +411,112 @@ class PhotosRepository:
         if iso_max is not None:
             conditions.append(Photo.iso <= iso_max)
         
+        return conditions
+    
+    def filtered_query(self, **filters: Any):
+        """按筛选条件构建照片查询（未排序、未分页）"""
+        query = self.db.query(Photo)
+        conditions = self._filter_conditions(**filters)
         if conditions:
             query = query.filter(and_(*conditions))
+        return query
+    
+    def list_photos(
+        self,
+        page: int = 1,
+        page_size: int = 50,
+        columns: Optional[List[Any]] = None,
+        **filters: Any,
+    ) -> tuple[List[Photo], int]:
+        """
+        分页查询照片列表（OFFSET分页，可跳页；深页需要扫描并跳过前面所有行）
+        
+        Args:
+            page: 页码（从1开始）
+            page_size: 每页数量
+            columns: 只查询这些列，返回结果行而不是Photo对象（见 PhotoProjection）
+            filters: 筛选条件（date_from/date_to、category、is_selected、focal_min/focal_max、iso_min/iso_max）
+        
+        Returns:
+            (照片列表, 总数)
+        """
+        query = self.filtered_query(**filters)
         
         # 统计总数
         total = query.count()
         
-        # 分页查询，按拍摄时间倒序
-        photos = query.order_by(Photo.taken_at.desc()).offset((page - 1) * page_size).limit(page_size).all()
+        if columns:
+            query = query.with_entities(*columns)
+        
+        # 分页查询，按拍摄时间倒序（id保证同一时间的照片顺序稳定）
+        photos = query.order_by(*LIST_ORDER).offset((page - 1) * page_size).limit(page_size).all()
         
         return photos, total
     
+    def list_photos_keyset(
+        self,
+        cursor: Optional[str] = None,
+        page_size: int = 50,
+        columns: Optional[List[Any]] = None,
+        **filters: Any,
+    ) -> tuple[List[Photo], Optional[str]]:
+        """
+        游标分页查询照片列表（按 (taken_at, id) 倒序）
+        从上一页最后一张照片的排序键继续向后查：(taken_at, id) < 游标 是 (taken_at, id) 索引上的范围条件，
+        任意深度的页与第一页开销相同；没有拍摄时间的照片排在最后，单独按id倒序读取
+        
+        Args:
+            cursor: 上一页返回的游标（None表示第一页）
+            page_size: 每页数量
+            columns: 只查询这些列（须包含 taken_at 和 id），同 list_photos
+            filters: 筛选条件，同 list_photos
+        
+        Returns:
+            (照片列表, 下一页游标；没有更多时为None)
+        
+        Raises:
+            ValueError: 游标格式无效
+        """
+        query = self.filtered_query(**filters)
+        if columns:
+            query = query.with_entities(*columns)
+        # 多取一条判断是否还有下一页
+        limit = page_size + 1
+        
+        if not cursor:
+            photos = query.order_by(*LIST_ORDER).limit(limit).all()
+        else:
+            taken_at, last_id = decode_cursor(cursor)
+            if taken_at is None:
+                photos = query.filter(Photo.taken_at.is_(None), Photo.id < last_id).order_by(
+                    Photo.id.desc()
+                ).limit(limit).all()
+            else:
+                photos = query.filter(tuple_(Photo.taken_at, Photo.id) < (taken_at, last_id)).order_by(
+                    *LIST_ORDER
+                ).limit(limit).all()
+                # 有拍摄时间的照片读完后，接着读没有拍摄时间的照片
+                if len(photos) < limit:
+                    photos += query.filter(Photo.taken_at.is_(None)).order_by(
+                        Photo.id.desc()
+                    ).limit(limit - len(photos)).all()
+        
+        has_more = len(photos) > page_size
+        photos = photos[:page_size]
+        
+        return photos, encode_cursor(photos[-1]) if has_more else None
+    
+    def count_photos_cached(self, **filters: Any) -> int:
+        """
+        照片总数（按筛选条件缓存 photo_count_cache_seconds 秒，照片增删改时失效）
+        """
+        key = tuple(sorted((k, v) for k, v in filters.items() if v is not None))
+        total = count_cache.get(key)
+        if total is None:
+            total = self.filtered_query(**filters).with_entities(func.count(Photo.id)).scalar() or 0
+            count_cache.put(key, total, get_settings().photo_count_cache_seconds)
+        return total
+    
     def get_by_id(self, photo_id: int) -> Optional[Photo]:
         """根据ID获取照片"""
         return self.db.query(Photo).filter(Photo.id == photo_id).first()
@@ -197,6 +546,7 @@ class PhotosRepository:
             "library_path", "raw_path"
         ]
         
+        before = self.stats.photo_entry(photo)
         for field, value in updates.items():
             if field in allowed_fields:
                 # 特殊处理tags字段
@@ -205,7 +555,9 @@ class PhotosRepository:
                 else:
                     setattr(photo, field, value)
         
+        self.stats.move(before, self.stats.photo_entry(photo))
         self.db.commit()
+        count_cache.invalidate()
         self.db.refresh(photo)
         return photo
     
@@ -222,10 +574,13 @@ class PhotosRepository:
         if caption is not None:
             updates["caption"] = caption
             
+        days = self.stats.days_of(photo_ids)
         result = self.db.query(Photo).filter(Photo.id.in_(photo_ids)).update(
             updates, synchronize_session=False
         )
+        self.stats.refresh_days(days)
         self.db.commit()
+        count_cache.invalidate()
         return result
     
     def get_selected_photos(self) -> List[Photo]:
@@ -238,111 +593,10 @@ class PhotosRepository:
         date_to: Optional[datetime] = None,
     ) -> Dict[str, Any]:
         """
-        获取统计数据（优化版：使用SQL聚合）
+        获取统计数据（读取 photo_stats/photo_bucket_stats 聚合表，不扫描照片表）
         用于生成拍摄总结
         """
-        # 构建基础查询条件
-        conditions = []
-        if date_from:
-            conditions.append(Photo.taken_at >= date_from)
-        if date_to:
-            conditions.append(Photo.taken_at <= date_to)
-        
-        base_filter = and_(*conditions) if conditions else True
-        
-        # 1. 基础统计（单次查询）
-        basic_stats = self.db.query(
-            func.count(Photo.id).label("total"),
-            func.sum(case((Photo.raw_path.isnot(None), 1), else_=0)).label("with_raw"),
-            func.sum(Photo.is_selected).label("selected"),
-        ).filter(base_filter).first()
-        
-        if not basic_stats or basic_stats.total == 0:
-            return {"total": 0}
-        
-        stats = {
-            "total": basic_stats.total or 0,
-            "with_raw": int(basic_stats.with_raw or 0),
-            "selected": int(basic_stats.selected or 0),
-            "categories": {},
-            "focal_lengths": {},
-            "isos": {},
-            "apertures": {},
-            "cameras": {},
-        }
-        
-        # 2. 类别统计（SQL GROUP BY）
-        category_stats = self.db.query(
-            Photo.category, func.count(Photo.id)
-        ).filter(base_filter).group_by(Photo.category).all()
-        
-        for cat, count in category_stats:
-            stats["categories"][cat or "未分类"] = count
-        
-        # 3. 相机统计
-        camera_stats = self.db.query(
-            Photo.camera_model, func.count(Photo.id)
-        ).filter(base_filter).filter(Photo.camera_model.isnot(None)).group_by(Photo.camera_model).all()
-        
-        for cam, count in camera_stats:
-            if cam:
-                stats["cameras"][cam] = count
-        
-        # 4. 焦距/ISO/光圈 分段统计（需要在应用层处理分段逻辑）
-        # 只查询有值的记录，减少数据传输
-        photo_params = self.db.query(
-            Photo.focal_length, Photo.iso, Photo.aperture
-        ).filter(base_filter).filter(
-            or_(Photo.focal_length.isnot(None), Photo.iso.isnot(None), Photo.aperture.isnot(None))
-        ).all()
-        
-        for focal, iso, aperture in photo_params:
-            if focal:
-                focal_range = self._get_focal_range(focal)
-                stats["focal_lengths"][focal_range] = stats["focal_lengths"].get(focal_range, 0) + 1
-            if iso:
-                iso_range = self._get_iso_range(iso)
-                stats["isos"][iso_range] = stats["isos"].get(iso_range, 0) + 1
-            if aperture:
-                ap_range = self._get_aperture_range(aperture)
-                stats["apertures"][ap_range] = stats["apertures"].get(ap_range, 0) + 1
-        
-        return stats
-    
-    def _get_focal_range(self, focal: float) -> str:
-        """焦距分段"""
-        if focal < 24:
-            return "超广角(<24mm)"
-        elif focal < 35:
-            return "广角(24-35mm)"
-        elif focal < 50:
-            return "标准(35-50mm)"
-        elif focal < 85:
-            return "中焦(50-85mm)"
-        elif focal < 135:
-            return "中长焦(85-135mm)"
-        else:
-            return "长焦(>135mm)"
-    
-    def _get_iso_range(self, iso: int) -> str:
-        """ISO分段"""
-        if iso <= 200:
-            return "低ISO(≤200)"
-        elif iso <= 800:
-            return "中ISO(201-800)"
-        elif iso <= 3200:
-            return "高ISO(801-3200)"
-        else:
-            return "超高ISO(>3200)"
-    
-    def _get_aperture_range(self, aperture: float) -> str:
-        """光圈分段"""
-        if aperture <= 2.8:
-            return "大光圈(≤f/2.8)"
-        elif aperture <= 5.6:
-            return "中光圈(f/2.8-5.6)"
-        else:
-            return "小光圈(>f/5.6)"
+        return self.stats.get_statistics(date_from, date_to)
     
     def batch_delete_photos(self, photo_ids: List[int]) -> Dict[str, Any]:
         """
@@ -359,10 +613,13 @@ class PhotosRepository:
         sha1_list = [p.sha1 for p in photos_to_delete]
         
         # 删除数据库记录
+        days = self.stats.days_of(photo_ids)
         deleted_count = self.db.query(Photo).filter(Photo.id.in_(photo_ids)).delete(
             synchronize_session=False
         )
+        self.stats.refresh_days(days)
         self.db.commit()
+        count_cache.invalidate()
         
         return {"deleted": deleted_count, "sha1_list": sha1_list}
     
@@ -380,10 +637,13 @@ class PhotosRepository:
         if not updates:
             return 0
         
+        days = self.stats.days_of(photo_ids)
         result = self.db.query(Photo).filter(Photo.id.in_(photo_ids)).update(
             updates, synchronize_session=False
         )
+        self.stats.refresh_days(days)
         self.db.commit()
+        count_cache.invalidate()
         return result
     
     def get_photos_by_ids(self, photo_ids: List[int]) -> List[Photo]:
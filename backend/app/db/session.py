@@ -3,7 +3,7 @@
 使用SQLAlchemy管理MySQL连接
 """
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from ..core.config import get_settings
 
 settings = get_settings()
@@ -38,7 +38,22 @@ def get_db():
 def init_db():
     """
     初始化数据库
-    创建所有表（如果不存在）
+    创建所有表（如果不存在），再执行未执行过的结构迁移（已有表的新增列、索引变化）
     """
     from . import models  # 确保模型被加载
+    from .migrations import run_migrations
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+
+def dialect_insert(db: Session, table):
+    """
+    根据当前数据库方言返回insert构造器
+    SQLite版本支持 on_conflict_do_nothing/on_conflict_do_update，
+    MySQL版本支持 on_duplicate_key_update，用于批量upsert
+    """
+    if db.get_bind().dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
@@ -0,0 +1,75 @@
+"""
+统计分段定义
+焦距/ISO/光圈的分段用声明式的分段表定义，同一份定义既用于在Python中给单张照片分段，
+也可渲染为SQL CASE表达式，由数据库直接按分段 GROUP BY 计数（SQLite与MySQL通用）
+"""
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import case, null, or_
+
+
+class Bucket(NamedTuple):
+    label: str
+    upper: Optional[float]   # 上界（None表示不设上界，只能是最后一个分段）
+    inclusive: bool = False  # 是否包含上界
+
+
+class BucketTable:
+    """
+    分段表：按顺序匹配第一个满足 值 < 上界（inclusive 时为 值 <= 上界）的分段；空值和0不属于任何分段
+
+    用法:
+        FOCAL_BUCKETS.label(50)                          # Python中分段
+        select(FOCAL_BUCKETS.case(Photo.focal_length))   # SQL中分段
+    """
+
+    def __init__(self, name: str, buckets: List[Bucket]):
+        if not buckets or buckets[-1].upper is not None:
+            raise ValueError(f"分段表 {name} 的最后一个分段不能有上界")
+        if any(bucket.upper is None for bucket in buckets[:-1]):
+            raise ValueError(f"分段表 {name} 只有最后一个分段可以不设上界")
+        self.name = name
+        self.buckets = buckets
+
+    @property
+    def labels(self) -> List[str]:
+        return [bucket.label for bucket in self.buckets]
+
+    def label(self, value: Optional[float]) -> Optional[str]:
+        """值所属的分段名称"""
+        if not value:
+            return None
+        for bucket in self.buckets[:-1]:
+            if value <= bucket.upper if bucket.inclusive else value < bucket.upper:
+                return bucket.label
+        return self.buckets[-1].label
+
+    def case(self, column):
+        """渲染为与 label 等价的SQL CASE表达式"""
+        whens = [(or_(column.is_(None), column == 0), null())]
+        for bucket in self.buckets[:-1]:
+            whens.append((column <= bucket.upper if bucket.inclusive else column < bucket.upper, bucket.label))
+        return case(*whens, else_=self.buckets[-1].label)
+
+
+FOCAL_BUCKETS = BucketTable("焦距", [
+    Bucket("超广角(<24mm)", 24),
+    Bucket("广角(24-35mm)", 35),
+    Bucket("标准(35-50mm)", 50),
+    Bucket("中焦(50-85mm)", 85),
+    Bucket("中长焦(85-135mm)", 135),
+    Bucket("长焦(>135mm)", None),
+])
+
+ISO_BUCKETS = BucketTable("ISO", [
+    Bucket("低ISO(≤200)", 200, inclusive=True),
+    Bucket("中ISO(201-800)", 800, inclusive=True),
+    Bucket("高ISO(801-3200)", 3200, inclusive=True),
+    Bucket("超高ISO(>3200)", None),
+])
+
+APERTURE_BUCKETS = BucketTable("光圈", [
+    Bucket("大光圈(≤f/2.8)", 2.8, inclusive=True),
+    Bucket("中光圈(f/2.8-5.6)", 5.6, inclusive=True),
+    Bucket("小光圈(>f/5.6)", None),
+])
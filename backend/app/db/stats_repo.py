@@ -0,0 +1,304 @@
+"""
+照片统计聚合数据库操作模块
+按拍摄日期预先汇总照片数，各维度分开汇总（行数约为 天数 × 各维度取值数之和，不随维度组合膨胀）：
+- photo_stats：(日期, 类别, 相机) → 照片数、含RAW数、精选数
+- photo_bucket_stats：(日期, 焦距/ISO/光圈维度, 分段) → 照片数
+照片增删改时由 PhotosRepository 在同一事务中维护：批量写入/删除重算受影响日期的聚合行（refresh_days），
+修改或写入单张照片时直接增减对应的聚合行（move）
+统计某个日期范围时，整天部分对聚合行求和；范围两端不足一整天的部分直接扫描照片表
+从照片表分组计数时，焦距/ISO/光圈分段渲染为SQL CASE表达式，由数据库 GROUP BY（只返回各组计数）
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import Date, and_, case, delete, func, insert, literal, select, true, update
+
+from .models import Photo, PhotoStat, PhotoBucketStat
+from .stat_buckets import FOCAL_BUCKETS, ISO_BUCKETS, APERTURE_BUCKETS
+
+
+# IN查询分块大小（SQLite默认最多999个绑定参数）
+LOOKUP_CHUNK_SIZE = 500
+
+
+# 分段维度：(维度名称（即统计结果中的键）, 分段表, 照片列)
+BUCKET_DIMENSIONS = (
+    ("focal_lengths", FOCAL_BUCKETS, Photo.focal_length),
+    ("isos", ISO_BUCKETS, Photo.iso),
+    ("apertures", APERTURE_BUCKETS, Photo.aperture),
+)
+
+# photo_entry 中类别/相机行的键前缀（分段行的键前缀为维度名称）
+_TOTALS = "totals"
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def day_ranges(days: Iterable[date]) -> List[Tuple[date, date]]:
+    """把日期合并为连续区间 [(首日, 末日)]，减少重算时的查询次数"""
+    ranges: List[Tuple[date, date]] = []
+    for day in sorted(days):
+        if ranges and day - ranges[-1][1] <= timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+def local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """带时区的时间转换为本地时间（拍摄时间按EXIF本地时间存储，不带时区）"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def accumulate(stats: Dict[str, Any], groups: Iterable[tuple]) -> None:
+    """
+    把类别/相机分组计数累加到统计结果
+
+    Args:
+        groups: (类别, 相机, 照片数, 含RAW数, 精选数) 元组
+    """
+    for category, camera, count, with_raw, selected in groups:
+        count = int(count or 0)
+        if not count:
+            continue
+        stats["total"] += count
+        stats["with_raw"] += int(with_raw or 0)
+        stats["selected"] += int(selected or 0)
+        category = category or "未分类"
+        stats["categories"][category] = stats["categories"].get(category, 0) + count
+        if camera:
+            stats["cameras"][camera] = stats["cameras"].get(camera, 0) + count
+
+
+def accumulate_buckets(stats: Dict[str, Any], groups: Iterable[tuple]) -> None:
+    """
+    把分段计数累加到统计结果
+
+    Args:
+        groups: (维度, 分段, 照片数) 元组
+    """
+    for dimension, bucket, count in groups:
+        count = int(count or 0)
+        if bucket and count:
+            stats[dimension][bucket] = stats[dimension].get(bucket, 0) + count
+
+
+class PhotoStatsRepository:
+    """照片统计聚合数据仓库（db 可以是 Session，也可以是迁移中的 Connection）"""
+
+    def __init__(self, db):
+        self.db = db
+
+    # ========== 维护 ==========
+
+    def days_of(self, photo_ids: List[int]) -> Set[Optional[date]]:
+        """照片的拍摄日期集合（没有拍摄时间为None），在修改或删除照片之前调用"""
+        days: Set[Optional[date]] = set()
+        for i in range(0, len(photo_ids), LOOKUP_CHUNK_SIZE):
+            chunk = photo_ids[i:i + LOOKUP_CHUNK_SIZE]
+            for (taken_at,) in self.db.execute(select(Photo.taken_at).where(Photo.id.in_(chunk))):
+                days.add(taken_at.date() if taken_at else None)
+        return days
+
+    def refresh_days(self, days: Iterable[Optional[date]]) -> None:
+        """重算这些日期的聚合行（不提交，由调用方与照片的修改一起提交）"""
+        days = set(days)
+        if None in days:
+            days.discard(None)
+            self._refresh(Photo.taken_at.is_(None), lambda day: day.is_(None))
+        for first, last in day_ranges(days):
+            self._refresh(
+                and_(Photo.taken_at >= day_start(first), Photo.taken_at < day_start(last + timedelta(days=1))),
+                lambda day: day.between(first, last),
+            )
+
+    @staticmethod
+    def photo_entry(photo) -> Dict[tuple, Tuple[int, ...]]:
+        """
+        单张照片在聚合表中对应的行
+
+        Returns:
+            {("totals", 日期, 类别, 相机): (照片数, 含RAW数, 精选数), (维度, 日期, 分段): (照片数,), ...}
+            没有对应参数的维度不出现
+        """
+        taken_at: Optional[datetime] = photo.taken_at  # type: ignore
+        day = taken_at.date() if taken_at else None
+        entry: Dict[tuple, Tuple[int, ...]] = {
+            (_TOTALS, day, photo.category, photo.camera_model):
+                (1, 1 if photo.raw_path else 0, 1 if photo.is_selected else 0),
+        }
+        for dimension, table, column in BUCKET_DIMENSIONS:
+            label = table.label(getattr(photo, column.key))
+            if label:
+                entry[(dimension, day, label)] = (1,)
+        return entry
+
+    def move(self, before: Dict[tuple, Tuple[int, ...]], after: Dict[tuple, Tuple[int, ...]]) -> None:
+        """
+        单张照片修改（或写入）后增量调整聚合行（不提交），无需重算整天
+
+        Args:
+            before, after: 修改前后的 photo_entry（新写入的照片 before 传空字典）
+        """
+        for key in before.keys() | after.keys():
+            old = before.get(key)
+            new = after.get(key)
+            if old == new:
+                continue
+            size = len(old or new)
+            delta = tuple((new or (0,) * size)[i] - (old or (0,) * size)[i] for i in range(size))
+            self._add(key, delta)
+
+    def _add(self, key: tuple, delta: Tuple[int, ...]) -> None:
+        if key[0] == _TOTALS:
+            table = PhotoStat
+            values = dict(zip(("day", "category", "camera_model"), key[1:]))
+            counts = dict(zip(("photo_count", "raw_count", "selected_count"), delta))
+        else:
+            table = PhotoBucketStat
+            values = {"day": key[1], "dimension": key[0], "bucket": key[2]}
+            counts = {"photo_count": delta[0]}
+
+        conditions = [
+            table.__table__.c[name].is_(None) if value is None else table.__table__.c[name] == value
+            for name, value in values.items()
+        ]
+        result = self.db.execute(update(table).where(*conditions).values(
+            **{name: table.__table__.c[name] + value for name, value in counts.items()}
+        ))
+        if result.rowcount == 0 and counts["photo_count"] > 0:
+            self.db.execute(insert(table).values(**values, **counts))
+
+    def rebuild(self) -> None:
+        """从照片表重建全部聚合行"""
+        self._refresh(true(), lambda day: true())
+
+    def _refresh(self, photo_condition, day_condition) -> None:
+        """
+        删除聚合行后由数据库按日期重新分组写入（INSERT ... SELECT，数据不经过应用）
+
+        Args:
+            photo_condition: 照片表的拍摄时间条件
+            day_condition: 聚合表日期列 → 对应的日期条件
+        """
+        day = func.date(Photo.taken_at, type_=Date)
+
+        self.db.execute(delete(PhotoStat).where(day_condition(PhotoStat.day)))
+        dimensions = (day, Photo.category, Photo.camera_model)
+        self.db.execute(insert(PhotoStat).from_select(
+            [PhotoStat.day, PhotoStat.category, PhotoStat.camera_model,
+             PhotoStat.photo_count, PhotoStat.raw_count, PhotoStat.selected_count],
+            self._totals_query(photo_condition, dimensions=dimensions),
+        ))
+
+        self.db.execute(delete(PhotoBucketStat).where(day_condition(PhotoBucketStat.day)))
+        for dimension, table, column in BUCKET_DIMENSIONS:
+            bucket = table.case(column)
+            self.db.execute(insert(PhotoBucketStat).from_select(
+                [PhotoBucketStat.day, PhotoBucketStat.dimension, PhotoBucketStat.bucket, PhotoBucketStat.photo_count],
+                select(day, literal(dimension), bucket, func.count(Photo.id)).where(
+                    photo_condition, column.isnot(None), column != 0
+                ).group_by(day, bucket),
+            ))
+
+    @staticmethod
+    def _totals_query(*conditions, dimensions=(Photo.category, Photo.camera_model)):
+        """照片表按维度分组计数的查询，列依次为 维度..., 照片数, 含RAW数, 精选数"""
+        return select(
+            *dimensions,
+            func.count(Photo.id),
+            func.sum(case((Photo.raw_path.isnot(None), 1), else_=0)),
+            func.sum(Photo.is_selected),
+        ).where(*conditions).group_by(*dimensions)
+
+    # ========== 查询 ==========
+
+    def get_statistics(
+        self,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """
+        统计日期范围内的照片（拍摄时间在 [date_from, date_to] 内；不限日期时包括没有拍摄时间的照片）
+
+        Returns:
+            total/with_raw/selected 及 categories/cameras/focal_lengths/isos/apertures 分布；没有照片时只有 total
+        """
+        date_from = local_naive(date_from)
+        date_to = local_naive(date_to)
+        stats: Dict[str, Any] = {
+            "total": 0,
+            "with_raw": 0,
+            "selected": 0,
+            "categories": {},
+            "focal_lengths": {},
+            "isos": {},
+            "apertures": {},
+            "cameras": {},
+        }
+
+        # 完整包含在范围内的第一天和最后一天
+        first_day = None
+        if date_from is not None:
+            first_day = date_from.date() + timedelta(days=0 if date_from.time() == time.min else 1)
+        last_day = None
+        if date_to is not None:
+            last_day = date_to.date() - timedelta(days=0 if date_to.time() == time.max else 1)
+
+        if first_day is not None and last_day is not None and first_day > last_day:
+            # 范围内没有完整的一天，直接扫描照片表
+            self._scan(stats, Photo.taken_at >= date_from, Photo.taken_at <= date_to)
+        else:
+            self._sum_days(stats, first_day, last_day, include_undated=date_from is None and date_to is None)
+            if first_day is not None and date_from < day_start(first_day):
+                self._scan(stats, Photo.taken_at >= date_from, Photo.taken_at < day_start(first_day))
+            if last_day is not None and day_start(last_day + timedelta(days=1)) <= date_to:
+                self._scan(stats, Photo.taken_at >= day_start(last_day + timedelta(days=1)), Photo.taken_at <= date_to)
+
+        if stats["total"] == 0:
+            return {"total": 0}
+        return stats
+
+    def _sum_days(
+        self,
+        stats: Dict[str, Any],
+        first_day: Optional[date],
+        last_day: Optional[date],
+        include_undated: bool,
+    ) -> None:
+        """对日期范围内的聚合行求和（类别/相机、各分段分别求和）"""
+        def day_conditions(day):
+            conditions = []
+            if first_day is not None:
+                conditions.append(day >= first_day)
+            if last_day is not None:
+                conditions.append(day <= last_day)
+            if not include_undated:
+                conditions.append(day.isnot(None))
+            return conditions
+
+        totals = (PhotoStat.category, PhotoStat.camera_model)
+        accumulate(stats, self.db.execute(select(
+            *totals,
+            func.sum(PhotoStat.photo_count),
+            func.sum(PhotoStat.raw_count),
+            func.sum(PhotoStat.selected_count),
+        ).where(*day_conditions(PhotoStat.day)).group_by(*totals)).all())
+
+        buckets = (PhotoBucketStat.dimension, PhotoBucketStat.bucket)
+        accumulate_buckets(stats, self.db.execute(select(
+            *buckets, func.sum(PhotoBucketStat.photo_count)
+        ).where(*day_conditions(PhotoBucketStat.day)).group_by(*buckets)).all())
+
+    def _scan(self, stats: Dict[str, Any], *conditions) -> None:
+        """直接扫描照片表分组计数（不区分日期）"""
+        accumulate(stats, self.db.execute(self._totals_query(*conditions)).all())
+        for dimension, table, column in BUCKET_DIMENSIONS:
+            bucket = table.case(column)
+            accumulate_buckets(stats, self.db.execute(
+                select(literal(dimension), bucket, func.count(Photo.id)).where(*conditions).group_by(bucket)
+            ).all())
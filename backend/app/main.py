@@ -5,7 +5,7 @@ SD Photo Organizer - FastAPI 后端应用入口
 1. 创建 FastAPI 应用实例
 2. 配置 CORS（跨域资源共享）
 3. 挂载 API 路由
-4. 挂载静态文件目录（缩略图）
+4. 注册缩略图访问路由
 5. 初始化数据库
 """
 from pathlib import Path
@@ -15,13 +15,15 @@ import logging  # 新增：日志模块
 import sys      # 新增：日志输出配置
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 
 from .core.config import get_settings, Settings  # 新增：导入Settings类型
 from .db import init_db
-from .api.routes import photos_router, ai_router, summary_router, export_router
+from .api.routes import photos_router, ai_router, summary_router, export_router, thumbs_router, jobs_router, dedup_router
+from .services.thumbnail_service import get_thumbnail_renderer
+from .core.executors import install_executors, shutdown_executors
+from .services.job_service import get_job_manager
 
 # 新增：全局日志配置（替换print，生产环境必备）
 logging.basicConfig(
@@ -42,6 +44,9 @@ async def lifespan(app: FastAPI):
     启动时初始化数据库，关闭时清理资源
     """
     # 启动时执行
+    # 配置阻塞调用的线程池（同步接口、asyncio.to_thread、耗时操作）
+    install_executors()
+    
     logger.info("🚀 正在初始化数据库...")  # 修改：替换print为logger
     try:
         # 修改：异步执行同步DB初始化，避免阻塞异步事件循环
@@ -60,10 +65,26 @@ async def lifespan(app: FastAPI):
         logger.error(f"❌ 缩略图目录创建失败: {str(e)}", exc_info=True)
         raise
     
+    # 延迟生成缩略图模式：启动后台预热，补齐缺失的缩略图
+    if settings.scan_defer_thumbnails:
+        get_thumbnail_renderer().start_warmer(sweep=True)
+        logger.info("🖼️ 缩略图后台预热已启动")
+    
+    # 恢复上次未完成的后台任务
+    try:
+        resumed = await asyncio.to_thread(get_job_manager().resume)
+        if resumed:
+            logger.info(f"🔁 已恢复 {resumed} 个未完成的后台任务")
+    except Exception as e:
+        logger.error(f"❌ 后台任务恢复失败: {str(e)}", exc_info=True)
+    
     yield
     
     # 关闭时执行
     logger.info("👋 应用正在关闭...")  # 修改：替换print为logger
+    get_job_manager().shutdown()
+    get_thumbnail_renderer().shutdown()
+    shutdown_executors()
 
 
 # 创建 FastAPI 应用
@@ -85,17 +106,17 @@ app.add_middleware(
 )
 
 
-# 挂载静态文件目录（缩略图）
-# 前端可通过 /static/thumbs/{sha1}.jpg 访问缩略图
-# 修改：移除重复的目录创建代码，路径用as_posix()适配跨系统
-app.mount("/static/thumbs", StaticFiles(directory=settings.thumbs_path.as_posix()), name="thumbs")
-
-
 # 注册 API 路由
 app.include_router(photos_router)
 app.include_router(ai_router)
 app.include_router(summary_router)
 app.include_router(export_router)
+app.include_router(jobs_router)
+app.include_router(dedup_router)
+
+# 缩略图访问路由（替代原StaticFiles挂载）
+# 前端仍通过 /static/thumbs/{sha1}.jpg 访问缩略图，实际位置由存储布局决定
+app.include_router(thumbs_router)
 
 
 # 添加请求验证错误处理器（捕获422错误详情）
@@ -0,0 +1,170 @@
+"""
+AI接口异步客户端
+- 一次分类任务共享一个 httpx.AsyncClient：连接复用（keep-alive），可用时启用HTTP/2
+- 令牌桶限速 + 并发上限，按 ai_base_url 对应服务商的配额配置（ai_provider_limits 中可为每个服务商单独配置）
+- 429/5xx/网络错误按指数退避重试，服务端返回 Retry-After 时以其为准
+
+可指向本地模拟服务测试（见 mock_ai_server.py）：AI_BASE_URL=http://127.0.0.1:9000/v1
+"""
+import asyncio
+import random
+import time
+from typing import Dict, Any, NamedTuple, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from ..core.config import get_settings, Settings
+
+try:
+    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# 需要重试的HTTP状态码
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ProviderLimits(NamedTuple):
+    max_concurrency: int  # 同时进行的请求数
+    rate_limit: float     # 每秒请求数上限（0=不限）
+    rate_burst: int       # 令牌桶容量
+
+
+def provider_limits(settings: Settings, base_url: Optional[str] = None) -> ProviderLimits:
+    """
+    服务商的限流配置：ai_provider_limits 中按完整地址或主机名查找，未配置的项使用全局 ai_* 默认值
+
+    Args:
+        base_url: 服务商接口地址（默认 ai_base_url）
+    """
+    base_url = (base_url or settings.ai_base_url).rstrip("/")
+    overrides = settings.ai_provider_limits.get(base_url)
+    if overrides is None:
+        overrides = settings.ai_provider_limits.get(urlparse(base_url).netloc, {})
+    return ProviderLimits(
+        max_concurrency=int(overrides.get("max_concurrency", settings.ai_max_concurrency)),
+        rate_limit=float(overrides.get("rate_limit", settings.ai_rate_limit)),
+        rate_burst=int(overrides.get("rate_burst", settings.ai_rate_burst)),
+    )
+
+
+class TokenBucket:
+    """异步令牌桶限速器"""
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        Args:
+            rate: 每秒补充的令牌数（0表示不限速）
+            capacity: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """取一个令牌，不足时等待"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class VisionClient:
+    """
+    OpenAI兼容接口的异步客户端（需在同一个事件循环内使用）
+
+    用法:
+        async with VisionClient() as client:
+            data = await client.chat_completion(payload)
+    """
+
+    def __init__(self, settings: Optional[Settings] = None, max_concurrency: Optional[int] = None):
+        self.settings = settings or get_settings()
+        limits = provider_limits(self.settings)
+        # 调用方指定的并发数不超过服务商的并发上限
+        concurrency = min(max_concurrency or limits.max_concurrency, limits.max_concurrency)
+        self.max_concurrency = concurrency
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(limits.rate_limit, limits.rate_burst)
+        self._client = httpx.AsyncClient(
+            base_url=self.settings.ai_base_url.rstrip("/"),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.settings.ai_api_key}",
+            },
+            timeout=self.settings.ai_timeout,
+            http2=self.settings.ai_http2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+        # 统计：实际发出的请求数、重试次数
+        self.requests = 0
+        self.retries = 0
+
+    async def __aenter__(self) -> "VisionClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _backoff_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """退避时间：优先使用Retry-After（秒），否则 base*2^attempt 加随机抖动"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return max(float(retry_after), 0.0)
+                except ValueError:
+                    pass
+        base = self.settings.ai_backoff_base * (2 ** attempt)
+        return base + random.uniform(0, base / 2)
+
+    async def chat_completion(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        调用 /chat/completions
+
+        Returns:
+            响应JSON
+
+        Raises:
+            httpx.HTTPStatusError: 不可重试的错误，或重试次数用尽
+            httpx.TransportError: 网络错误且重试次数用尽
+        """
+        max_retries = self.settings.ai_max_retries
+        attempt = 0
+        while True:
+            response = None
+            async with self._semaphore:
+                await self._bucket.acquire()
+                self.requests += 1
+                try:
+                    response = await self._client.post("/chat/completions", json=payload)
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        response.raise_for_status()
+                        return response.json()
+                    if attempt >= max_retries:
+                        response.raise_for_status()
+                except httpx.TransportError:
+                    if attempt >= max_retries:
+                        raise
+
+            # 退避等待时释放并发名额，让其他请求继续
+            await asyncio.sleep(self._backoff_delay(attempt, response))
+            attempt += 1
+            self.retries += 1
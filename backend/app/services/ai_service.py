@@ -2,16 +2,22 @@
 AI服务模块
 负责调用多模态大模型进行图片分类和标签生成
 """
-import base64
+import re
 import json
-from pathlib import Path
+import base64
+import asyncio
+import hashlib
+import itertools
+from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import httpx
 from sqlalchemy.orm import Session
 
 from ..core.config import get_settings
+from ..core.thumbs import read_thumb
 from ..db.photos_repo import PhotosRepository
+from ..db.classification_cache_repo import ClassificationCacheRepository
+from .ai_client import VisionClient
+from .dedup_service import group_bursts
 
 
 # 固定类别列表
@@ -27,6 +33,66 @@ CLASSIFY_PROMPT = """Analyze this image. Return JSON with these fields:
 Example: {"category":"风光","tags":["海边","日落"],"caption":"海边日落","confidence":0.8}
 Return ONLY JSON, no other text."""
 
+# 多图批量分类Prompt：图片按顺序编号，返回按序号对应的JSON数组
+CLASSIFY_BATCH_PROMPT = """You will receive {count} images, labeled Image 0 to Image {last}.
+Analyze each image separately. Return a JSON array with exactly one object per image:
+- index: the image number
+- category: Choose from [人像, 风光, 街拍, 建筑, 美食, 夜景, 动物, 活动, 微距, 未分类]
+- tags: 3-6 Chinese keywords describing the image
+- caption: A brief Chinese description (max 25 chars)
+- confidence: 0-1 score
+
+Example: [{{"index":0,"category":"风光","tags":["海边","日落"],"caption":"海边日落","confidence":0.8}}]
+Return ONLY the JSON array, no other text."""
+
+# Prompt版本：由Prompt和类别列表自动计算，修改Prompt后旧的分类缓存自然失效
+PROMPT_VERSION = hashlib.sha1(
+    "\n".join([CLASSIFY_PROMPT, CLASSIFY_BATCH_PROMPT, ",".join(CATEGORIES)]).encode("utf-8")
+).hexdigest()[:12]
+
+
+class ClassifierBackend(ABC):
+    """
+    分类后端接口（不操作数据库）
+    classify_photos 按顺序调用多个后端：前一个后端置信度低于 min_confidence 的照片交给下一个后端
+    """
+    
+    name = ""
+    min_confidence: Optional[float] = None  # None表示结果总是采用
+    cacheable = False                       # 结果是否写入分类缓存
+    
+    @abstractmethod
+    def classify(self, photos: list) -> List[Dict[str, Any]]:
+        """
+        Returns:
+            与输入顺序对应的结果列表：{"success": True, "category", "tags", "caption", "confidence"(可选)}
+            或 {"success": False, "error"}
+        """
+    
+    def stats(self) -> Dict[str, int]:
+        """本次分类的统计（合并到分类结果中）"""
+        return {}
+
+
+class RemoteVisionBackend(ClassifierBackend):
+    """远程多模态大模型（OpenAI兼容接口）"""
+    
+    name = "remote"
+    cacheable = True
+    
+    def __init__(self, service: "AIService", max_workers: Optional[int] = None):
+        self.service = service
+        self.max_workers = max_workers
+        self._stats: Dict[str, int] = {}
+    
+    def classify(self, photos: list) -> List[Dict[str, Any]]:
+        # 异步并发调用 AI API（共享连接、限速、退避重试），协程中不操作数据库
+        results, self._stats = asyncio.run(self.service._classify_all(photos, self.max_workers))
+        return results
+    
+    def stats(self) -> Dict[str, int]:
+        return self._stats
+
 
 class AIService:
     """AI分类服务"""
@@ -34,31 +100,34 @@ class AIService:
     def __init__(self, db: Session):
         self.db = db
         self.repo = PhotosRepository(db)
+        self.cache = ClassificationCacheRepository(db)
         self.settings = get_settings()
     
     def classify_photos(
         self,
         photo_ids: List[int],
-        max_workers: int = 4,
+        max_workers: Optional[int] = None,
         skip_classified: bool = False,
+        cluster_bursts: Optional[bool] = None,
+        backend: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         批量对照片进行AI分类
         
         Args:
             photo_ids: 照片ID列表
-            max_workers: 并发线程数
+            max_workers: 并发请求数（默认使用服务商的并发上限，见 ai_provider_limits）
             skip_classified: 是否跳过已分类照片
+            cluster_bursts: 连拍模式，每组只分类代表照片（默认使用 ai_cluster_bursts）
+            backend: 分类后端 remote/local/hybrid（默认使用 ai_backend）
         
         Returns:
             分类结果统计
         """
-        if not self.settings.ai_api_key or self.settings.ai_api_key == "your_api_key_here":
-            return {
-                "success": False,
-                "message": "AI API Key未配置，请在.env文件中设置AI_API_KEY",
-                "classified": 0,
-            }
+        try:
+            backends = self._create_backends(backend or self.settings.ai_backend, max_workers)
+        except ValueError as e:
+            return {"success": False, "message": str(e), "classified": 0}
         
         photos = [self.repo.get_by_id(pid) for pid in photo_ids]
         photos = [p for p in photos if p is not None]
@@ -88,48 +157,96 @@ class AIService:
             "errors": [],
         }
         
-        # 收集需要更新的结果（线程安全）
+        # 收集需要更新的结果
         updates_to_apply = []
         
-        # 使用线程池并发处理 AI 调用（不在线程中操作数据库）
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_photo = {
-                executor.submit(self._call_ai_for_photo, photo): photo
-                for photo in photos
-            }
-            
-            for future in as_completed(future_to_photo):
-                photo = future_to_photo[future]
-                try:
-                    result = future.result()
-                    if result["success"]:
-                        results["classified"] += 1
-                        results["details"].append({
-                            "photo_id": photo.id,
-                            "category": result["category"],
-                            "tags": result["tags"],
-                        })
-                        # 收集更新数据，稍后在主线程中批量更新
-                        updates_to_apply.append({
-                            "photo_id": photo.id,
-                            "category": result.get("category", "未分类"),
-                            "tags_json": result.get("tags", []),
-                            "caption": result.get("caption", ""),
-                        })
-                    else:
-                        results["failed"] += 1
-                        results["errors"].append({
-                            "photo_id": photo.id,
-                            "error": result.get("error", "未知错误")
-                        })
-                except Exception as e:
-                    results["failed"] += 1
-                    results["errors"].append({
-                        "photo_id": photo.id,
-                        "error": str(e)
-                    })
-        
-        # 在主线程中批量更新数据库（避免 SQLite 线程安全问题）
+        # 先查分类缓存（照片内容SHA1 + 模型 + Prompt版本），命中的照片无需调用AI
+        outcomes = self._lookup_cache(photos)
+        uncached = [p for p in photos if p.sha1 not in outcomes]
+        results["cache_hits"] = len(photos) - len(uncached)
+        results["cache_misses"] = len(uncached)
+        results.update({"requests": 0, "retries": 0, "fallbacks": 0})
+        
+        # 连拍模式：未命中缓存的照片按连拍分组，只有每组的代表照片调用AI
+        if cluster_bursts is None:
+            cluster_bursts = self.settings.ai_cluster_bursts
+        if cluster_bursts:
+            bursts = [g for g in self._group_bursts(uncached) if len(g) > 1]
+            members = {p.id for g in bursts for p in g[1:]}
+            to_call = [p for p in uncached if p.id not in members]
+            results["burst_groups"] = len(bursts)
+            results["propagated"] = len(members)
+        else:
+            bursts = []
+            to_call = uncached
+        
+        # 依次调用各分类后端，置信度不足的照片交给下一个后端
+        results["by_backend"] = {}
+        remaining = to_call
+        for index, classifier in enumerate(backends):
+            if not remaining:
+                break
+            called = classifier.classify(remaining)
+            results.update(classifier.stats())
+            is_last = index == len(backends) - 1
+            accepted = []
+            next_remaining = []
+            for photo, result in zip(remaining, called):
+                confident = result["success"] and (
+                    classifier.min_confidence is None
+                    or result.get("confidence", 0) >= classifier.min_confidence
+                )
+                if confident:
+                    outcomes[photo.sha1] = result
+                    accepted.append((photo, result))
+                elif is_last:
+                    outcomes[photo.sha1] = result if not result["success"] else {
+                        "success": False,
+                        "error": "置信度不足，保持未分类",
+                    }
+                else:
+                    next_remaining.append(photo)
+            results["by_backend"][classifier.name] = len(accepted)
+            if classifier.cacheable and accepted:
+                self._store_cache([photo for photo, _ in accepted], [result for _, result in accepted])
+            remaining = next_remaining
+        
+        # 代表照片的结果复制给同组其他照片（不写入缓存：缓存只保存模型对该图片本身的输出）
+        burst_updates = []
+        for group in bursts:
+            representative = outcomes[group[0].sha1]
+            for member in group[1:]:
+                outcomes.setdefault(member.sha1, representative)
+            if representative["success"]:
+                burst_updates.append((group, representative))
+        burst_photo_ids = {p.id for group, _ in burst_updates for p in group}
+        
+        for photo in photos:
+            result = outcomes[photo.sha1]
+            if result["success"]:
+                results["classified"] += 1
+                results["details"].append({
+                    "photo_id": photo.id,
+                    "category": result["category"],
+                    "tags": result["tags"],
+                })
+                if photo.id in burst_photo_ids:
+                    continue
+                # 收集更新数据，稍后在调用线程中批量更新
+                updates_to_apply.append({
+                    "photo_id": photo.id,
+                    "category": result.get("category", "未分类"),
+                    "tags_json": result.get("tags", []),
+                    "caption": result.get("caption", ""),
+                })
+            else:
+                results["failed"] += 1
+                results["errors"].append({
+                    "photo_id": photo.id,
+                    "error": result.get("error", "未知错误")
+                })
+        
+        # 在调用线程中批量更新数据库（避免 SQLite 线程安全问题）
         for update in updates_to_apply:
             try:
                 self.repo.update_photo(update["photo_id"], {
@@ -144,102 +261,306 @@ class AIService:
                     "error": f"数据库更新失败: {str(e)}"
                 })
         
+        # 连拍组整组一次更新
+        for group, result in burst_updates:
+            try:
+                self.repo.batch_update_category(
+                    [p.id for p in group],
+                    result.get("category", "未分类"),
+                    tags=result.get("tags", []),
+                    caption=result.get("caption", ""),
+                )
+            except Exception as e:
+                self.db.rollback()
+                results["errors"].append({
+                    "photo_id": group[0].id,
+                    "error": f"数据库更新失败: {str(e)}"
+                })
+        
         results["message"] = f"AI分类完成：成功{results['classified']}张，失败{results['failed']}张"
+        if results["cache_hits"]:
+            results["message"] += f"（其中{results['cache_hits']}张命中缓存）"
+        if results["by_backend"].get("local"):
+            results["message"] += f"，本地预分类{results['by_backend']['local']}张"
+        if results.get("propagated"):
+            results["message"] += f"，{results['burst_groups']}组连拍共{results['propagated']}张沿用代表照片的结果"
         
         return results
     
-    def _call_ai_for_photo(self, photo, max_retries: int = 2) -> Dict[str, Any]:
+    def _create_backends(self, mode: str, max_workers: Optional[int]) -> List[ClassifierBackend]:
         """
-        对单张照片调用 AI API 进行分类（不操作数据库，线程安全）
+        按模式创建分类后端链
+        - remote：只用远程AI
+        - local：只用本地CPU分类，置信度不足的照片保持未分类
+        - hybrid：先本地分类，置信度不足的照片再交给远程AI（未配置API Key时等同local）
+        
+        Raises:
+            ValueError: 没有可用的后端（未配置API Key / 未安装numpy）
         """
-        # 获取缩略图路径
-        thumb_path = self.settings.thumbs_path / f"{photo.sha1}.jpg"
+        if mode not in ("remote", "local", "hybrid"):
+            raise ValueError(f"未知的分类后端: {mode}")
         
-        if not thumb_path.exists():
-            return {"success": False, "error": "缩略图不存在"}
+        backends: List[ClassifierBackend] = []
+        local_error = None
+        if mode in ("local", "hybrid"):
+            from .local_classifier import LocalFeatureClassifier
+            try:
+                backends.append(LocalFeatureClassifier(min_confidence=self.settings.ai_local_confidence))
+            except RuntimeError as e:
+                local_error = str(e)
+                print(f"本地分类不可用: {e}")
         
-        # 读取并编码图片
-        image_base64 = self._encode_image(thumb_path)
+        if mode in ("remote", "hybrid") and self._has_api_key():
+            backends.append(RemoteVisionBackend(self, max_workers))
         
-        # 调用AI API
-        for attempt in range(max_retries + 1):
+        if not backends:
+            raise ValueError(local_error if mode == "local" else "AI API Key未配置，请在.env文件中设置AI_API_KEY")
+        return backends
+    
+    def _has_api_key(self) -> bool:
+        return bool(self.settings.ai_api_key) and self.settings.ai_api_key != "your_api_key_here"
+    
+    def _group_bursts(self, photos: list) -> List[list]:
+        """按拍摄时间相邻 + 感知哈希相似分组，每组第一张为代表照片"""
+        return group_bursts(
+            photos,
+            gap_seconds=self.settings.dedup_burst_seconds,
+            max_distance=self.settings.ai_burst_max_distance,
+        )
+    
+    def _lookup_cache(self, photos: list) -> Dict[str, Dict[str, Any]]:
+        """查询分类缓存，返回 {sha1: 分类结果}；缓存关闭或查询失败时返回空字典"""
+        if not self.settings.ai_cache_enabled:
+            return {}
+        try:
+            cached = self.cache.get_many([p.sha1 for p in photos], self.settings.ai_model, PROMPT_VERSION)
+        except Exception as e:
+            self.db.rollback()
+            print(f"读取分类缓存失败: {e}")
+            return {}
+        return {sha1: {"success": True, **result} for sha1, result in cached.items()}
+    
+    def _store_cache(self, photos: list, outcomes: List[Dict[str, Any]]) -> None:
+        """写入成功的分类结果并按配置淘汰旧缓存（失败不影响分类结果）"""
+        settings = self.settings
+        if not settings.ai_cache_enabled:
+            return
+        entries = {
+            photo.sha1: {
+                "category": result.get("category"),
+                "tags": result.get("tags"),
+                "caption": result.get("caption"),
+            }
+            for photo, result in zip(photos, outcomes) if result["success"]
+        }
+        try:
+            self.cache.put_many(entries, settings.ai_model, PROMPT_VERSION)
+            self.cache.evict(settings.ai_cache_max_entries, settings.ai_cache_ttl_days)
+        except Exception as e:
+            self.db.rollback()
+            print(f"写入分类缓存失败: {e}")
+    
+    async def _classify_all(self, photos: list, max_concurrency: Optional[int]) -> tuple[list, Dict[str, int]]:
+        """
+        并发分类所有照片，按输入顺序返回结果
+        - ai_batch_size > 1 时每个请求携带多张图片，批量结果缺失或无法解析的照片退回单图请求
+        - 在途照片数受并发上限约束（工作协程从共享迭代器取任务），不会一次读入所有缩略图
+        
+        Returns:
+            (结果列表, {"requests": 实际请求数, "retries": 重试次数, "fallbacks": 退回单图请求的照片数})
+        """
+        outcomes: List[Optional[Dict[str, Any]]] = [None] * len(photos)
+        pending = iter(enumerate(photos))
+        batch_size = self.settings.ai_batch_size
+        self._fallbacks = 0
+        
+        async with VisionClient(self.settings, max_concurrency) as client:
+            async def worker():
+                while True:
+                    chunk = list(itertools.islice(pending, batch_size))
+                    if not chunk:
+                        return
+                    try:
+                        chunk_results = await self._classify_chunk(client, [photo for _, photo in chunk])
+                    except Exception as e:
+                        # 单组失败只影响该组照片，不中断其他工作协程
+                        chunk_results = [{"success": False, "error": str(e)} for _ in chunk]
+                    for (index, _), result in zip(chunk, chunk_results):
+                        outcomes[index] = result
+            
+            # 工作协程数略多于并发上限，让读取缩略图与等待响应重叠
+            concurrency = client.max_concurrency
+            chunks = -(-len(photos) // batch_size)
+            await asyncio.gather(*(worker() for _ in range(min(concurrency * 2, chunks))))
+            
+            return outcomes, {
+                "requests": client.requests,
+                "retries": client.retries,
+                "fallbacks": self._fallbacks,
+            }
+    
+    async def _classify_chunk(self, client: VisionClient, photos: list) -> List[Dict[str, Any]]:
+        """
+        分类一组照片（不操作数据库）
+        多张图片时先合并为一个请求，批量结果中缺失的照片再逐张请求
+        """
+        # 读取缩略图（兼容文件存储和打包存储）
+        thumbs = await asyncio.gather(*(asyncio.to_thread(read_thumb, photo.sha1) for photo in photos))
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(photos)
+        encoded = []
+        for pos, thumb_bytes in enumerate(thumbs):
+            if thumb_bytes is None:
+                results[pos] = {"success": False, "error": "缩略图不存在"}
+            else:
+                encoded.append((pos, self._encode_image(thumb_bytes)))
+        
+        if len(encoded) > 1:
+            batch_results = await self._call_ai_batch(client, [image for _, image in encoded])
+            for (pos, _), result in zip(encoded, batch_results):
+                results[pos] = result
+        
+        # 单张照片，或批量结果缺失/无效的照片：逐张请求
+        retry = [(pos, image) for pos, image in encoded if results[pos] is None]
+        if len(encoded) > 1:
+            self._fallbacks += len(retry)
+        singles = await asyncio.gather(*(self._call_ai_single(client, image) for _, image in retry))
+        for (pos, _), result in zip(retry, singles):
+            results[pos] = result
+        
+        return results
+    
+    async def _call_ai_batch(self, client: VisionClient, images: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        一个请求分类多张图片
+        
+        Returns:
+            与输入顺序对应的结果列表；请求失败或某张图片没有有效结果时对应位置为None
+        """
+        count = len(images)
+        payload = self._build_payload(
+            images,
+            CLASSIFY_BATCH_PROMPT.format(count=count, last=count - 1),
+            max_tokens=300 * count,
+        )
+        try:
+            data = await client.chat_completion(payload)
+            items = self._parse_json_array(data["choices"][0]["message"]["content"])
+        except Exception:
+            return [None] * count
+        
+        aligned: List[Optional[Dict[str, Any]]] = [None] * count
+        if not items:
+            return aligned
+        
+        for pos, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            # 没有index字段但数量一致时按顺序对应
+            index = item.get("index", pos if len(items) == count else None)
+            if isinstance(index, int) and 0 <= index < count and self._is_valid_item(item):
+                aligned[index] = self._to_result(item)
+        return aligned
+    
+    async def _call_ai_single(self, client: VisionClient, image_base64: str, parse_retries: int = 1) -> Dict[str, Any]:
+        """
+        单张图片调用 AI API 进行分类（不操作数据库）
+        网络错误和429/5xx由客户端退避重试，这里只对无法解析的回复重新请求
+        """
+        payload = self._build_payload([image_base64], CLASSIFY_PROMPT)
+        
+        for _ in range(parse_retries + 1):
             try:
-                result = self._call_vision_api(image_base64)
-                
-                if result:
-                    # 只返回结果，不在这里更新数据库（避免线程安全问题）
-                    return {
-                        "success": True,
-                        "category": result.get("category"),
-                        "tags": result.get("tags"),
-                        "caption": result.get("caption"),
-                    }
-                    
+                data = await client.chat_completion(payload)
+                result = self._parse_json_content(data["choices"][0]["message"]["content"])
             except Exception as e:
-                if attempt == max_retries:
-                    return {"success": False, "error": str(e)}
+                return {"success": False, "error": str(e)}
+            
+            # 回复可能是合法JSON但不是分类对象（如 ["风光"]），或类别不在固定列表中，视为无法解析
+            if self._is_valid_item(result):
+                return self._to_result(result)
         
-        return {"success": False, "error": "分类失败"}
+        return {"success": False, "error": "分类失败：模型回复格式无效"}
+    
+    @staticmethod
+    def _is_valid_item(item: Any) -> bool:
+        """模型返回的是否为有效的分类对象（字典，且类别在固定类别列表中）"""
+        return isinstance(item, dict) and item.get("category") in CATEGORIES
     
-    def _encode_image(self, image_path: Path) -> str:
+    def _to_result(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """模型返回的分类对象 → 分类结果"""
+        return {
+            "success": True,
+            "category": item.get("category"),
+            "tags": item.get("tags"),
+            "caption": item.get("caption"),
+        }
+    
+    def _encode_image(self, image_bytes: bytes) -> str:
         """将图片编码为Base64"""
-        with open(image_path, "rb") as f:
-            return base64.b64encode(f.read()).decode("utf-8")
+        return base64.b64encode(image_bytes).decode("utf-8")
     
-    def _call_vision_api(self, image_base64: str) -> Optional[Dict[str, Any]]:
+    def _build_payload(self, images: List[str], prompt: str, max_tokens: int = 500) -> Dict[str, Any]:
         """
-        调用多模态视觉API
-        支持OpenAI兼容接口
+        构造多模态视觉请求
+        支持OpenAI兼容接口；多张图片时每张前加编号文字，与批量Prompt中的序号对应
         """
-        settings = self.settings
+        def image_part(image_base64: str) -> Dict[str, Any]:
+            return {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{image_base64}"
+                }
+            }
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {settings.ai_api_key}",
-        }
+        if len(images) == 1:
+            content = [image_part(images[0]), {"type": "text", "text": prompt}]
+        else:
+            content = [{"type": "text", "text": prompt}]
+            for index, image_base64 in enumerate(images):
+                content.append({"type": "text", "text": f"Image {index}:"})
+                content.append(image_part(image_base64))
         
-        payload = {
-            "model": settings.ai_model,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        },
-                        {"type": "text", "text": CLASSIFY_PROMPT},
-                    ]
-                }
-            ],
-            "max_tokens": 500,
+        return {
+            "model": self.settings.ai_model,
+            "messages": [{"role": "user", "content": content}],
+            "max_tokens": max_tokens,
         }
-        
-        with httpx.Client(timeout=120.0) as client:
-            response = client.post(
-                f"{settings.ai_base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            content = data["choices"][0]["message"]["content"]
-            
-            # 解析JSON响应
-            # 尝试提取JSON部分（处理可能的额外文字）
+    
+    def _parse_json_content(self, content: str) -> Optional[Dict[str, Any]]:
+        """
+        解析JSON响应
+        尝试提取JSON部分（处理可能的额外文字）
+        """
+        try:
+            # 直接解析
+            return json.loads(content)
+        except json.JSONDecodeError:
+            # 尝试从内容中提取JSON
+            json_match = re.search(r'\{[^{}]*\}', content)
+            if json_match:
+                return json.loads(json_match.group())
+            return None
+    
+    def _parse_json_array(self, content: str) -> Optional[List[Any]]:
+        """
+        解析批量分类的JSON数组响应
+        兼容 {"results": [...]} 包装和前后附带的文字/代码块标记
+        """
+        try:
+            parsed = json.loads(content)
+        except json.JSONDecodeError:
+            array_match = re.search(r'\[.*\]', content, re.DOTALL)
+            if not array_match:
+                return None
             try:
-                # 直接解析
-                return json.loads(content)
+                parsed = json.loads(array_match.group())
             except json.JSONDecodeError:
-                # 尝试从内容中提取JSON
-                import re
-                json_match = re.search(r'\{[^{}]*\}', content)
-                if json_match:
-                    return json.loads(json_match.group())
                 return None
+        
+        if isinstance(parsed, dict):
+            parsed = parsed.get("results")
+        return parsed if isinstance(parsed, list) else None
     
     def get_categories(self) -> List[str]:
         """获取所有可用类别"""
@@ -0,0 +1,362 @@
+"""
+近似重复/连拍检测服务
+- 每张照片在扫描时计算64位感知哈希（dHash），保存在 photos.dhash
+- 用多索引哈希（Multi-Index Hashing）查找汉明距离不超过阈值的照片对：
+  把64位哈希切成8块，距离不超过d的两个哈希至少有 8-d 块完全相同（鸽巢原理），
+  按每种 8-d 块组合分桶，只比较同桶的哈希，不做O(n²)两两比较
+- 用并查集把相似照片合并成组：桶内已在同一组的哈希不再比较，新哈希先与各组的代表比较，
+  连拍等大量相似照片落在同一个桶里时比较次数为线性；组内拍摄时间连续（间隔不超过阈值）的标记为连拍
+- 分组由后台任务（dedup_clusters）对全部照片计算后写入数据库，查询接口只读取保存的结果
+- AI分类的连拍模式按拍摄时间相邻 + 相似度分组，每组只分类代表照片（group_bursts）
+"""
+from pathlib import Path
+from datetime import datetime
+from itertools import combinations
+from typing import Dict, Any, Optional, List, Iterable
+
+from sqlalchemy.orm import Session
+
+from ..core.config import get_settings
+from ..core.thumbs import read_thumb
+from ..core.utils import compute_dhash
+from ..db.models import Photo
+from ..db.dedup_repo import DedupRepository
+
+
+# 哈希切分的块数（每块8位）：汉明距离不超过d的两个哈希至少有 8-d 块完全相同
+HASH_BITS = 64
+HASH_BLOCKS = 8
+
+# 计算组代表照片（medoid）时最多参与比较的成员数（两两比较的开销为平方级）
+MEDOID_SAMPLE = 256
+
+# 补算感知哈希时每批处理的照片数
+BACKFILL_BATCH_SIZE = 500
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个哈希的汉明距离"""
+    return (a ^ b).bit_count()
+
+
+def medoid_index(hashes: List[int]) -> int:
+    """
+    组内代表照片：与其他成员汉明距离之和最小的成员
+
+    Returns:
+        hashes中的下标
+    """
+    sample = hashes[:MEDOID_SAMPLE]
+    if len(sample) <= 2:
+        return 0
+    totals = [0] * len(sample)
+    for i, j in combinations(range(len(sample)), 2):
+        d = hamming_distance(sample[i], sample[j])
+        totals[i] += d
+        totals[j] += d
+    return min(range(len(sample)), key=totals.__getitem__)
+
+
+def block_masks(max_distance: int) -> List[int]:
+    """
+    多索引哈希的各个索引：每个索引取 8-d 个块组成掩码，两个哈希在某个掩码下取值相同才可能相似
+
+    Args:
+        max_distance: 汉明距离阈值（0~7）
+
+    Returns:
+        掩码列表（共 C(8, 8-d) 个）
+    """
+    block_bits = HASH_BITS // HASH_BLOCKS
+    required = HASH_BLOCKS - max_distance
+    if required < 1:
+        raise ValueError(f"汉明距离阈值不能超过 {HASH_BLOCKS - 1}")
+    block = (1 << block_bits) - 1
+    masks = []
+    for blocks in combinations(range(HASH_BLOCKS), required):
+        mask = 0
+        for b in blocks:
+            mask |= block << (b * block_bits)
+        masks.append(mask)
+    return masks
+
+
+class _UnionFind:
+    """并查集（路径压缩 + 按大小合并）"""
+
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+
+
+def _merge_bucket(bucket: List[int], values: List[int], max_distance: int, groups: "_UnionFind") -> None:
+    """
+    合并同一个桶内汉明距离不超过阈值的哈希
+    桶内成员按所属的组划分，每组的第一个成员作为代表：新成员跳过已在同一组的成员，
+    与其他组先比较代表，不相似时才继续比较该组其余成员（结果与两两比较相同）
+
+    Args:
+        bucket: 桶内哈希在values中的下标
+    """
+    members: List[List[int]] = []  # 桶内各组的成员，第一个为代表
+    for position in bucket:
+        value = values[position]
+        root = groups.find(position)
+        joined: Optional[List[int]] = None
+        kept: List[List[int]] = []
+        for group in members:
+            if groups.find(group[0]) == root or any(
+                (value ^ values[other]).bit_count() <= max_distance for other in group
+            ):
+                groups.union(position, group[0])
+                root = groups.find(position)
+                if joined is None:
+                    joined = group
+                    kept.append(group)
+                else:
+                    joined.extend(group)
+            else:
+                kept.append(group)
+        if joined is None:
+            kept.append([position])
+        else:
+            joined.append(position)
+        members = kept
+
+
+def cluster_hashes(hashes: Iterable[int], max_distance: int) -> List[List[int]]:
+    """
+    按汉明距离把哈希分组（相似关系的传递闭包）
+    每个掩码依次建一个分桶表，只合并同一个桶内的哈希；同一时间只保留一个表，内存为O(n)
+
+    Args:
+        hashes: 哈希值序列
+        max_distance: 汉明距离阈值
+
+    Returns:
+        分组列表，每组为输入序列中的下标，只包含成员数不少于2的组
+    """
+    # 完全相同的哈希先合并，索引中只放不同的哈希值（避免纯色图等大量相同哈希挤在一个桶里）
+    members_by_value: Dict[int, List[int]] = {}
+    for i, value in enumerate(hashes):
+        members_by_value.setdefault(value, []).append(i)
+    values = list(members_by_value)
+
+    groups = _UnionFind(len(values))
+    for mask in block_masks(max_distance):
+        buckets: Dict[int, List[int]] = {}
+        for position, value in enumerate(values):
+            buckets.setdefault(value & mask, []).append(position)
+        for bucket in buckets.values():
+            if len(bucket) > 1:
+                _merge_bucket(bucket, values, max_distance, groups)
+
+    clusters: Dict[int, List[int]] = {}
+    for position, value in enumerate(values):
+        clusters.setdefault(groups.find(position), []).extend(members_by_value[value])
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def group_bursts(photos: list, gap_seconds: float, max_distance: int) -> List[list]:
+    """
+    按拍摄时间相邻 + 缩略图相似把照片分成连拍组
+    照片按拍摄时间排序后顺序扫描：与上一张的拍摄间隔不超过gap_seconds、
+    且感知哈希距离不超过max_distance时归入同一组（只比较相邻照片，O(n log n)）
+    没有拍摄时间或感知哈希的照片各自单独成组
+
+    Args:
+        photos: 带 taken_at、dhash 属性的照片对象
+        gap_seconds: 相邻照片的最大拍摄间隔（秒）
+        max_distance: 相邻照片的最大汉明距离
+
+    Returns:
+        分组列表，每组的第一张为代表照片（medoid），其余按拍摄时间排序
+    """
+    groups: List[list] = []
+    current: list = []
+    previous = None
+    for photo in sorted(photos, key=lambda p: (p.taken_at is None, p.taken_at or datetime.min)):
+        if photo.taken_at is None or not photo.dhash:
+            groups.append([photo])
+            continue
+        value = int(photo.dhash, 16)
+        if (
+            current
+            and (photo.taken_at - current[-1].taken_at).total_seconds() <= gap_seconds
+            and hamming_distance(value, previous) <= max_distance
+        ):
+            current.append(photo)
+        else:
+            current = [photo]
+            groups.append(current)
+        previous = value
+
+    for i, group in enumerate(groups):
+        if len(group) > 2:
+            center = medoid_index([int(p.dhash, 16) for p in group])
+            groups[i] = [group[center]] + group[:center] + group[center + 1:]
+    return groups
+
+
+class DedupService:
+    """近似重复/连拍检测服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.settings = get_settings()
+        self.repo = DedupRepository(db)
+
+    def find_clusters(
+        self,
+        max_distance: Optional[int] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        min_size: int = 2,
+        bursts_only: bool = False,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        """
+        读取已保存的近似重复照片组（按成员数从多到少分页返回）
+
+        Args:
+            max_distance: 汉明距离阈值（默认使用配置 dedup_max_distance）
+            date_from/date_to: 拍摄日期范围（可选，只返回完全落在范围内的组）
+            min_size: 最少成员数
+            bursts_only: 只返回连拍组
+            offset/limit: 分页
+
+        Returns:
+            {"clusters": [...], "total_clusters", "photos_in_clusters", "hashed", "unhashed",
+             "computed_at", "stale"}
+            每组包含 photo_ids（按拍摄时间排序）、representative_id、size、is_burst、start、end；
+            computed_at 为None表示该阈值尚未计算，stale 表示计算后照片表有变化，需要重新计算
+        """
+        if max_distance is None:
+            max_distance = self.settings.dedup_max_distance
+
+        run = self.repo.get_run(max_distance)
+        photo_count, max_photo_id, hashed = self.repo.photo_signature()
+        clusters, total, photos = self.repo.list_clusters(
+            max_distance,
+            date_from=date_from,
+            date_to=date_to,
+            min_size=min_size,
+            bursts_only=bursts_only,
+            offset=offset,
+            limit=limit,
+        )
+        return {
+            "clusters": [cluster.to_dict() for cluster in clusters],
+            "total_clusters": total,
+            "photos_in_clusters": photos,
+            "hashed": hashed,
+            "unhashed": photo_count - hashed,
+            "computed_at": run.computed_at.isoformat() if run else None,
+            "stale": run is None or (run.photo_count, run.max_photo_id, run.hashed) != (photo_count, max_photo_id, hashed),
+        }
+
+    def compute_clusters(self, max_distance: Optional[int] = None) -> Dict[str, Any]:
+        """
+        对全部有感知哈希的照片分组并保存（后台任务 dedup_clusters 中执行）
+
+        Returns:
+            {"max_distance", "total_clusters", "photos_in_clusters", "hashed"}
+        """
+        if max_distance is None:
+            max_distance = self.settings.dedup_max_distance
+
+        # 先取签名：计算期间新增的照片会让结果显示为已过期
+        signature = self.repo.photo_signature()
+        rows = self.db.query(Photo.id, Photo.dhash, Photo.taken_at).filter(Photo.dhash.isnot(None)).all()
+        hashes = [int(row.dhash, 16) for row in rows]
+
+        clusters = []
+        for members in cluster_hashes(hashes, max_distance):
+            members.sort(key=lambda i: (rows[i].taken_at or datetime.max, rows[i].id))
+            taken = [rows[i].taken_at for i in members]
+            representative = members[medoid_index([hashes[i] for i in members])]
+            known = [t for t in taken if t]
+            clusters.append({
+                "photo_ids": [rows[i].id for i in members],
+                "representative_id": rows[representative].id,
+                "size": len(members),
+                "is_burst": 1 if self._is_burst(taken) else 0,
+                "start_at": min(known) if known else None,
+                "end_at": max(known) if known else None,
+            })
+
+        self.repo.replace(max_distance, clusters, signature)
+        return {
+            "max_distance": max_distance,
+            "total_clusters": len(clusters),
+            "photos_in_clusters": sum(c["size"] for c in clusters),
+            "hashed": len(rows),
+        }
+
+    def _is_burst(self, taken: List[Optional[datetime]]) -> bool:
+        """按拍摄时间排序后，相邻照片间隔都不超过 dedup_burst_seconds"""
+        if any(t is None for t in taken):
+            return False
+        limit = self.settings.dedup_burst_seconds
+        return all((b - a).total_seconds() <= limit for a, b in zip(taken, taken[1:]))
+
+    def backfill_hashes(self, batch_size: int = BACKFILL_BATCH_SIZE) -> Dict[str, int]:
+        """
+        为没有感知哈希的照片（旧版本导入）补算dHash
+        优先使用已生成的preview缩略图，缩略图不存在时读取原图
+
+        Returns:
+            {"updated": 补算成功数, "failed": 失败数}
+        """
+        updated = 0
+        failed = 0
+        last_id = 0
+        while True:
+            rows = self.db.query(Photo.id, Photo.sha1, Photo.file_path, Photo.library_path).filter(
+                Photo.dhash.is_(None), Photo.id > last_id
+            ).order_by(Photo.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            mappings = []
+            for row in rows:
+                dhash = self._hash_photo(row.sha1, row.library_path or row.file_path)
+                if dhash:
+                    mappings.append({"id": row.id, "dhash": dhash})
+                else:
+                    failed += 1
+
+            if mappings:
+                self.db.bulk_update_mappings(Photo, mappings)
+                self.db.commit()
+                updated += len(mappings)
+
+        return {"updated": updated, "failed": failed}
+
+    @staticmethod
+    def _hash_photo(sha1: str, file_path: Optional[str]) -> Optional[str]:
+        thumb = read_thumb(sha1, "preview")
+        if thumb is not None:
+            return compute_dhash(Path(f"{sha1}.jpg"), data=thumb)
+        if file_path and Path(file_path).exists():
+            return compute_dhash(Path(file_path))
+        return None
@@ -0,0 +1,300 @@
+"""
+后台任务服务模块
+- 扫描/整理/导出/AI分类/感知哈希补算/近似重复分组作为后台任务在工作线程池中执行，API立即返回任务ID
+- 任务记录保存在jobs表中，服务重启后未完成的任务重新排队执行
+  （扫描有文件指纹、整理会跳过已整理的照片，重复执行只处理剩余部分）；
+  不能安全重复执行的任务（导出会把已复制的文件再复制一份）如果执行到一半被中断，则标记为失败
+- 运行中任务的进度保存在内存中，结束时写入数据库
+"""
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable
+
+from sqlalchemy.orm import Session
+
+from ..core.config import get_settings
+from ..db.session import SessionLocal
+from ..db.jobs_repo import JobsRepository
+from .scanner_service import ScannerService, ScanProgress
+from .organizer_service import OrganizerService
+from .export_service import ExportService
+from .ai_service import AIService
+from .dedup_service import DedupService
+
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """任务参数以JSON保存，日期为ISO字符串"""
+    return datetime.fromisoformat(value) if value else None
+
+
+def _run_scan(db: Session, params: Dict[str, Any], progress: ScanProgress) -> Dict[str, Any]:
+    # 结果只保留 photo_ids，避免任务表中存放完整照片列表
+    return ScannerService(db).scan_directory(
+        params["sd_path"], progress=progress, include_photos=False
+    )
+
+
+def _run_organize(db: Session, params: Dict[str, Any], progress: ScanProgress) -> Dict[str, Any]:
+    return OrganizerService(db).organize_to_library(
+        library_root=params["library_root"],
+        photo_ids=params.get("photo_ids"),
+        date_from=_parse_datetime(params.get("date_from")),
+        date_to=_parse_datetime(params.get("date_to")),
+    )
+
+
+def _run_export(db: Session, params: Dict[str, Any], progress: ScanProgress) -> Dict[str, Any]:
+    return ExportService(db).export_selected(
+        export_dir=params["export_dir"],
+        include_raw=params.get("include_raw", True),
+        as_zip=params.get("as_zip", False),
+        photo_ids=params.get("photo_ids"),
+    )
+
+
+def _run_classify(db: Session, params: Dict[str, Any], progress: ScanProgress) -> Dict[str, Any]:
+    return AIService(db).classify_photos(
+        photo_ids=params["photo_ids"],
+        max_workers=params.get("max_workers"),
+        skip_classified=params.get("skip_classified", False),
+        cluster_bursts=params.get("cluster_bursts"),
+        backend=params.get("backend"),
+    )
+
+
+def _run_dedup_backfill(db: Session, params: Dict[str, Any], progress: ScanProgress) -> Dict[str, Any]:
+    return DedupService(db).backfill_hashes()
+
+
+def _run_dedup_clusters(db: Session, params: Dict[str, Any], progress: ScanProgress) -> Dict[str, Any]:
+    return DedupService(db).compute_clusters(max_distance=params.get("max_distance"))
+
+
+# 任务类型 → 执行函数 (db, 参数, 进度) -> 结果
+JOB_HANDLERS: Dict[str, Callable[[Session, Dict[str, Any], ScanProgress], Dict[str, Any]]] = {
+    "scan": _run_scan,
+    "organize": _run_organize,
+    "export": _run_export,
+    "classify": _run_classify,
+    "dedup_backfill": _run_dedup_backfill,
+    "dedup_clusters": _run_dedup_clusters,
+}
+
+# 执行中被中断后可以重新执行的任务类型（重复执行只处理剩余部分，不会产生重复结果）
+RESUMABLE_JOB_TYPES = {"scan", "organize", "classify", "dedup_backfill", "dedup_clusters"}
+
+# 上报分阶段进度、支持中途取消的任务类型（其余任务只能在开始前取消）
+PROGRESS_JOB_TYPES = {"scan"}
+
+
+class _LiveJob:
+    """排队/运行中任务的内存状态"""
+
+    def __init__(self, job_id: str, job_type: str):
+        self.job_id = job_id
+        self.job_type = job_type
+        self.status = JOB_PENDING
+        self.progress = ScanProgress()
+
+    def progress_snapshot(self) -> Optional[Dict[str, Any]]:
+        if self.job_type not in PROGRESS_JOB_TYPES:
+            return None
+        return self.progress.snapshot()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "job_type": self.job_type,
+            "status": self.status,
+            "progress": self.progress_snapshot(),
+        }
+
+
+class JobManager:
+    """后台任务管理器（进程内单例）"""
+
+    def __init__(self, workers: int, retention_days: int):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker")
+        self._lock = threading.Lock()
+        self._live: Dict[str, _LiveJob] = {}
+        self._retention_days = retention_days
+        self._stopping = False
+
+    # ========== 提交与恢复 ==========
+
+    def submit(self, job_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        创建任务并加入队列
+
+        Args:
+            job_type: 任务类型（JOB_HANDLERS中的键）
+            params: 任务参数（需可JSON序列化）
+
+        Returns:
+            任务信息字典
+        """
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"未知的任务类型: {job_type}")
+
+        db = SessionLocal()
+        try:
+            job = JobsRepository(db).create(job_type, params)
+            data = job.to_dict()
+        finally:
+            db.close()
+
+        self._enqueue(data["job_id"], job_type)
+        return data
+
+    def resume(self) -> int:
+        """
+        服务启动时调用：清理过期任务记录，把未完成的任务重新排队；
+        执行到一半被中断、且不能重复执行的任务标记为失败
+
+        Returns:
+            恢复的任务数
+        """
+        db = SessionLocal()
+        try:
+            repo = JobsRepository(db)
+            repo.delete_finished_before(datetime.now() - timedelta(days=self._retention_days))
+            unfinished = []
+            for job in repo.list_unfinished():
+                if job.status == JOB_RUNNING and job.job_type not in RESUMABLE_JOB_TYPES:
+                    repo.finish(job.id, JOB_FAILED, error="服务重启时任务被中断，请重新提交")
+                else:
+                    unfinished.append((job.id, job.job_type))
+        finally:
+            db.close()
+
+        for job_id, job_type in unfinished:
+            self._enqueue(job_id, job_type)
+        return len(unfinished)
+
+    def _enqueue(self, job_id: str, job_type: str) -> None:
+        live = _LiveJob(job_id, job_type)
+        with self._lock:
+            self._live[job_id] = live
+        self._pool.submit(self._run, live)
+
+    # ========== 执行 ==========
+
+    def _run(self, live: _LiveJob) -> None:
+        """在工作线程中执行任务（每个任务使用独立的数据库会话）"""
+        db = SessionLocal()
+        repo = JobsRepository(db)
+        try:
+            if self._stopping:
+                return
+            if live.progress.cancelled:
+                repo.finish(live.job_id, JOB_CANCELLED)
+                return
+
+            job = repo.mark_running(live.job_id)
+            if job is None:
+                return
+            live.status = JOB_RUNNING
+            live.progress.start()
+            params = dict(job.params_json or {})
+
+            try:
+                result = JOB_HANDLERS[live.job_type](db, params, live.progress)
+            except Exception as e:
+                db.rollback()
+                print(f"后台任务失败 {live.job_type} {live.job_id}: {e}")
+                repo.finish(live.job_id, JOB_FAILED, error=str(e), progress=live.progress_snapshot())
+                return
+
+            if result.get("cancelled") and self._stopping:
+                # 服务关闭导致的中断：放回队列，下次启动继续
+                repo.requeue(live.job_id, progress=live.progress_snapshot())
+                return
+
+            status = JOB_CANCELLED if result.get("cancelled") else JOB_COMPLETED
+            repo.finish(live.job_id, status, result=result, progress=live.progress_snapshot())
+        finally:
+            with self._lock:
+                self._live.pop(live.job_id, None)
+            db.close()
+
+    # ========== 查询与取消 ==========
+
+    def live_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """排队/运行中任务的实时状态（不访问数据库）；任务已结束或不存在时返回None"""
+        with self._lock:
+            live = self._live.get(job_id)
+        return live.to_dict() if live else None
+
+    def get(self, job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        """获取任务信息（运行中任务使用内存中的实时进度）"""
+        db = SessionLocal()
+        try:
+            job = JobsRepository(db).get_by_id(job_id)
+            data = job.to_dict(include_result=include_result) if job else None
+        finally:
+            db.close()
+
+        live = self.live_status(job_id)
+        if data and live:
+            data["status"] = live["status"]
+            data["progress"] = live["progress"]
+        return data
+
+    def list_jobs(self, limit: int = 50, job_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """最近的任务列表（不含结果）"""
+        db = SessionLocal()
+        try:
+            jobs = [job.to_dict(include_result=False) for job in JobsRepository(db).list_recent(limit, job_type)]
+        finally:
+            db.close()
+
+        for data in jobs:
+            live = self.live_status(data["job_id"])
+            if live:
+                data["status"] = live["status"]
+                data["progress"] = live["progress"]
+        return jobs
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消任务：排队中的任务不再执行；运行中的扫描停止发现新文件，
+        写入在途文件后结束（已入库的照片保留）；其他类型的运行中任务无法中途取消
+
+        Returns:
+            任务是否仍在排队/运行（已结束的任务无需取消）
+        """
+        with self._lock:
+            live = self._live.get(job_id)
+        if live is None:
+            return False
+        live.progress.cancel_event.set()
+        return True
+
+    def shutdown(self) -> None:
+        """
+        服务关闭：中断运行中的扫描并放回队列，丢弃排队中的任务（它们在数据库中仍为pending，
+        下次启动时恢复执行）
+        """
+        self._stopping = True
+        with self._lock:
+            lives = list(self._live.values())
+        for live in lives:
+            live.progress.cancel_event.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+@lru_cache()
+def get_job_manager() -> JobManager:
+    """获取后台任务管理器单例"""
+    settings = get_settings()
+    return JobManager(workers=settings.job_workers, retention_days=settings.job_retention_days)
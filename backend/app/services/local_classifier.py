@@ -0,0 +1,242 @@
+"""
+本地CPU预分类模块
+不调用远程AI，从缩略图和EXIF提取廉价特征，按规则给出 夜景/风光/微距/人像 的可能类别和置信度
+- 缩略图缩小到 64x64 后成批堆叠为数组，亮度直方图、饱和度、天空/植被占比、
+  中心与边缘清晰度之比、肤色占比等特征用NumPy对整批照片一次计算
+- EXIF特征：焦距、ISO、快门、光圈、拍摄时刻、镜头型号
+- 置信度不足的照片由调用方交给远程AI（AI_BACKEND=hybrid）
+
+依赖numpy（可选依赖，未安装时本地分类不可用）
+"""
+import io
+from typing import Dict, Any, List, Optional
+
+from PIL import Image
+
+from ..core.thumbs import read_thumb
+from .ai_service import ClassifierBackend
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+# 本地分类能识别的类别（其余类别只能由远程AI判断）
+LOCAL_CATEGORIES = ["夜景", "风光", "微距", "人像"]
+
+# 特征提取时缩略图缩放到的尺寸
+FEATURE_SIZE = (64, 64)
+
+# 每批处理的照片数（一批的像素数组约 批大小 x 48KB）
+LOCAL_BATCH_SIZE = 256
+
+# 亮度直方图的分箱数
+HISTOGRAM_BINS = 8
+
+# 最高分与次高分相差不到该值时按比例降低置信度（两个类别难以区分）
+MIN_MARGIN = 0.15
+
+
+def _ramp(x, low: float, high: float):
+    """线性映射：x<=low 为0，x>=high 为1（high<low 时为递减）"""
+    return np.clip((x - low) / (high - low), 0.0, 1.0)
+
+
+class LocalFeatureClassifier(ClassifierBackend):
+    """
+    基于缩略图和EXIF特征的本地分类器
+
+    用法:
+        results = LocalFeatureClassifier(min_confidence=0.6).classify(photos)
+    """
+
+    name = "local"
+
+    def __init__(self, min_confidence: Optional[float] = None, batch_size: int = LOCAL_BATCH_SIZE):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("本地分类需要安装numpy：pip install numpy")
+        self.min_confidence = min_confidence
+        self.batch_size = batch_size
+
+    def classify(self, photos: list) -> List[Dict[str, Any]]:
+        """
+        分类照片（不操作数据库）
+
+        Args:
+            photos: Photo对象列表（使用sha1和EXIF字段）
+
+        Returns:
+            与输入顺序对应的结果列表，成功时包含 category、confidence
+        """
+        results: List[Dict[str, Any]] = []
+        for i in range(0, len(photos), self.batch_size):
+            results.extend(self._classify_batch(photos[i:i + self.batch_size]))
+        return results
+
+    def _classify_batch(self, photos: list) -> List[Dict[str, Any]]:
+        pixels = [self._load_pixels(photo.sha1) for photo in photos]
+        valid = [i for i, p in enumerate(pixels) if p is not None]
+        results: List[Dict[str, Any]] = [{"success": False, "error": "缩略图不存在"}] * len(photos)
+        if not valid:
+            return results
+
+        batch = np.stack([pixels[i] for i in valid]).astype(np.float32) / 255.0
+        features = self._image_features(batch)
+        features.update(self._exif_features([photos[i] for i in valid]))
+        scores = self._score(features)
+
+        order = np.argsort(scores, axis=1)
+        best = order[:, -1]
+        top = scores[np.arange(len(valid)), best]
+        second = scores[np.arange(len(valid)), order[:, -2]]
+        confidence = top * np.clip((top - second) / MIN_MARGIN, 0.0, 1.0)
+
+        for row, index in enumerate(valid):
+            results[index] = {
+                "success": True,
+                "category": LOCAL_CATEGORIES[best[row]],
+                "tags": [],
+                "caption": None,
+                "confidence": round(float(confidence[row]), 3),
+            }
+        return results
+
+    @staticmethod
+    def _load_pixels(sha1: str) -> Optional["np.ndarray"]:
+        """读取preview缩略图并缩小为 FEATURE_SIZE 的RGB数组"""
+        data = read_thumb(sha1)
+        if data is None:
+            return None
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                img.draft("RGB", (FEATURE_SIZE[0] * 2, FEATURE_SIZE[1] * 2))
+                small = img.convert("RGB").resize(FEATURE_SIZE, Image.Resampling.BOX)
+                return np.asarray(small, dtype=np.uint8)
+        except Exception as e:
+            print(f"读取缩略图失败 {sha1}: {e}")
+            return None
+
+    @staticmethod
+    def _image_features(batch: "np.ndarray") -> Dict[str, "np.ndarray"]:
+        """
+        整批计算图像特征
+
+        Args:
+            batch: (N, H, W, 3) 的0~1浮点数组
+
+        Returns:
+            {特征名: (N,) 数组}
+        """
+        r, g, b = batch[..., 0], batch[..., 1], batch[..., 2]
+        luma = 0.299 * r + 0.587 * g + 0.114 * b
+        maxc = batch.max(axis=-1)
+        minc = batch.min(axis=-1)
+        saturation = (maxc - minc) / (maxc + 1e-6)
+
+        # 亮度直方图（每张图各分箱的像素占比）
+        bins = np.minimum((luma * HISTOGRAM_BINS).astype(np.int32), HISTOGRAM_BINS - 1)
+        histogram = np.stack([(bins == k).mean(axis=(1, 2)) for k in range(HISTOGRAM_BINS)], axis=1)
+
+        # 上三分之一的天空（偏蓝且较亮）、整幅的植被（偏绿）
+        top = batch[:, :batch.shape[1] // 3]
+        top_luma = luma[:, :batch.shape[1] // 3]
+        sky = (top[..., 2] > top[..., 0]) & (top[..., 2] >= top[..., 1] * 0.95) & (top_luma > 0.45)
+        green = (g > r * 1.05) & (g > b * 1.05) & (saturation > 0.15)
+
+        # 清晰度：亮度梯度能量，中心区域与边缘区域之比（背景虚化时中心远高于边缘）
+        gradient = np.zeros_like(luma)
+        gradient[:, :, 1:] += np.abs(np.diff(luma, axis=2))
+        gradient[:, 1:, :] += np.abs(np.diff(luma, axis=1))
+        h, w = luma.shape[1:]
+        center_mask = np.zeros((h, w), dtype=bool)
+        center_mask[h // 4:h * 3 // 4, w // 4:w * 3 // 4] = True
+        center_energy = gradient[:, center_mask].mean(axis=1)
+        border_energy = gradient[:, ~center_mask].mean(axis=1)
+
+        # 中心区域肤色占比（RGB肤色规则）
+        center = batch[:, h // 4:h * 3 // 4, w // 4:w * 3 // 4]
+        cr, cg, cb = center[..., 0], center[..., 1], center[..., 2]
+        skin = (
+            (cr > 0.37) & (cg > 0.16) & (cb > 0.08)
+            & (cr > cg) & (cr > cb) & (cr - cg > 0.06)
+            & (center.max(axis=-1) - center.min(axis=-1) > 0.06)
+        )
+
+        return {
+            "brightness": luma.mean(axis=(1, 2)),
+            "dark": histogram[:, :2].sum(axis=1),
+            "highlight": histogram[:, -1],
+            "saturation": saturation.mean(axis=(1, 2)),
+            "sky": sky.mean(axis=(1, 2)),
+            "green": green.mean(axis=(1, 2)),
+            "center_focus": center_energy / (border_energy + 1e-4),
+            "skin": skin.mean(axis=(1, 2)),
+        }
+
+    @staticmethod
+    def _exif_features(photos: list) -> Dict[str, "np.ndarray"]:
+        """EXIF特征（缺失值为NaN，评分时按不满足处理）"""
+        def column(values: list) -> "np.ndarray":
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float32)
+
+        return {
+            "focal": column([p.focal_length for p in photos]),
+            "iso": column([p.iso for p in photos]),
+            "shutter": column([p.shutter for p in photos]),
+            "aperture": column([p.aperture for p in photos]),
+            "hour": column([p.taken_at.hour if p.taken_at else None for p in photos]),
+            "macro_lens": np.array(
+                [bool(p.lens) and ("macro" in p.lens.lower() or "微距" in p.lens) for p in photos],
+                dtype=np.float32,
+            ),
+        }
+
+    @staticmethod
+    def _score(f: Dict[str, "np.ndarray"]) -> "np.ndarray":
+        """
+        各类别的规则评分（加权和，0~1）
+
+        Returns:
+            (N, len(LOCAL_CATEGORIES)) 数组，列顺序同 LOCAL_CATEGORIES
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            hour = f["hour"]
+            night_hour = ((hour >= 19) | (hour <= 5)).astype(np.float32)
+            high_iso = np.nan_to_num(_ramp(np.log2(f["iso"] / 400), 0.0, 3.0))
+            long_shutter = (f["shutter"] >= 1 / 30).astype(np.float32)
+            wide = np.nan_to_num(_ramp(f["focal"], 70.0, 35.0))
+            tele = np.nan_to_num(_ramp(f["focal"], 60.0, 100.0))
+            portrait_focal = np.nan_to_num(_ramp(f["focal"], 35.0, 50.0) * _ramp(f["focal"], 200.0, 135.0))
+            wide_aperture = np.nan_to_num(_ramp(f["aperture"], 4.0, 2.0))
+
+        focus = f["center_focus"]
+        night = (
+            0.35 * _ramp(f["brightness"], 0.35, 0.12)
+            + 0.15 * _ramp(f["highlight"] * (f["dark"] > 0.5), 0.0, 0.05)
+            + 0.2 * night_hour
+            + 0.2 * high_iso
+            + 0.1 * long_shutter
+        )
+        landscape = (
+            0.3 * _ramp(f["sky"], 0.0, 0.35)
+            + 0.25 * _ramp(f["green"], 0.0, 0.35)
+            + 0.2 * wide
+            + 0.15 * _ramp(focus, 2.0, 1.0)
+            + 0.1 * _ramp(f["brightness"], 0.25, 0.45)
+        )
+        macro = (
+            0.4 * f["macro_lens"]
+            + 0.3 * _ramp(focus, 1.5, 3.5)
+            + 0.15 * tele
+            + 0.15 * _ramp(f["saturation"], 0.2, 0.45)
+        )
+        portrait = (
+            0.4 * _ramp(f["skin"], 0.05, 0.3)
+            + 0.25 * portrait_focal
+            + 0.2 * _ramp(focus, 1.2, 2.7)
+            + 0.15 * wide_aperture
+        )
+        return np.stack([night, landscape, macro, portrait], axis=1)
@@ -2,19 +2,95 @@
 扫描服务模块
 负责扫描SD卡目录、解析照片信息
 """
+import os
+import time
+import threading
 from pathlib import Path
-from typing import List, Dict, Any
-from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Iterable, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Executor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from sqlalchemy.orm import Session
 
 from ..core.utils import (
-    calculate_sha1, 
-    generate_thumbnail, 
+    read_file_once,
+    missing_thumb_widths,
+    render_thumbnails,
+    store_thumbnails,
     parse_exif, 
-    find_matching_raw,
+    compute_dhash,
+    SidecarIndex,
     JPG_EXTENSIONS,
 )
+from ..core.config import get_settings
 from ..db.photos_repo import PhotosRepository
+from ..db.fingerprints_repo import FingerprintRepository
+from .thumbnail_service import get_thumbnail_renderer
+
+
+# 缩略图进程池崩溃（工作进程被杀、解码器崩溃等）后最多重建的次数，超过后本次扫描不再生成缩略图
+THUMB_POOL_MAX_RESTARTS = 3
+
+
+class ScanProgress:
+    """
+    扫描进度（扫描线程写入，API线程读取）
+    
+    各阶段计数：
+    - discovered：已发现的JPG文件
+    - hashed：已读取并计算SHA1/EXIF
+    - thumbnailed：已通过缩略图阶段（含缩略图已存在或延迟生成）
+    - inserted：已写入数据库
+    - skipped：指纹未变化而跳过
+    - failed：处理失败
+    """
+    
+    STAGES = ("discovered", "hashed", "thumbnailed", "inserted", "skipped", "failed")
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {stage: 0 for stage in self.STAGES}
+        self._started_at = time.monotonic()
+        self.discovery_done = False
+        self.cancel_event = threading.Event()
+    
+    def start(self) -> None:
+        """开始计时（排队中的任务在开始执行时调用，排队时间不计入已用时间和吞吐量）"""
+        with self._lock:
+            self._started_at = time.monotonic()
+    
+    def add(self, stage: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[stage] += n
+    
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        当前进度快照
+        
+        Returns:
+            各阶段计数，以及已用时间、吞吐量（张/秒）和预计剩余时间（秒，发现阶段未结束时为None）
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            elapsed = time.monotonic() - self._started_at
+        done = counts["inserted"] + counts["skipped"] + counts["failed"]
+        throughput = done / elapsed if elapsed > 0 else 0.0
+        
+        eta = None
+        if self.discovery_done and throughput > 0:
+            eta = round(max(counts["discovered"] - done, 0) / throughput, 1)
+        
+        return {
+            **counts,
+            "processed": done,
+            "discovery_done": self.discovery_done,
+            "elapsed": round(elapsed, 1),
+            "throughput": round(throughput, 2),
+            "eta": eta,
+        }
 
 
 class ScannerService:
@@ -23,16 +99,20 @@ class ScannerService:
     def __init__(self, db: Session):
         self.db = db
         self.repo = PhotosRepository(db)
+        self.fingerprints = FingerprintRepository(db)
+        self.settings = get_settings()
+        # 目录级RAW/伴随文件索引，扫描与预览共用（每个目录只scandir一次）
+        self.sidecars = SidecarIndex()
+        self.progress = ScanProgress()
+        self.include_photos = True
     
-    def scan_directory(self, sd_path: str) -> Dict[str, Any]:
+    @staticmethod
+    def check_directory(sd_path: str) -> Path:
         """
-        扫描指定目录下的所有照片
-        
-        Args:
-            sd_path: SD卡或照片目录路径
+        检查扫描目录是否有效
         
-        Returns:
-            扫描结果统计
+        Raises:
+            ValueError: 目录不存在、不是文件夹或没有读取权限
         """
         sd_root = Path(sd_path)
         
@@ -48,88 +128,388 @@ class ScannerService:
         except PermissionError:
             raise ValueError(f"没有权限访问该目录，请以管理员身份运行或检查权限: {sd_path}")
         
-        # 查找所有JPG文件
-        jpg_files = self._find_all_jpg(sd_root)
+        return sd_root
+    
+    def scan_directory(
+        self,
+        sd_path: str,
+        progress: Optional[ScanProgress] = None,
+        include_photos: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        扫描指定目录下的所有照片
+        
+        Args:
+            sd_path: SD卡或照片目录路径
+            progress: 进度对象（后台任务用于推送进度和取消扫描）
+            include_photos: 结果中是否包含完整的照片信息；为False时只返回 photo_ids，
+                避免大卡扫描时在内存中堆积所有照片字典
         
-        if not jpg_files:
-            return {
-                "total_found": 0,
-                "new_imported": 0,
-                "duplicates": 0,
-                "with_raw": 0,
-                "photos": [],
-                "message": "该目录下未找到任何JPG照片，请确认路径正确"
-            }
+        Returns:
+            扫描结果统计
+        """
+        sd_root = self.check_directory(sd_path)
+        if progress is not None:
+            self.progress = progress
+        self.include_photos = include_photos
+        photos_key = "photos" if include_photos else "photo_ids"
         
         # 处理每张照片
         results = {
-            "total_found": len(jpg_files),
+            "total_found": 0,
             "new_imported": 0,
             "duplicates": 0,
             "with_raw": 0,
-            "photos": [],
+            "unchanged": 0,
+            "thumb_failed": 0,
+            photos_key: [],
             "errors": [],
         }
         
-        for jpg_path in jpg_files:
-            try:
-                photo_data = self._process_single_photo(jpg_path)
-                
-                # 保存到数据库
-                photo, is_new = self.repo.upsert_by_sha1(photo_data)
-                
-                if is_new:
-                    results["new_imported"] += 1
-                    if photo.raw_path:
-                        results["with_raw"] += 1
-                else:
-                    results["duplicates"] += 1
-                
-                results["photos"].append(photo.to_dict())
-                
-            except Exception as e:
-                results["errors"].append({
-                    "file": str(jpg_path),
-                    "error": str(e)
-                })
+        # 流式发现文件，并按指纹跳过未变化的文件（增量扫描）
+        file_stats: Dict[str, Tuple[int, int]] = {}
+        jpg_files = self._iter_files_to_process(sd_root, results, file_stats)
         
-        # 提交所有更改到数据库
-        self.db.commit()
+        # 流水线：文件发现 → I/O线程池(SHA1/EXIF/RAW) → 进程池(缩略图) → 批量写库
+        batch_size = self.settings.scan_batch_size
+        batch: List[Dict[str, Any]] = []
+        
+        for photo_data in self._run_pipeline(jpg_files, results):
+            batch.append(photo_data)
+            if len(batch) >= batch_size:
+                self._write_batch(batch, results, file_stats)
+                batch = []
+        
+        if batch:
+            self._write_batch(batch, results, file_stats)
+        
+        if self.progress.cancelled:
+            results["cancelled"] = True
+            results["message"] = f"扫描已取消：已发现{results['total_found']}张照片，新导入{results['new_imported']}张，重复{results['duplicates']}张"
+            return results
+        
+        if results["total_found"] == 0:
+            results["message"] = "该目录下未找到任何JPG照片，请确认路径正确"
+            return results
         
         results["message"] = f"扫描完成：发现{results['total_found']}张照片，新导入{results['new_imported']}张，重复{results['duplicates']}张"
+        if results["unchanged"]:
+            results["message"] += f"（其中{results['unchanged']}张未变化，已跳过）"
+        if results["thumb_failed"]:
+            results["message"] += f"，{results['thumb_failed']}张缩略图未生成（浏览时按需生成）"
         
         return results
     
-    def _find_all_jpg(self, root: Path) -> List[Path]:
+    def _collect_photos(self, results: Dict[str, Any], photos: List[Dict[str, Any]]) -> None:
+        """把照片记入扫描结果（完整信息或只记ID）"""
+        if self.include_photos:
+            results["photos"].extend(photos)
+        else:
+            results["photo_ids"].extend(p["id"] for p in photos)
+    
+    def _iter_files_to_process(
+        self,
+        root: Path,
+        results: Dict[str, Any],
+        file_stats: Dict[str, Tuple[int, int]],
+    ) -> Iterator[Path]:
+        """
+        流式产出需要处理的JPG文件
+        目录遍历结果按批查询指纹，未变化的文件直接计入结果，其余交给流水线
+        扫描被取消时停止产出，流水线处理完在途文件后结束
+        
+        Args:
+            root: 扫描根目录
+            results: 扫描结果（累加 total_found / unchanged 等）
+            file_stats: 输出参数，记录 {文件路径: (大小, 修改时间ns)} 供写入指纹
+        """
+        chunk: List[Tuple[Path, int, int]] = []
+        chunk_size = self.settings.scan_batch_size
+        
+        for item in self._iter_jpg_files(root):
+            if self.progress.cancelled:
+                return
+            results["total_found"] += 1
+            self.progress.add("discovered")
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield from self._skip_unchanged(chunk, results, file_stats)
+                chunk = []
+        
+        if chunk:
+            yield from self._skip_unchanged(chunk, results, file_stats)
+        self.progress.discovery_done = True
+    
+    def _skip_unchanged(
+        self,
+        chunk: List[Tuple[Path, int, int]],
+        results: Dict[str, Any],
+        file_stats: Dict[str, Tuple[int, int]],
+    ) -> List[Path]:
+        """
+        根据文件指纹 (路径, 大小, 修改时间) 过滤掉未变化的文件
+        
+        Args:
+            chunk: [(文件路径, 大小, 修改时间ns), ...]
+        
+        Returns:
+            需要处理的文件列表
+        """
+        for jpg_path, size, mtime_ns in chunk:
+            file_stats[str(jpg_path)] = (size, mtime_ns)
+        
+        known = self.fingerprints.get_by_paths([str(item[0]) for item in chunk])
+        
+        # 指纹匹配的候选文件：{文件路径: 内容SHA1}
+        candidates = {
+            path: fp.sha1
+            for path, fp in known.items()
+            if (fp.file_size, fp.mtime_ns) == file_stats[path]
+        }
+        if not candidates:
+            return [item[0] for item in chunk]
+        
+        # 照片记录可能已被删除，只有仍在库中的才能跳过
+        existing = {p["sha1"]: p for p in self.repo.get_scan_rows_by_sha1_list(list(set(candidates.values())))}
+        
+        to_process = []
+        unchanged = []
+        for jpg_path, _, _ in chunk:
+            photo = existing.get(candidates.get(str(jpg_path)))
+            if photo is None:
+                to_process.append(jpg_path)
+                continue
+            unchanged.append(photo)
+        
+        results["unchanged"] += len(unchanged)
+        results["duplicates"] += len(unchanged)
+        self._collect_photos(results, unchanged)
+        self.progress.add("skipped", len(unchanged))
+        
+        return to_process
+    
+    def _write_batch(
+        self,
+        batch: List[Dict[str, Any]],
+        results: Dict[str, Any],
+        file_stats: Dict[str, Tuple[int, int]],
+    ) -> None:
+        """
+        批量写入数据库（仅在调用线程中操作Session，避免SQLite线程安全问题）
+        使用原生批量upsert，同时记录文件指纹，供下次增量扫描使用
+        """
+        try:
+            written = self.repo.bulk_upsert_by_sha1(batch)
+            
+            fingerprint_entries = []
+            for photo_data in batch:
+                stat = file_stats.get(photo_data["file_path"])
+                if stat:
+                    fingerprint_entries.append((photo_data["file_path"], stat[0], stat[1], photo_data["sha1"]))
+            self.fingerprints.upsert_many(fingerprint_entries)
+        except Exception as e:
+            self.db.rollback()
+            results["errors"].extend(
+                {"file": photo_data.get("file_path"), "error": str(e)} for photo_data in batch
+            )
+            self.progress.add("failed", len(batch))
+            return
+        
+        results["new_imported"] += written["new"]
+        results["duplicates"] += written["duplicates"]
+        results["with_raw"] += written["with_raw"]
+        self._collect_photos(results, written["photos"])
+        
+        # 每批提交一次，避免长事务
+        self.db.commit()
+        self.progress.add("inserted", len(batch))
+        
+        # 重新入库的照片清除之前的渲染失败记录（原图可能已修复），缺失的缩略图可再次按需渲染
+        renderer = get_thumbnail_renderer()
+        renderer.forget_failures([p["sha1"] for p in batch])
+        
+        # 延迟生成缩略图：交给后台预热线程（按需请求优先）
+        if self.settings.scan_defer_thumbnails:
+            renderer.enqueue([(p["sha1"], p["file_path"], None) for p in batch])
+            renderer.start_warmer(sweep=False)
+    
+    def _create_thumb_executor(self) -> Executor:
         """
-        递归查找目录下所有JPG文件
+        创建缩略图执行器
+        缩略图解码/缩放是CPU密集型操作，默认使用进程池绕过GIL
         """
-        jpg_files = []
+        workers = self.settings.scan_thumb_workers or os.cpu_count() or 1
+        if self.settings.scan_use_process_pool:
+            return ProcessPoolExecutor(max_workers=workers)
+        return ThreadPoolExecutor(max_workers=workers)
+    
+    def _run_pipeline(self, jpg_files: Iterable[Path], results: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        多阶段并行处理流水线，按完成顺序产出照片数据
+        
+        - 阶段1（I/O线程池）：读取文件一次，计算SHA1、解析EXIF、查找RAW
+        - 阶段2（缩略图进程池）：用阶段1读入的缓冲区解码、缩放并编码缩略图
+          （缩略图均已存在或设置了延迟生成时跳过本阶段；编码结果由调用线程写入缩略图存储）
+        - 在途文件数受 scan_queue_size 限制，防止大卡扫描时内存无限增长
+        - 缩略图生成失败或进程池崩溃不影响入库：照片照常产出并计入 thumb_failed，
+          崩溃的进程池会被重建（最多 THUMB_POOL_MAX_RESTARTS 次）
         
-        for ext in JPG_EXTENSIONS:
-            jpg_files.extend(root.rglob(f"*{ext}"))
+        Args:
+            jpg_files: JPG文件路径序列
+            results: 扫描结果（处理失败的文件追加到 errors，缩略图未生成的照片计入 thumb_failed）
+        """
+        settings = self.settings
+        max_in_flight = settings.scan_queue_size
+        files = iter(jpg_files)
+        exhausted = False
         
-        # 去重并排序
-        jpg_files = list(set(jpg_files))
-        jpg_files.sort()
+        io_pending: Dict[Future, Path] = {}
+        thumb_pending: Dict[Future, Dict[str, Any]] = {}
+        thumb_pool: Optional[Executor] = self._create_thumb_executor()
+        restarts = 0
         
-        return jpg_files
+        with ThreadPoolExecutor(max_workers=settings.scan_io_workers) as io_pool:
+            try:
+                while True:
+                    # 补充任务直到在途数量达到上限
+                    while not exhausted and len(io_pending) + len(thumb_pending) < max_in_flight:
+                        jpg_path = next(files, None)
+                        if jpg_path is None:
+                            exhausted = True
+                            break
+                        io_pending[io_pool.submit(self._process_single_photo, jpg_path)] = jpg_path
+                    
+                    if not io_pending and not thumb_pending:
+                        break
+                    
+                    done, _ = wait(list(io_pending) + list(thumb_pending), return_when=FIRST_COMPLETED)
+                    
+                    for future in done:
+                        if future in io_pending:
+                            jpg_path = io_pending.pop(future)
+                            try:
+                                photo_data, data, missing = future.result()
+                            except Exception as e:
+                                results["errors"].append({"file": str(jpg_path), "error": str(e)})
+                                self.progress.add("failed")
+                                continue
+                            self.progress.add("hashed")
+                            thumb_future = None
+                            while missing and thumb_pool is not None:
+                                try:
+                                    thumb_future = thumb_pool.submit(render_thumbnails, jpg_path, missing, data)
+                                    break
+                                except BrokenProcessPool:
+                                    # 之前提交的任务使进程池崩溃：重建后重新提交，超过重建次数则不再生成缩略图
+                                    thumb_pool.shutdown(wait=False, cancel_futures=True)
+                                    thumb_pool = None
+                                    if restarts < THUMB_POOL_MAX_RESTARTS:
+                                        restarts += 1
+                                        print(f"缩略图进程池已崩溃，正在重建（第{restarts}次）")
+                                        thumb_pool = self._create_thumb_executor()
+                                    else:
+                                        print("缩略图进程池多次崩溃，本次扫描剩余照片不再生成缩略图")
+                            if thumb_future is not None:
+                                thumb_pending[thumb_future] = photo_data
+                                continue
+                            if missing:
+                                results["thumb_failed"] += 1
+                            self.progress.add("thumbnailed")
+                            yield photo_data
+                        else:
+                            photo_data = thumb_pending.pop(future)
+                            try:
+                                store_thumbnails(photo_data["sha1"], future.result())
+                            except Exception as e:
+                                # 缩略图失败不影响入库（与单线程版本行为一致）
+                                print(f"生成缩略图失败 {photo_data['file_path']}: {e}")
+                                results["thumb_failed"] += 1
+                            self.progress.add("thumbnailed")
+                            yield photo_data
+            finally:
+                if thumb_pool is not None:
+                    thumb_pool.shutdown(wait=True, cancel_futures=True)
     
-    def _process_single_photo(self, jpg_path: Path) -> Dict[str, Any]:
+    def _iter_jpg_files(self, root: Path) -> Iterator[Tuple[Path, int, int]]:
         """
-        处理单张照片：解析EXIF、计算SHA1、生成缩略图、查找RAW
+        单次遍历目录树，流式产出所有JPG文件（扩展名不区分大小写）
+        
+        - 迭代式 os.scandir，每个目录只列举一次（代替每种扩展名一次的rglob）
+        - 同一次列举中顺便建立该目录的RAW/伴随文件索引
+        - 复用 DirEntry 的 stat 结果（Windows上无需额外系统调用），供指纹比对
+        - 不跟随目录符号链接，避免循环
+        
+        Yields:
+            (文件路径, 大小, 修改时间ns)
         """
-        # 计算SHA1
-        sha1 = calculate_sha1(jpg_path)
+        jpg_exts = {ext.lower() for ext in JPG_EXTENSIONS}
+        stack = [root]
         
-        # 解析EXIF
-        exif_data = parse_exif(jpg_path)
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+            
+            subdirs = []
+            jpgs = []
+            sidecar_map: Dict[str, Dict[str, Path]] = {}
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(Path(entry.path))
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                
+                stem, ext = self.sidecars.split_name(entry.name)
+                if ext in jpg_exts:
+                    jpgs.append(entry)
+                elif self.sidecars.is_indexed_extension(ext):
+                    sidecar_map.setdefault(stem, {})[ext] = Path(entry.path)
+            
+            # 先登记本目录的伴随文件索引，再产出JPG，后续查找RAW无需再次scandir
+            self.sidecars.add_directory(directory, sidecar_map)
+            
+            for entry in jpgs:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield Path(entry.path), st.st_size, st.st_mtime_ns
+            
+            # 逆序入栈，保证按名称顺序遍历子目录
+            stack.extend(reversed(subdirs))
+    
+    def _process_single_photo(self, jpg_path: Path) -> tuple[Dict[str, Any], bytes, Dict[str, int]]:
+        """
+        处理单张照片的I/O阶段：计算SHA1、解析EXIF和感知哈希、查找RAW
+        （缩略图在流水线的下一阶段生成，此方法在I/O线程池中执行，不操作数据库）
         
-        # 生成缩略图
-        generate_thumbnail(jpg_path, sha1)
+        Returns:
+            (照片数据, 文件内容, 缺失的缩略图变体及宽度)
+            文件内容交给缩略图阶段复用，避免再次读卡
+        """
+        # 读取文件一次，同时计算SHA1
+        data, sha1 = read_file_once(jpg_path)
+        
+        # 从同一份缓冲区解析EXIF和计算感知哈希（近似重复/连拍检测用）
+        exif_data = parse_exif(jpg_path, data=data)
+        dhash = compute_dhash(jpg_path, data=data)
+        
+        # 延迟生成缩略图时不进入缩略图阶段，也不必保留文件内容
+        if self.settings.scan_defer_thumbnails:
+            missing: Dict[str, int] = {}
+            data = b""
+        else:
+            missing = missing_thumb_widths(sha1)
         
         # 查找匹配的RAW文件
-        raw_path = find_matching_raw(jpg_path)
+        raw_path = self.sidecars.find_raw(jpg_path)
         
         # 组装照片数据
         photo_data = {
@@ -137,6 +517,7 @@ class ScannerService:
             "file_path": str(jpg_path),
             "raw_path": str(raw_path) if raw_path else None,
             "sha1": sha1,
+            "dhash": dhash,
             "taken_at": exif_data.get("taken_at"),
             "camera_model": exif_data.get("camera_model"),
             "lens": exif_data.get("lens"),
@@ -147,7 +528,7 @@ class ScannerService:
             "category": "未分类",
         }
         
-        return photo_data
+        return photo_data, data, missing
     
     def get_scan_preview(self, sd_path: str) -> Dict[str, Any]:
         """
@@ -158,16 +539,20 @@ class ScannerService:
         if not sd_root.exists() or not sd_root.is_dir():
             return {"valid": False, "message": "目录无效"}
         
-        jpg_files = self._find_all_jpg(sd_root)
-        
+        jpg_count = 0
         raw_count = 0
-        for jpg_path in jpg_files:
-            if find_matching_raw(jpg_path):
+        sidecar_counts: Dict[str, int] = {}
+        for jpg_path, _, _ in self._iter_jpg_files(sd_root):
+            jpg_count += 1
+            if self.sidecars.find_raw(jpg_path):
                 raw_count += 1
+            for ext in self.sidecars.find_sidecars(jpg_path):
+                sidecar_counts[ext] = sidecar_counts.get(ext, 0) + 1
         
         return {
             "valid": True,
             "path": str(sd_root),
-            "jpg_count": len(jpg_files),
+            "jpg_count": jpg_count,
             "estimated_raw_count": raw_count,
+            "sidecar_counts": sidecar_counts,
         }
@@ -0,0 +1,215 @@
+"""
+缩略图按需渲染服务
+- 扫描可只入库元数据（scan_defer_thumbnails），缩略图在首次访问时渲染
+- 渲染使用有界线程池，同一SHA1的并发请求合并为一次渲染
+- 后台预热线程在空闲时（没有按需请求时）补齐剩余缩略图
+- 渲染失败（原图损坏等）的SHA1会被记住 thumb_render_failed_ttl 秒，期间的请求直接返回失败，不再重复解码；
+  重新扫描入库同一文件时清除记录，修复后的原图可立即重新渲染
+"""
+import queue
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, List, Tuple
+
+from ..core.config import get_settings
+from ..core.utils import generate_thumbnail, missing_thumb_widths
+
+
+# 最多记住的渲染失败SHA1数量（超出后淘汰最早的，过期或服务重启后清空）
+FAILED_CACHE_SIZE = 10000
+
+
+def pick_source_path(file_path: Optional[str], library_path: Optional[str]) -> Optional[Path]:
+    """选择渲染缩略图用的原图：优先图库中的副本（SD卡可能已拔出）"""
+    for candidate in (library_path, file_path):
+        if candidate and Path(candidate).exists():
+            return Path(candidate)
+    return None
+
+
+class ThumbnailRenderer:
+    """缩略图渲染器（进程内单例）"""
+
+    def __init__(self, workers: int, max_pending: int, failed_ttl: float = 600):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumb-render")
+        self._max_pending = max_pending
+        self._failed_ttl = failed_ttl
+        self._lock = threading.Lock()
+        # SHA1 → 渲染任务（用于合并同一张照片的并发请求）
+        self._inflight: Dict[str, Future] = {}
+        # 渲染失败的SHA1 → 失败时间（time.monotonic，按时间先后排列）
+        self._failed: "OrderedDict[str, float]" = OrderedDict()
+
+        # 后台预热队列：(sha1, file_path, library_path)
+        self._warm_queue: "queue.Queue[Tuple[str, Optional[str], Optional[str]]]" = queue.Queue()
+        self._warmer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ========== 按需渲染 ==========
+
+    def request(self, sha1: str, source_path: Path) -> Optional[Future]:
+        """
+        提交渲染请求
+
+        Returns:
+            渲染任务Future（同一SHA1共享同一个Future）；队列已满返回None
+        """
+        with self._lock:
+            future = self._inflight.get(sha1)
+            if future is not None:
+                return future
+            if len(self._inflight) >= self._max_pending:
+                return None
+
+            future = self._pool.submit(self._render, source_path, sha1)
+            self._inflight[sha1] = future
+
+        future.add_done_callback(lambda _: self._finish(sha1))
+        return future
+
+    def _render(self, source_path: Path, sha1: str) -> bool:
+        """渲染缩略图，失败时记住该SHA1"""
+        try:
+            ok = generate_thumbnail(source_path, sha1)
+        except Exception:
+            self._mark_failed(sha1)
+            raise
+        if not ok:
+            self._mark_failed(sha1)
+        return ok
+
+    def _mark_failed(self, sha1: str) -> None:
+        with self._lock:
+            self._failed[sha1] = time.monotonic()
+            self._failed.move_to_end(sha1)
+            while len(self._failed) > FAILED_CACHE_SIZE:
+                self._failed.popitem(last=False)
+
+    def has_failed(self, sha1: str) -> bool:
+        """该照片的缩略图是否在 failed_ttl 秒内渲染失败过"""
+        with self._lock:
+            failed_at = self._failed.get(sha1)
+            if failed_at is None:
+                return False
+            if time.monotonic() - failed_at < self._failed_ttl:
+                return True
+            del self._failed[sha1]
+            return False
+
+    def forget_failures(self, sha1s: List[str]) -> None:
+        """清除渲染失败记录（照片重新入库时调用，下次请求重新渲染）"""
+        with self._lock:
+            for sha1 in sha1s:
+                self._failed.pop(sha1, None)
+
+    def _finish(self, sha1: str) -> None:
+        with self._lock:
+            self._inflight.pop(sha1, None)
+
+    def is_busy(self) -> bool:
+        """是否有正在进行的渲染"""
+        with self._lock:
+            return bool(self._inflight)
+
+    # ========== 后台预热 ==========
+
+    def enqueue(self, items: List[Tuple[str, Optional[str], Optional[str]]]) -> None:
+        """
+        加入后台预热队列
+
+        Args:
+            items: [(sha1, file_path, library_path), ...]
+        """
+        for item in items:
+            self._warm_queue.put(item)
+
+    def start_warmer(self, sweep: bool = True) -> None:
+        """
+        启动后台预热线程
+
+        Args:
+            sweep: 启动时是否扫描数据库中所有缺少缩略图的照片
+        """
+        if self._warmer is not None:
+            return
+        self._warmer = threading.Thread(
+            target=self._warm_loop, args=(sweep,), name="thumb-warmer", daemon=True
+        )
+        self._warmer.start()
+
+    def _sweep_missing(self, page_size: int = 500) -> None:
+        """分页遍历数据库，把缺少缩略图的照片加入预热队列"""
+        from ..db.session import SessionLocal
+        from ..db.models import Photo
+
+        db = SessionLocal()
+        try:
+            last_id = 0
+            while not self._stop.is_set():
+                rows = db.query(Photo.id, Photo.sha1, Photo.file_path, Photo.library_path).filter(
+                    Photo.id > last_id
+                ).order_by(Photo.id).limit(page_size).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                self.enqueue([
+                    (row.sha1, row.file_path, row.library_path)
+                    for row in rows if missing_thumb_widths(row.sha1)
+                ])
+        finally:
+            db.close()
+
+    def _warm_loop(self, sweep: bool) -> None:
+        """预热循环：只在没有按需渲染时工作，让出资源给正在浏览的用户"""
+        if sweep:
+            try:
+                self._sweep_missing()
+            except Exception as e:
+                print(f"缩略图预热扫描失败: {e}")
+
+        while not self._stop.is_set():
+            if self.is_busy():
+                time.sleep(0.5)
+                continue
+
+            try:
+                sha1, file_path, library_path = self._warm_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if self.has_failed(sha1) or not missing_thumb_widths(sha1):
+                continue
+            source_path = pick_source_path(file_path, library_path)
+            if source_path is None:
+                continue
+
+            future = self.request(sha1, source_path)
+            if future is None:
+                # 队列已满，稍后重试
+                self._warm_queue.put((sha1, file_path, library_path))
+                time.sleep(0.5)
+                continue
+            try:
+                future.result()
+            except Exception as e:
+                print(f"缩略图预热失败 {source_path}: {e}")
+
+    def shutdown(self) -> None:
+        """停止预热线程和渲染线程池"""
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+@lru_cache()
+def get_thumbnail_renderer() -> ThumbnailRenderer:
+    """获取缩略图渲染器单例"""
+    settings = get_settings()
+    return ThumbnailRenderer(
+        workers=settings.thumb_render_workers,
+        max_pending=settings.thumb_render_queue_size,
+        failed_ttl=settings.thumb_render_failed_ttl,
+    )
@@ -0,0 +1,141 @@
+"""
+接口延迟压测脚本
+测量扫描进行时 GET /photos 的延迟是否保持平稳（需先启动后端服务）
+
+分两个阶段，每个阶段用多个并发客户端持续请求照片列表：
+1. 空闲：没有扫描任务
+2. 扫描中：同时发起一次扫描（默认用同步接口 POST /photos/scan，--job 改用后台任务接口）
+最后输出两个阶段的 p50/p95/p99/最大延迟（--cursor 改用游标分页翻页，可对比深页的延迟；
+--fields 指定返回字段，如 grid，可对比精简字段与全部字段的延迟）
+
+用法:
+    python bench_api_latency.py --sd-path "E:\\DCIM"
+    python bench_api_latency.py --sd-path /media/sd --duration 20 --concurrency 16 --job
+    python bench_api_latency.py --sd-path /media/sd --cursor
+    python bench_api_latency.py --sd-path /media/sd --cursor --fields grid
+"""
+import argparse
+import asyncio
+import math
+import time
+from typing import List, Dict, Optional
+
+import httpx
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法百分位"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+async def hammer(
+    client: httpx.AsyncClient,
+    stop_at: float,
+    latencies: List[float],
+    errors: List[str],
+    use_cursor: bool = False,
+    fields: Optional[str] = None,
+) -> None:
+    """循环请求照片列表直到截止时间，依次翻页（到最后一页后回到第一页）"""
+    page = 1
+    cursor = ""
+    base_params = {"page_size": 50, **({"fields": fields} if fields else {})}
+    while time.monotonic() < stop_at:
+        started = time.perf_counter()
+        try:
+            if use_cursor:
+                response = await client.get("/photos", params={**base_params, "cursor": cursor})
+                response.raise_for_status()
+                cursor = response.json().get("data", {}).get("next_cursor") or ""
+            else:
+                response = await client.get("/photos", params={**base_params, "page": page})
+                response.raise_for_status()
+                total_pages = response.json().get("data", {}).get("total_pages") or 1
+                page = page % total_pages + 1
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def run_phase(
+    client: httpx.AsyncClient,
+    duration: float,
+    concurrency: int,
+    use_cursor: bool = False,
+    fields: Optional[str] = None,
+) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors: List[str] = []
+    stop_at = time.monotonic() + duration
+    await asyncio.gather(*(hammer(client, stop_at, latencies, errors, use_cursor, fields) for _ in range(concurrency)))
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies, default=0.0),
+    }
+
+
+async def start_scan(client: httpx.AsyncClient, sd_path: str, use_job: bool) -> None:
+    """发起扫描；同步接口会一直等到扫描结束"""
+    if use_job:
+        response = await client.post("/jobs/scan", json={"sd_path": sd_path})
+        job = response.json().get("data") or {}
+        print(f"   扫描任务: {job.get('job_id')}")
+    else:
+        await client.post("/photos/scan", json={"sd_path": sd_path}, timeout=None)
+
+
+def print_stats(name: str, stats: Dict[str, float]) -> None:
+    print(
+        f"{name:<8} 请求 {stats['requests']:>6}  错误 {stats['errors']:>4}  "
+        f"p50 {stats['p50']:>8.1f}ms  p95 {stats['p95']:>8.1f}ms  "
+        f"p99 {stats['p99']:>8.1f}ms  max {stats['max']:>8.1f}ms"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.concurrency + 2)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0, limits=limits) as client:
+        print("=" * 50)
+        print("⏱️  接口延迟压测")
+        print("=" * 50)
+        print(f"🌐 服务地址: {args.base_url}  并发: {args.concurrency}  每阶段: {args.duration}秒")
+
+        print("▶️  阶段1：空闲")
+        idle = await run_phase(client, args.duration, args.concurrency, args.cursor, args.fields)
+
+        print("▶️  阶段2：扫描中")
+        scan_task = asyncio.create_task(start_scan(client, args.sd_path, args.job))
+        # 给扫描一点启动时间，确保测量期间扫描正在进行
+        await asyncio.sleep(1.0)
+        busy = await run_phase(client, args.duration, args.concurrency, args.cursor, args.fields)
+
+        print("-" * 50)
+        print_stats("空闲", idle)
+        print_stats("扫描中", busy)
+        if idle["p99"]:
+            print(f"📈 p99 变化: {busy['p99'] / idle['p99']:.2f}x")
+
+        if not scan_task.done():
+            print("ℹ️  扫描仍在进行，压测结束后不再等待")
+            scan_task.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="扫描期间 GET /photos 延迟压测")
+    parser.add_argument("--sd-path", required=True, help="用于扫描的照片目录")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="后端服务地址")
+    parser.add_argument("--duration", type=float, default=15.0, help="每个阶段的持续秒数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发请求数")
+    parser.add_argument("--job", action="store_true", help="使用后台任务接口发起扫描")
+    parser.add_argument("--cursor", action="store_true", help="照片列表使用游标分页（默认按页码分页）")
+    parser.add_argument("--fields", default=None, help="照片列表返回字段（如 grid，默认全部字段）")
+    asyncio.run(main(parser.parse_args()))
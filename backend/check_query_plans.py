@@ -0,0 +1,164 @@
+"""
+查询计划检查脚本
+对照片列表（各种筛选组合、游标分页）和统计查询执行 EXPLAIN，检查索引是否生效，
+修改索引或查询后运行，防止查询计划退化。支持 SQLite（EXPLAIN QUERY PLAN）和 MySQL（EXPLAIN）
+
+判定规则:
+- 全表扫描 → 失败
+- 应按索引顺序读取的照片列表出现额外排序（SQLite: USE TEMP B-TREE FOR ORDER BY；MySQL: Using filesort）→ 失败
+- 没有使用预期的索引 → 警告（优化器可能根据数据分布选择了其他索引）
+
+用法:
+    python check_query_plans.py            # 检查 .env 中配置的数据库
+    python check_query_plans.py --verbose  # 同时打印每条查询的执行计划
+
+注意：MySQL 在表中数据很少时可能直接选择全表扫描，请在有真实数据的库上运行（必要时先 ANALYZE TABLE photos）
+有失败项时退出码为1
+"""
+import re
+import sys
+from datetime import datetime
+from typing import List, Optional, NamedTuple
+
+from sqlalchemy import select, func, tuple_
+
+from app.db.session import engine, init_db, SessionLocal
+from app.db.models import Photo, PhotoStat, PhotoBucketStat
+from app.db.photos_repo import PhotosRepository, LIST_ORDER
+
+
+class PlanCheck(NamedTuple):
+    name: str
+    statement: object
+    expected_index: Optional[str]  # 预期使用的索引（None表示不检查）
+    ordered: bool                  # 是否应按索引顺序读取（不允许额外排序）
+
+
+class PlanResult(NamedTuple):
+    full_scan: bool
+    sorted: bool
+    indexes: List[str]
+    lines: List[str]
+
+
+def build_checks(repo: PhotosRepository) -> List[PlanCheck]:
+    """需要检查的查询（与 PhotosRepository、PhotoStatsRepository 中的照片列表和统计查询对应）"""
+    day = datetime(2024, 1, 1)
+
+    def page(**filters):
+        return repo.filtered_query(**filters).order_by(*LIST_ORDER).limit(51).statement
+
+    def keyset(**filters):
+        return repo.filtered_query(**filters).filter(
+            tuple_(Photo.taken_at, Photo.id) < (day, 1000)
+        ).order_by(*LIST_ORDER).limit(51).statement
+
+    return [
+        # 照片列表（list_photos / list_photos_keyset）
+        PlanCheck("照片列表", page(), "idx_photos_taken_at_id", True),
+        PlanCheck("照片列表-游标翻页", keyset(), "idx_photos_taken_at_id", True),
+        PlanCheck("照片列表-日期范围", page(date_from=day, date_to=day.replace(month=12, day=31)),
+                  "idx_photos_taken_at_id", True),
+        PlanCheck("照片列表-类别", page(category="风光"), "idx_photos_category_taken_at", True),
+        PlanCheck("照片列表-类别+游标翻页", keyset(category="风光"), "idx_photos_category_taken_at", True),
+        PlanCheck("照片列表-精选", page(is_selected=True), "idx_photos_selected_taken_at", True),
+        PlanCheck("照片列表-焦距范围", page(focal_min=200, focal_max=600), None, False),
+        PlanCheck("照片列表-ISO范围", page(iso_min=6400), None, False),
+        # 统计（get_statistics）：整天部分对聚合表按日期范围求和，两端不足一天的部分扫描照片表
+        PlanCheck(
+            "统计-聚合表日期范围",
+            select(
+                PhotoStat.category, PhotoStat.camera_model, func.sum(PhotoStat.photo_count)
+            ).where(PhotoStat.day >= day.date(), PhotoStat.day <= day.replace(month=12, day=31).date()).group_by(
+                PhotoStat.category, PhotoStat.camera_model
+            ),
+            "idx_photo_stats_day", False,
+        ),
+        PlanCheck(
+            "统计-分段聚合表日期范围",
+            select(
+                PhotoBucketStat.dimension, PhotoBucketStat.bucket, func.sum(PhotoBucketStat.photo_count)
+            ).where(
+                PhotoBucketStat.day >= day.date(), PhotoBucketStat.day <= day.replace(month=12, day=31).date()
+            ).group_by(PhotoBucketStat.dimension, PhotoBucketStat.bucket),
+            "idx_photo_bucket_stats_day", False,
+        ),
+        PlanCheck(
+            "统计-不足一天的部分",
+            select(
+                Photo.taken_at, Photo.category, Photo.camera_model, Photo.focal_length, Photo.iso, Photo.aperture
+            ).where(Photo.taken_at >= day, Photo.taken_at < day.replace(day=2)),
+            None, False,
+        ),
+    ]
+
+
+def explain(conn, statement) -> PlanResult:
+    """执行EXPLAIN并解析出是否全表扫描、是否额外排序、使用的索引"""
+    compiled = statement.compile(dialect=engine.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if engine.dialect.name == "mysql":
+        rows = conn.exec_driver_sql("EXPLAIN " + compiled.string, params).mappings().all()
+        return PlanResult(
+            full_scan=any(row["type"] == "ALL" for row in rows),
+            sorted=any("Using filesort" in (row["Extra"] or "") for row in rows),
+            indexes=[row["key"] for row in rows if row["key"]],
+            lines=[f"type={row['type']} key={row['key']} extra={row['Extra']}" for row in rows],
+        )
+
+    details = [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + compiled.string, params)]
+    return PlanResult(
+        full_scan=any(re.match(r"SCAN (TABLE )?photo", d) and "INDEX" not in d for d in details),
+        sorted=any("TEMP B-TREE FOR" in d and "ORDER BY" in d for d in details),
+        indexes=[name for d in details for name in re.findall(r"INDEX (\w+)", d)],
+        lines=details,
+    )
+
+
+def main():
+    verbose = "--verbose" in sys.argv
+
+    print("=" * 50)
+    print("🔍 查询计划检查")
+    print("=" * 50)
+    print(f"🗄️  数据库: {engine.dialect.name}")
+
+    init_db()
+    db = SessionLocal()
+    failures = 0
+    warnings = 0
+    try:
+        conn = db.connection()
+        for check in build_checks(PhotosRepository(db)):
+            plan = explain(conn, check.statement)
+            problems = []
+            if plan.full_scan:
+                problems.append("全表扫描")
+            if check.ordered and plan.sorted:
+                problems.append("额外排序")
+
+            if problems:
+                failures += 1
+                print(f"❌ {check.name}: {'、'.join(problems)}")
+            elif check.expected_index and check.expected_index not in plan.indexes:
+                warnings += 1
+                print(f"⚠️  {check.name}: 未使用 {check.expected_index}（实际: {', '.join(plan.indexes) or '无'}）")
+            else:
+                print(f"✅ {check.name}: {', '.join(plan.indexes) or '—'}")
+
+            if verbose or problems:
+                for line in plan.lines:
+                    print(f"      {line}")
+    finally:
+        db.close()
+
+    print("-" * 50)
+    print(f"失败 {failures} 项，警告 {warnings} 项")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
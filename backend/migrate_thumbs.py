@@ -0,0 +1,39 @@
+"""
+缩略图存储布局迁移脚本
+将旧的平铺缩略图（storage/thumbs/{sha1}.jpg）移动到分片布局（storage/thumbs/ab/cd/{sha1}.jpg）
+服务运行期间可直接执行，无需停机：读取缩略图时会自动回退到旧路径
+
+用法:
+    python migrate_thumbs.py            # 执行迁移
+    python migrate_thumbs.py --dry-run  # 只统计，不移动文件
+"""
+import sys
+
+from app.core.config import get_settings
+from app.core.thumbs import migrate_flat_thumbs
+
+
+def main():
+    dry_run = "--dry-run" in sys.argv
+    settings = get_settings()
+    
+    print("=" * 50)
+    print("📦 缩略图存储布局迁移工具")
+    print("=" * 50)
+    print(f"📁 缩略图目录: {settings.thumbs_path}")
+    
+    if settings.thumb_layout != "sharded":
+        print("ℹ️  当前配置为平铺布局（THUMB_LAYOUT=flat），无需迁移")
+        return
+    
+    stats = migrate_flat_thumbs(dry_run=dry_run)
+    
+    prefix = "[预览] " if dry_run else ""
+    print(f"✅ {prefix}迁移: {stats['moved']} 个文件")
+    print(f"✅ {prefix}已存在（删除旧文件）: {stats['duplicates']} 个")
+    if stats["skipped"]:
+        print(f"ℹ️  跳过非缩略图文件: {stats['skipped']} 个")
+
+
+if __name__ == "__main__":
+    main()
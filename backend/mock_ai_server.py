@@ -0,0 +1,93 @@
+"""
+本地模拟AI服务（OpenAI兼容的 /v1/chat/completions）
+用于在不消耗真实配额的情况下测试AI分类的并发、限速和重试
+
+- 随机返回一个类别的分类JSON；一条消息含多张图片时返回按序号对应的JSON数组
+- 可模拟响应延迟、服务端限流（超过并发上限时返回429）和随机5xx错误
+- 结束时（Ctrl+C）打印收到的请求数和峰值并发
+
+用法:
+    python mock_ai_server.py                                  # 监听 127.0.0.1:9000
+    python mock_ai_server.py --latency 0.8 --max-concurrent 16 --error-rate 0.02
+
+然后在 .env 中设置:
+    AI_BASE_URL=http://127.0.0.1:9000/v1
+    AI_API_KEY=mock
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+CATEGORIES = ["人像", "风光", "街拍", "建筑", "美食", "夜景", "动物", "活动", "微距"]
+
+
+def create_app(latency: float, max_concurrent: int, error_rate: float) -> FastAPI:
+    app = FastAPI(title="Mock AI Server")
+    stats = {"requests": 0, "in_flight": 0, "peak": 0, "throttled": 0, "errors": 0}
+
+    def completion(content: str) -> dict:
+        return {
+            "id": f"mock-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        }
+
+    def classify_result() -> dict:
+        category = random.choice(CATEGORIES)
+        return {"category": category, "tags": [category, "测试"], "caption": f"模拟{category}", "confidence": 0.9}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        stats["requests"] += 1
+
+        if max_concurrent and stats["in_flight"] >= max_concurrent:
+            stats["throttled"] += 1
+            return JSONResponse({"error": {"message": "rate limited"}}, status_code=429, headers={"Retry-After": "1"})
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "mock server error"}}, status_code=503)
+
+        stats["in_flight"] += 1
+        stats["peak"] = max(stats["peak"], stats["in_flight"])
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            stats["in_flight"] -= 1
+
+        # 一条消息中有多张图片时（批量分类），按序号返回结果数组
+        content = payload["messages"][-1]["content"]
+        images = [part for part in content if isinstance(part, dict) and part.get("type") == "image_url"]
+        if len(images) > 1:
+            results = [{"index": i, **classify_result()} for i in range(len(images))]
+            return completion(json.dumps(results, ensure_ascii=False))
+        return completion(json.dumps(classify_result(), ensure_ascii=False))
+
+    @app.on_event("shutdown")
+    async def report():
+        print(
+            f"📊 请求 {stats['requests']}，峰值并发 {stats['peak']}，"
+            f"429 {stats['throttled']}，5xx {stats['errors']}"
+        )
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟AI服务（OpenAI兼容）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.5, help="每个请求的响应延迟（秒）")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="并发超过该值时返回429（0=不限）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回503的比例")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency, args.max_concurrent, args.error_rate), host=args.host, port=args.port)
@@ -30,12 +30,15 @@ def reset_database():
     
     # 2. 清空缩略图目录
     if THUMBS_PATH.exists():
-        # 删除目录下所有文件
+        # 删除目录下所有文件（包括分片子目录）
         count = 0
         for f in THUMBS_PATH.glob("*"):
             if f.is_file():
                 f.unlink()
                 count += 1
+            elif f.is_dir():
+                count += sum(1 for p in f.rglob("*") if p.is_file())
+                shutil.rmtree(f)
         print(f"✅ 已清空缩略图: {count} 个文件")
     else:
         print(f"ℹ️  缩略图目录不存在: {THUMBS_PATH}")
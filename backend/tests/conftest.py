@@ -0,0 +1,76 @@
+"""
+测试公共fixture：每个测试使用独立的内存SQLite数据库
+"""
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 与运行 backend 下的脚本一样，以 backend 目录为导入根
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import get_settings  # noqa: E402
+from app.core.thumbs import get_thumb_store  # noqa: E402
+from app.db import models  # noqa: E402,F401  确保模型被加载
+from app.db.session import Base  # noqa: E402
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def thumbs_dir(tmp_path, monkeypatch):
+    """缩略图写入临时目录（文件存储、分片布局）"""
+    settings = get_settings()
+    monkeypatch.setattr(settings, "thumbs_dir", str(tmp_path / "thumbs"))
+    monkeypatch.setattr(settings, "thumb_store", "files")
+    monkeypatch.setattr(settings, "thumb_layout", "sharded")
+    get_thumb_store.cache_clear()
+    yield settings.thumbs_path
+    get_thumb_store.cache_clear()
+
+
+def write_jpeg(path: Path, color=(200, 80, 40), size=(1200, 800)) -> Path:
+    """写入一张纯色JPG"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size, color).save(path, "JPEG", quality=90)
+    return path
+
+
+def photo_data(i: int, **overrides) -> dict:
+    """构造一张照片的入库数据（bulk_upsert_by_sha1 的输入格式）"""
+    data = {
+        "file_name": f"DSC{i:05d}.JPG",
+        "file_path": f"/card/DSC{i:05d}.JPG",
+        "raw_path": None,
+        "taken_at": datetime(2024, 1, 1),
+        "camera_model": "ILCE-7M4",
+        "focal_length": 50.0,
+        "iso": 100,
+        "aperture": 2.8,
+        "category": "未分类",
+        "sha1": f"{i:040x}",
+    }
+    data.update(overrides)
+    return data
@@ -0,0 +1,151 @@
+"""
+AI分类：模型回复解析与失败回退（使用桩客户端，不发出网络请求）
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import get_settings
+from app.services import ai_service
+from app.services.ai_client import ProviderLimits, provider_limits
+from app.services.ai_service import AIService
+
+
+class StubClient:
+    """按顺序返回预设回复内容的 VisionClient 替身"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.payloads = []
+        self.requests = 0
+        self.retries = 0
+        self.max_concurrency = 2
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+    async def chat_completion(self, payload):
+        self.payloads.append(payload)
+        self.requests += 1
+        reply = self.replies.pop(0) if self.replies else "{}"
+        if isinstance(reply, Exception):
+            raise reply
+        return {"choices": [{"message": {"content": reply}}]}
+
+
+def photos(count):
+    return [SimpleNamespace(sha1=f"{i:040x}") for i in range(count)]
+
+
+@pytest.fixture
+def service(db, monkeypatch):
+    monkeypatch.setattr(ai_service, "read_thumb", lambda sha1, *args: b"jpeg")
+    service = AIService(db)
+    service._fallbacks = 0
+    return service
+
+
+def use_batch_size(service, batch_size):
+    service.settings = service.settings.model_copy(update={"ai_batch_size": batch_size})
+
+
+def classify_chunk(service, client, items):
+    return asyncio.run(service._classify_chunk(client, items))
+
+
+def test_single_reply_as_json_list_is_a_per_photo_failure(service):
+    client = StubClient(['["风光"]', '"风光"'])
+    [result] = classify_chunk(service, client, photos(1))
+    assert result["success"] is False
+    # 无法解析的回复重新请求一次
+    assert client.requests == 2
+
+
+def test_single_reply_with_unknown_category_is_rejected(service):
+    client = StubClient([json.dumps({"category": "宇宙"}), json.dumps({"category": "风光", "tags": ["山"]})])
+    [result] = classify_chunk(service, client, photos(1))
+    assert result == {"success": True, "category": "风光", "tags": ["山"], "caption": None}
+
+
+def test_request_error_is_a_per_photo_failure(service):
+    client = StubClient([RuntimeError("连接失败")])
+    [result] = classify_chunk(service, client, photos(1))
+    assert result == {"success": False, "error": "连接失败"}
+
+
+def test_batch_falls_back_to_single_for_invalid_items(service):
+    batch_reply = json.dumps([
+        {"index": 0, "category": "人像"},
+        ["风光"],
+        {"index": 2, "category": "宇宙"},
+    ])
+    client = StubClient([batch_reply, json.dumps({"category": "夜景"}), json.dumps({"category": "美食"})])
+    results = classify_chunk(service, client, photos(3))
+    assert [r["category"] for r in results] == ["人像", "夜景", "美食"]
+    assert service._fallbacks == 2
+
+
+def test_batch_sends_all_images_in_one_request(service):
+    batch_reply = "```json\n" + json.dumps({"results": [
+        {"index": 2, "category": "美食"},
+        {"index": 0, "category": "人像"},
+        {"index": 1, "category": "风光"},
+    ]}) + "\n```"
+    client = StubClient([batch_reply])
+    results = classify_chunk(service, client, photos(3))
+    assert [r["category"] for r in results] == ["人像", "风光", "美食"]
+    assert client.requests == 1
+    images = [part for part in client.payloads[0]["messages"][0]["content"] if part["type"] == "image_url"]
+    assert len(images) == 3
+    assert service._fallbacks == 0
+
+
+def test_failed_batch_request_falls_back_to_single_requests(service):
+    client = StubClient([RuntimeError("超时"), json.dumps({"category": "人像"}), json.dumps({"category": "风光"})])
+    results = classify_chunk(service, client, photos(2))
+    assert [r["category"] for r in results] == ["人像", "风光"]
+    assert client.requests == 3
+    assert service._fallbacks == 2
+
+
+def test_missing_thumbnail_is_not_sent(service, monkeypatch):
+    monkeypatch.setattr(ai_service, "read_thumb", lambda sha1, *args: None)
+    client = StubClient([])
+    [result] = classify_chunk(service, client, photos(1))
+    assert result == {"success": False, "error": "缩略图不存在"}
+    assert client.requests == 0
+
+
+def test_classify_all_keeps_other_results_when_a_reply_is_malformed(service, monkeypatch):
+    use_batch_size(service, 1)
+    client = StubClient([
+        json.dumps({"category": "风光"}),
+        '["风光"]', '["风光"]',
+        json.dumps({"category": "人像"}),
+    ])
+    monkeypatch.setattr(ai_service, "VisionClient", lambda settings, max_concurrency: client)
+
+    outcomes, stats = asyncio.run(service._classify_all(photos(3), max_concurrency=1))
+    assert [o["success"] for o in outcomes] == [True, False, True]
+    assert stats["requests"] == 4
+
+
+def test_provider_limits_are_keyed_by_base_url_host():
+    settings = get_settings().model_copy(update={
+        "ai_base_url": "http://127.0.0.1:9000/v1",
+        "ai_max_concurrency": 8,
+        "ai_rate_limit": 0,
+        "ai_rate_burst": 1,
+        "ai_provider_limits": {
+            "127.0.0.1:9000": {"max_concurrency": 32},
+            "https://api.example.com/v1": {"rate_limit": 2, "rate_burst": 4},
+        },
+    })
+    assert provider_limits(settings) == ProviderLimits(32, 0.0, 1)
+    assert provider_limits(settings, "https://api.example.com/v1/") == ProviderLimits(8, 2.0, 4)
+    assert provider_limits(settings, "https://other.example.com/v1") == ProviderLimits(8, 0.0, 1)
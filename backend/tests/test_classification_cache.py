@@ -0,0 +1,48 @@
+"""
+AI分类缓存：按最近使用时间淘汰
+"""
+from datetime import datetime, timedelta
+
+from app.db.models import ClassificationCache
+from app.db.classification_cache_repo import ClassificationCacheRepository
+
+
+def sha1(i: int) -> str:
+    return f"{i:040x}"
+
+
+def test_evict_removes_exactly_excess_from_one_batch(db):
+    repo = ClassificationCacheRepository(db)
+    # 同一批写入的记录最近使用时间相同
+    repo.put_many({sha1(i): {"category": "风光"} for i in range(1200)}, "model", "v1")
+
+    assert repo.evict(max_entries=1000) == 200
+    assert repo.count() == 1000
+    # 时间相同时按id淘汰，先写入的先淘汰
+    remaining = {row.sha1 for row in db.query(ClassificationCache.sha1)}
+    assert remaining == {sha1(i) for i in range(200, 1200)}
+
+
+def test_evict_keeps_recently_used(db):
+    repo = ClassificationCacheRepository(db)
+    repo.put_many({sha1(i): {"category": "风光"} for i in range(10)}, "model", "v1")
+    db.query(ClassificationCache).update({ClassificationCache.last_used_at: datetime.now() - timedelta(hours=1)})
+    db.commit()
+    assert set(repo.get_many([sha1(0), sha1(1)], "model", "v1")) == {sha1(0), sha1(1)}
+
+    assert repo.evict(max_entries=3) == 7
+    remaining = {row.sha1 for row in db.query(ClassificationCache.sha1)}
+    assert sha1(0) in remaining and sha1(1) in remaining
+
+
+def test_evict_by_ttl(db):
+    repo = ClassificationCacheRepository(db)
+    repo.put_many({sha1(i): {"category": "风光"} for i in range(4)}, "model", "v1")
+    db.query(ClassificationCache).filter(ClassificationCache.sha1.in_([sha1(0), sha1(1)])).update(
+        {ClassificationCache.last_used_at: datetime.now() - timedelta(days=40)}, synchronize_session=False
+    )
+    db.commit()
+
+    assert repo.evict(max_entries=0, ttl_days=30) == 2
+    assert repo.count() == 2
+    assert repo.evict(max_entries=10) == 0
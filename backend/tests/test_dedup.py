@@ -0,0 +1,61 @@
+"""
+近似重复分组：多索引哈希分组结果与两两比较一致
+"""
+import random
+from itertools import combinations
+
+import pytest
+
+from app.services.dedup_service import cluster_hashes, hamming_distance
+
+
+def brute_force_clusters(hashes, max_distance):
+    parent = list(range(len(hashes)))
+
+    def find(x):
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    for a, b in combinations(range(len(hashes)), 2):
+        if hamming_distance(hashes[a], hashes[b]) <= max_distance:
+            parent[find(a)] = find(b)
+
+    clusters = {}
+    for i in range(len(hashes)):
+        clusters.setdefault(find(i), []).append(i)
+    return normalize(c for c in clusters.values() if len(c) > 1)
+
+
+def normalize(clusters):
+    return sorted(sorted(c) for c in clusters)
+
+
+def noisy_hashes(rng, bases, copies, max_flips):
+    hashes = []
+    for _ in range(bases):
+        base = rng.getrandbits(64)
+        for _ in range(rng.randint(1, copies)):
+            value = base
+            for _ in range(rng.randint(0, max_flips)):
+                value ^= 1 << rng.randrange(64)
+            hashes.append(value)
+    rng.shuffle(hashes)
+    return hashes
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("max_distance", [0, 2, 4, 6, 7])
+def test_cluster_hashes_matches_brute_force(seed, max_distance):
+    rng = random.Random(seed)
+    hashes = noisy_hashes(rng, bases=15, copies=8, max_flips=9)
+    assert normalize(cluster_hashes(hashes, max_distance)) == brute_force_clusters(hashes, max_distance)
+
+
+def test_identical_hashes_form_one_cluster():
+    assert normalize(cluster_hashes([5, 7, 5, 5], 0)) == [[0, 2, 3]]
+
+
+def test_max_distance_out_of_range():
+    with pytest.raises(ValueError):
+        cluster_hashes([1, 2], 8)
@@ -0,0 +1,152 @@
+"""
+后台任务队列：重启恢复、排队中任务的取消、运行中扫描的取消与进度计时
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.db.jobs_repo import JobsRepository
+from app.services import job_service
+from app.services.job_service import JobManager
+
+
+@pytest.fixture
+def manager(engine, monkeypatch):
+    """任务记录写入测试数据库、单工作线程的任务管理器"""
+    monkeypatch.setattr(job_service, "SessionLocal", sessionmaker(bind=engine, autocommit=False, autoflush=False))
+    manager = JobManager(workers=1, retention_days=30)
+    yield manager
+    manager.shutdown()
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """把任务执行函数替换为只记录调用的替身"""
+    calls = []
+
+    def record(job_type):
+        def handler(db, params, progress):
+            calls.append(job_type)
+            return {"ok": True}
+        return handler
+
+    for job_type in job_service.JOB_HANDLERS:
+        monkeypatch.setitem(job_service.JOB_HANDLERS, job_type, record(job_type))
+    return calls
+
+
+@pytest.fixture
+def blocker(monkeypatch):
+    """类型为 block 的任务阻塞到测试放行为止，用于让后续任务保持排队"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def handler(db, params, progress):
+        started.set()
+        release.wait(5)
+        return {}
+
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "block", handler)
+    yield started, release
+    release.set()
+
+
+def wait_finished(manager: JobManager, job_id: str, timeout: float = 5) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job["status"] in ("completed", "failed", "cancelled"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"任务未在{timeout}秒内结束: {manager.get(job_id)}")
+
+
+def test_submitted_job_runs_to_completion(manager, handlers):
+    job = manager.submit("organize", {"library_root": "/library"})
+
+    finished = wait_finished(manager, job["job_id"])
+
+    assert finished["status"] == "completed"
+    assert finished["attempts"] == 1
+    assert handlers == ["organize"]
+
+
+def test_resume_requeues_unfinished_jobs_and_fails_interrupted_exports(manager, handlers, db):
+    repo = JobsRepository(db)
+    interrupted_scan = repo.create("scan", {"sd_path": "/card"}).id
+    interrupted_export = repo.create("export", {"export_dir": "/out"}).id
+    pending_export = repo.create("export", {"export_dir": "/out"}).id
+    repo.mark_running(interrupted_scan)
+    repo.mark_running(interrupted_export)
+
+    assert manager.resume() == 2
+
+    failed = wait_finished(manager, interrupted_export)
+    assert failed["status"] == "failed"
+    assert "中断" in failed["error"]
+    assert wait_finished(manager, interrupted_scan)["status"] == "completed"
+    assert wait_finished(manager, pending_export)["status"] == "completed"
+    assert sorted(handlers) == ["export", "scan"]
+
+
+def test_cancelled_pending_job_never_runs(manager, handlers, blocker):
+    started, release = blocker
+    running = manager.submit("block", {})
+    assert started.wait(5)
+    queued = manager.submit("organize", {"library_root": "/library"})
+
+    assert manager.cancel(queued["job_id"])
+    release.set()
+
+    assert wait_finished(manager, queued["job_id"])["status"] == "cancelled"
+    assert wait_finished(manager, running["job_id"])["status"] == "completed"
+    assert handlers == []
+    assert manager.cancel(queued["job_id"]) is False
+
+
+def test_unknown_job_type_is_rejected(manager):
+    with pytest.raises(ValueError):
+        manager.submit("defrag", {})
+
+
+def test_running_scan_stops_when_cancelled(manager, monkeypatch):
+    started = threading.Event()
+
+    def scan(db, params, progress):
+        started.set()
+        while not progress.cancelled:
+            progress.add("discovered")
+            time.sleep(0.01)
+        return {"cancelled": True}
+
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "scan", scan)
+    job = manager.submit("scan", {"sd_path": "/card"})
+    assert started.wait(5)
+    assert manager.live_status(job["job_id"])["status"] == "running"
+
+    assert manager.cancel(job["job_id"])
+
+    finished = wait_finished(manager, job["job_id"])
+    assert finished["status"] == "cancelled"
+    assert finished["progress"]["discovered"] > 0
+
+
+def test_progress_clock_starts_when_the_job_runs(manager, blocker, monkeypatch):
+    started, release = blocker
+    elapsed_at_start = []
+
+    def scan(db, params, progress):
+        elapsed_at_start.append(progress.snapshot()["elapsed"])
+        return {}
+
+    monkeypatch.setitem(job_service.JOB_HANDLERS, "scan", scan)
+    manager.submit("block", {})
+    assert started.wait(5)
+    job = manager.submit("scan", {"sd_path": "/card"})
+    time.sleep(0.5)
+    release.set()
+
+    wait_finished(manager, job["job_id"])
+    assert elapsed_at_start == [0.0]
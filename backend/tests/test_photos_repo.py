@@ -0,0 +1,76 @@
+"""
+照片数据仓库：游标分页
+"""
+from datetime import datetime, timedelta
+
+from app.db.photos_repo import PhotosRepository
+
+from conftest import photo_data
+
+
+def test_keyset_paging_across_ties_and_null_taken_at(db):
+    repo = PhotosRepository(db)
+    tie = datetime(2024, 5, 1, 12, 0, 0)
+    rows = []
+    for i in range(23):
+        if i % 5 == 0:
+            taken_at = None
+        elif i % 3 == 0:
+            taken_at = tie  # 大量相同拍摄时间，只能靠id区分先后
+        else:
+            taken_at = tie - timedelta(minutes=i)
+        rows.append(photo_data(i, taken_at=taken_at))
+    repo.bulk_upsert_by_sha1(rows)
+    db.commit()
+
+    expected = sorted(
+        ((p.taken_at, p.id) for p in repo.filtered_query().all()),
+        key=lambda key: (key[0] is not None, key[0] or datetime.min, key[1]),
+        reverse=True,
+    )
+
+    for page_size in (1, 2, 4, 7, 50):
+        seen = []
+        cursor = None
+        while True:
+            photos, cursor = repo.list_photos_keyset(cursor=cursor, page_size=page_size)
+            seen.extend((p.taken_at, p.id) for p in photos)
+            if cursor is None:
+                break
+        assert seen == expected, page_size
+
+
+def test_keyset_paging_with_filter(db):
+    repo = PhotosRepository(db)
+    repo.bulk_upsert_by_sha1([
+        photo_data(i, category="风光" if i % 2 else "人像", taken_at=None if i % 4 == 1 else datetime(2024, 1, 1))
+        for i in range(12)
+    ])
+    db.commit()
+
+    ids = []
+    cursor = None
+    while True:
+        photos, cursor = repo.list_photos_keyset(cursor=cursor, page_size=2, category="风光")
+        ids.extend(p.id for p in photos)
+        if cursor is None:
+            break
+    assert sorted(ids) == sorted(p.id for p in repo.filtered_query(category="风光").all())
+    assert len(ids) == len(set(ids)) == 6
+
+
+def test_bulk_upsert_counts_actual_inserts(db):
+    repo = PhotosRepository(db)
+    first = repo.bulk_upsert_by_sha1([
+        photo_data(0, raw_path="/card/DSC00000.ARW"),
+        photo_data(1),
+        photo_data(1, file_path="/card/copy/DSC00001.JPG"),  # 同批次重复
+    ])
+    assert (first["new"], first["duplicates"], first["with_raw"]) == (2, 1, 1)
+
+    second = repo.bulk_upsert_by_sha1([
+        photo_data(0, raw_path="/card/DSC00000.ARW"),
+        photo_data(2, raw_path="/card/DSC00002.ARW"),
+    ])
+    assert (second["new"], second["duplicates"], second["with_raw"]) == (1, 1, 1)
+    assert {p["sha1"] for p in second["photos"]} == {photo_data(0)["sha1"], photo_data(2)["sha1"]}
@@ -0,0 +1,23 @@
+"""
+查询计划：照片列表与统计查询使用预期的索引（与 check_query_plans.py 的判定规则一致）
+"""
+import pytest
+
+from app.db.photos_repo import PhotosRepository
+from check_query_plans import build_checks, explain
+
+
+@pytest.fixture
+def checks(db):
+    return build_checks(PhotosRepository(db))
+
+
+def test_query_plans(db, checks):
+    conn = db.connection()
+    for check in checks:
+        plan = explain(conn, check.statement)
+        assert not plan.full_scan, (check.name, plan.lines)
+        if check.ordered:
+            assert not plan.sorted, (check.name, plan.lines)
+        if check.expected_index:
+            assert check.expected_index in plan.indexes, (check.name, plan.lines)
@@ -0,0 +1,70 @@
+"""
+缩略图渲染：快速模式下按变体选用EXIF内嵌缩略图
+"""
+import io
+
+import piexif
+import pytest
+from PIL import Image
+
+from app.core.config import get_settings
+from app.core.utils import render_thumbnails
+
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+
+
+def jpeg_with_embedded_thumbnail(size=(1200, 800), thumb_size=(300, 200)) -> bytes:
+    """红色原图，内嵌蓝色EXIF缩略图（通过颜色区分变体来自哪张图）"""
+    thumb = io.BytesIO()
+    Image.new("RGB", thumb_size, BLUE).save(thumb, "JPEG")
+    exif = piexif.dump({"0th": {}, "Exif": {}, "1st": {piexif.ImageIFD.Compression: 6}, "thumbnail": thumb.getvalue()})
+    out = io.BytesIO()
+    Image.new("RGB", size, RED).save(out, "JPEG", exif=exif)
+    return out.getvalue()
+
+
+def center_color(thumb_bytes: bytes):
+    with Image.open(io.BytesIO(thumb_bytes)) as img:
+        return img.convert("RGB").getpixel((img.width // 2, img.height // 2))
+
+
+def is_close(color, expected) -> bool:
+    return all(abs(a - b) <= 10 for a, b in zip(color, expected))
+
+
+@pytest.fixture
+def jpg_path(monkeypatch, tmp_path):
+    """快速模式、JPEG编码下的照片路径（内容由测试直接传入）"""
+    settings = get_settings()
+    monkeypatch.setattr(settings, "thumb_quality_mode", "fast")
+    monkeypatch.setattr(settings, "thumb_variant_format", "jpeg")
+    monkeypatch.setattr(settings, "thumb_grid_width", 256)
+    return tmp_path / "photo.jpg"
+
+
+def test_embedded_thumbnail_is_used_only_for_variants_it_covers(jpg_path):
+    rendered = render_thumbnails(jpg_path, {"grid": 256, "preview": 512, "lightbox": 1600}, jpeg_with_embedded_thumbnail())
+
+    assert is_close(center_color(rendered["grid"]), BLUE)
+    assert is_close(center_color(rendered["preview"]), RED)
+    assert is_close(center_color(rendered["lightbox"]), RED)
+    with Image.open(io.BytesIO(rendered["preview"])) as img:
+        assert img.size == (512, 341)
+
+
+def test_embedded_thumbnail_with_different_aspect_is_ignored(jpg_path):
+    data = jpeg_with_embedded_thumbnail(thumb_size=(320, 240))
+
+    rendered = render_thumbnails(jpg_path, {"grid": 256}, data)
+
+    assert is_close(center_color(rendered["grid"]), RED)
+
+
+def test_small_embedded_thumbnail_falls_back_to_the_original(jpg_path):
+    data = jpeg_with_embedded_thumbnail(thumb_size=(160, 107))
+
+    rendered = render_thumbnails(jpg_path, {"grid": 256, "preview": 512}, data)
+
+    assert is_close(center_color(rendered["grid"]), RED)
+    assert is_close(center_color(rendered["preview"]), RED)
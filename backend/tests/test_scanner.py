@@ -0,0 +1,135 @@
+"""
+扫描流水线：入库与缩略图、增量重扫、空目录结果、取消、缩略图进程池崩溃后的恢复
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from conftest import write_jpeg
+from app.core.config import get_settings
+from app.core.thumbs import thumb_exists
+from app.services import scanner_service
+from app.services.scanner_service import ScannerService, ScanProgress
+
+
+@pytest.fixture
+def scan_settings(thumbs_dir, monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "scan_use_process_pool", False)
+    monkeypatch.setattr(settings, "scan_thumb_workers", 2)
+    monkeypatch.setattr(settings, "scan_defer_thumbnails", False)
+    monkeypatch.setattr(settings, "scan_batch_size", 2)
+    return settings
+
+
+@pytest.fixture
+def card(tmp_path):
+    root = tmp_path / "card" / "DCIM"
+    for i, color in enumerate([(255, 0, 0), (0, 255, 0), (0, 0, 255)]):
+        write_jpeg(root / f"DSC{i:05d}.JPG", color=color, size=(640, 480))
+    (root / "DSC00000.ARW").write_bytes(b"raw")
+    return root
+
+
+class BreakingExecutor(ThreadPoolExecutor):
+    """前 broken_submits 次提交抛出 BrokenProcessPool 的执行器，模拟工作进程崩溃"""
+
+    def __init__(self, broken_submits: int):
+        super().__init__(max_workers=1)
+        self.broken_submits = broken_submits
+
+    def submit(self, fn, *args, **kwargs):
+        if self.broken_submits:
+            self.broken_submits -= 1
+            raise BrokenProcessPool("工作进程异常退出")
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_scan_imports_photos_with_thumbnails(db, scan_settings, card):
+    result = ScannerService(db).scan_directory(str(card))
+
+    assert result["total_found"] == 3
+    assert result["new_imported"] == 3
+    assert result["with_raw"] == 1
+    assert result["errors"] == []
+    assert result["thumb_failed"] == 0
+    for photo in result["photos"]:
+        assert all(thumb_exists(photo["sha1"], v) for v in ("grid", "preview", "lightbox"))
+
+
+def test_rescan_skips_unchanged_files(db, scan_settings, card):
+    ScannerService(db).scan_directory(str(card))
+
+    result = ScannerService(db).scan_directory(str(card))
+    assert result["unchanged"] == 3
+    assert result["new_imported"] == 0
+
+    changed = card / "DSC00001.JPG"
+    write_jpeg(changed, color=(9, 9, 9), size=(640, 480))
+    stat = changed.stat()
+    os.utime(changed, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    result = ScannerService(db).scan_directory(str(card))
+    assert result["unchanged"] == 2
+    assert result["new_imported"] == 1
+
+
+def test_empty_directory_returns_the_same_result_shape(db, scan_settings, card, tmp_path):
+    empty = tmp_path / "empty"
+    empty.mkdir()
+
+    empty_result = ScannerService(db).scan_directory(str(empty))
+    full_result = ScannerService(db).scan_directory(str(card))
+
+    assert empty_result.keys() == full_result.keys()
+    assert empty_result["total_found"] == 0
+    assert empty_result["errors"] == []
+
+
+def test_cancelled_scan_stops_discovery(db, scan_settings, card):
+    progress = ScanProgress()
+    progress.cancel_event.set()
+
+    result = ScannerService(db).scan_directory(str(card), progress=progress)
+
+    assert result["cancelled"] is True
+    assert result["new_imported"] == 0
+    assert result["message"].startswith("扫描已取消")
+
+
+def test_broken_thumbnail_pool_is_recreated(db, scan_settings, card, monkeypatch):
+    pools = []
+
+    def create_executor(self):
+        pools.append(BreakingExecutor(broken_submits=1 if not pools else 0))
+        return pools[-1]
+
+    monkeypatch.setattr(ScannerService, "_create_thumb_executor", create_executor)
+
+    result = ScannerService(db).scan_directory(str(card))
+
+    assert len(pools) == 2
+    assert result["new_imported"] == 3
+    assert result["thumb_failed"] == 0
+    assert result["errors"] == []
+
+
+def test_repeatedly_broken_pool_stops_thumbnailing_without_failing_the_scan(db, scan_settings, card, monkeypatch):
+    pools = []
+
+    def create_executor(self):
+        pools.append(BreakingExecutor(broken_submits=10))
+        return pools[-1]
+
+    monkeypatch.setattr(ScannerService, "_create_thumb_executor", create_executor)
+    monkeypatch.setattr(scanner_service, "THUMB_POOL_MAX_RESTARTS", 1)
+
+    result = ScannerService(db).scan_directory(str(card))
+
+    assert len(pools) == 2
+    assert result["new_imported"] == 3
+    assert result["thumb_failed"] == 3
+    assert result["errors"] == []
+    assert "缩略图未生成" in result["message"]
@@ -0,0 +1,50 @@
+"""
+RAW/伴随文件匹配：大小写不敏感、按目录修改时间失效的共享索引
+"""
+import os
+
+from app.core import utils
+from app.core.utils import SidecarIndex, find_matching_raw
+
+
+def touch_dir(directory, seconds: int) -> None:
+    """把目录修改时间往后推，模拟粗粒度文件系统上的目录变化"""
+    stat = directory.stat()
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10**9))
+
+
+def test_raw_is_matched_case_insensitively(tmp_path):
+    (tmp_path / "IMG_0001.jpg").write_bytes(b"jpg")
+    (tmp_path / "img_0001.ARW").write_bytes(b"raw")
+    (tmp_path / "IMG_0001.ARW.xmp").write_bytes(b"xmp")
+
+    index = SidecarIndex()
+
+    assert index.find_raw(tmp_path / "IMG_0001.jpg") == tmp_path / "img_0001.ARW"
+    assert index.find_sidecars(tmp_path / "IMG_0001.jpg") == {".xmp": tmp_path / "IMG_0001.ARW.xmp"}
+
+
+def test_find_matching_raw_reuses_the_directory_listing(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "_shared_sidecars", SidecarIndex(revalidate=True))
+    scans = []
+    original_scan = SidecarIndex._scan_dir
+    monkeypatch.setattr(SidecarIndex, "_scan_dir", lambda self, d: scans.append(d) or original_scan(self, d))
+    for i in range(3):
+        (tmp_path / f"DSC{i:05d}.JPG").write_bytes(b"jpg")
+        (tmp_path / f"DSC{i:05d}.ARW").write_bytes(b"raw")
+
+    for i in range(3):
+        assert find_matching_raw(tmp_path / f"DSC{i:05d}.JPG") == tmp_path / f"DSC{i:05d}.ARW"
+    assert scans == [tmp_path]
+
+
+def test_find_matching_raw_sees_files_added_later(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "_shared_sidecars", SidecarIndex(revalidate=True))
+    jpg = tmp_path / "DSC00001.JPG"
+    jpg.write_bytes(b"jpg")
+    assert find_matching_raw(jpg) is None
+
+    (tmp_path / "DSC00001.NEF").write_bytes(b"raw")
+    touch_dir(tmp_path, 2)
+
+    assert find_matching_raw(jpg) == tmp_path / "DSC00001.NEF"
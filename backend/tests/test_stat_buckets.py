@@ -0,0 +1,26 @@
+"""
+统计分段：Python分段与SQL CASE分段结果一致
+"""
+import pytest
+from sqlalchemy import Float, literal, select
+
+from app.db.stat_buckets import FOCAL_BUCKETS, ISO_BUCKETS, APERTURE_BUCKETS, Bucket, BucketTable
+
+
+@pytest.mark.parametrize("table, values", [
+    (FOCAL_BUCKETS, [None, 0, 8, 23.9, 24, 34, 35, 50, 84.5, 85, 135, 136, 600]),
+    (ISO_BUCKETS, [None, 0, 50, 200, 201, 800, 801, 3200, 3201, 102400]),
+    (APERTURE_BUCKETS, [None, 0, 0.95, 2.8, 2.9, 5.6, 5.7, 22]),
+])
+def test_label_matches_case(engine, table, values):
+    with engine.connect() as conn:
+        for value in values:
+            expression = table.case(literal(value, Float))
+            assert conn.execute(select(expression)).scalar() == table.label(value), value
+
+
+def test_last_bucket_must_be_unbounded():
+    with pytest.raises(ValueError):
+        BucketTable("测试", [Bucket("a", 1), Bucket("b", 2)])
+    with pytest.raises(ValueError):
+        BucketTable("测试", [Bucket("a", None), Bucket("b", None)])
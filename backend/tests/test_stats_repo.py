@@ -0,0 +1,93 @@
+"""
+统计聚合表：增删改照片后按聚合表统计的结果与直接扫描照片表一致
+"""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.models import Photo
+from app.db.photos_repo import PhotosRepository
+from app.db.stat_buckets import FOCAL_BUCKETS, ISO_BUCKETS, APERTURE_BUCKETS
+
+from conftest import photo_data
+
+
+def scan_statistics(db, date_from=None, date_to=None):
+    """逐行扫描照片表统计（对照）"""
+    stats = {
+        "total": 0, "with_raw": 0, "selected": 0,
+        "categories": {}, "focal_lengths": {}, "isos": {}, "apertures": {}, "cameras": {},
+    }
+    for photo in db.query(Photo):
+        if (date_from or date_to) and photo.taken_at is None:
+            continue
+        if (date_from and photo.taken_at < date_from) or (date_to and photo.taken_at > date_to):
+            continue
+        stats["total"] += 1
+        stats["with_raw"] += 1 if photo.raw_path else 0
+        stats["selected"] += 1 if photo.is_selected else 0
+        for key, label in (
+            ("categories", photo.category),
+            ("cameras", photo.camera_model),
+            ("focal_lengths", FOCAL_BUCKETS.label(photo.focal_length)),
+            ("isos", ISO_BUCKETS.label(photo.iso)),
+            ("apertures", APERTURE_BUCKETS.label(photo.aperture)),
+        ):
+            if label:
+                stats[key][label] = stats[key].get(label, 0) + 1
+    return stats if stats["total"] else {"total": 0}
+
+
+RANGES = [
+    (None, None),
+    (datetime(2024, 1, 3), None),
+    (None, datetime(2024, 1, 5, 12)),
+    (datetime(2024, 1, 2, 6), datetime(2024, 1, 7, 18)),
+    (datetime(2024, 1, 4, 1), datetime(2024, 1, 4, 9)),
+    (datetime(2025, 1, 1), datetime(2025, 2, 1)),
+]
+
+
+@pytest.fixture
+def repo(db):
+    rng = random.Random(7)
+
+    def random_photo(i):
+        return photo_data(
+            i,
+            raw_path=f"/card/DSC{i:05d}.ARW" if rng.random() < 0.5 else None,
+            taken_at=None if rng.random() < 0.1 else datetime(2024, 1, 1) + timedelta(seconds=rng.randrange(10 * 86400)),
+            camera_model=rng.choice(["ILCE-7M4", "EOS R6", None]),
+            focal_length=rng.choice([None, 0, 20, 50, 200]),
+            iso=rng.choice([None, 100, 1600, 6400]),
+            aperture=rng.choice([None, 1.8, 4.0, 8.0]),
+            category=rng.choice(["风光", "人像", "未分类"]),
+        )
+
+    repo = PhotosRepository(db)
+    repo.bulk_upsert_by_sha1([random_photo(i) for i in range(300)])
+    for i in range(300, 320):
+        repo.upsert_by_sha1(random_photo(i))
+    db.commit()
+
+    ids = [row.id for row in db.query(Photo.id)]
+    repo.batch_delete_photos(rng.sample(ids, 30))
+    ids = [row.id for row in db.query(Photo.id)]
+    for photo_id in rng.sample(ids, 40):
+        repo.update_photo(photo_id, {"category": "夜景", "is_selected": rng.randint(0, 1), "raw_path": None})
+    repo.batch_update_category(rng.sample(ids, 20), "动物")
+    repo.batch_update_photos(rng.sample(ids, 20), {"is_selected": 1})
+    return repo
+
+
+@pytest.mark.parametrize("date_from, date_to", RANGES)
+def test_statistics_match_scan(db, repo, date_from, date_to):
+    assert repo.get_statistics(date_from, date_to) == scan_statistics(db, date_from, date_to)
+
+
+def test_rebuild_matches_incremental(db, repo):
+    before = [repo.get_statistics(*r) for r in RANGES]
+    repo.stats.rebuild()
+    db.commit()
+    assert [repo.get_statistics(*r) for r in RANGES] == before
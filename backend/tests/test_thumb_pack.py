@@ -0,0 +1,84 @@
+"""
+打包缩略图存储：写入、删除、压缩与重新加载
+"""
+from app.core.thumb_pack import PackedThumbStore
+
+
+def payload(i: int, size: int = 300) -> bytes:
+    return bytes([i % 251]) * size
+
+
+def test_put_read_delete(tmp_path):
+    store = PackedThumbStore(tmp_path, segment_max_bytes=1000)
+    for i in range(10):
+        store.put(f"{i}.jpg", payload(i))
+
+    assert store.exists("3.jpg")
+    assert store.read("3.jpg") == payload(3)
+    assert store.local_path("3.jpg") is None
+
+    assert store.delete("3.jpg") == 1
+    assert not store.exists("3.jpg")
+    assert store.read("3.jpg") is None
+    assert store.delete("3.jpg") == 0
+
+    # 覆盖写入后读到新内容
+    store.put("4.jpg", payload(99))
+    assert store.read("4.jpg") == payload(99)
+
+
+def test_compact_and_reload(tmp_path):
+    store = PackedThumbStore(tmp_path, segment_max_bytes=1000)
+    for i in range(12):
+        store.put(f"{i}.jpg", payload(i))
+    segments_before = set(store._segment_numbers())
+    for i in range(0, 12, 2):
+        store.delete(f"{i}.jpg")
+    assert store.dead_ratio() > 0
+
+    stats = store.compact()
+    assert stats["segments_removed"] > 0
+    assert stats["bytes_reclaimed"] > 0
+    assert store.dead_ratio() == 0
+    # 每个旧段都有死数据，全部被搬空删除
+    assert not segments_before & set(store._segment_numbers())
+
+    for i in range(12):
+        expected = None if i % 2 == 0 else payload(i)
+        assert store.read(f"{i}.jpg") == expected
+
+    # 压缩后重新加载索引，写入继续使用新段
+    reloaded = PackedThumbStore(tmp_path, segment_max_bytes=1000)
+    for i in range(12):
+        expected = None if i % 2 == 0 else payload(i)
+        assert reloaded.read(f"{i}.jpg") == expected
+    reloaded.put("new.jpg", payload(7))
+    assert PackedThumbStore(tmp_path, segment_max_bytes=1000).read("new.jpg") == payload(7)
+
+
+def test_compact_skips_segments_below_threshold(tmp_path):
+    store = PackedThumbStore(tmp_path, segment_max_bytes=1000)
+    for i in range(9):
+        store.put(f"{i}.jpg", payload(i))
+    # 只有第一个段（0~2）有死数据
+    store.delete("0.jpg")
+    store.delete("1.jpg")
+
+    assert store.compact(threshold=0.9) is None
+    stats = store.compact(threshold=0.5)
+    assert stats["segments_removed"] == 1
+    assert store.compact(threshold=0.5) is None
+    for i in range(2, 9):
+        assert store.read(f"{i}.jpg") == payload(i)
+
+
+def test_reload_counts_dead_bytes(tmp_path):
+    store = PackedThumbStore(tmp_path, segment_max_bytes=1000)
+    for i in range(3):
+        store.put(f"{i}.jpg", payload(i))
+    store.delete("1.jpg")
+
+    reloaded = PackedThumbStore(tmp_path, segment_max_bytes=1000)
+    assert reloaded.dead_ratio() > 0
+    assert reloaded.read("1.jpg") is None
+    assert reloaded.read("2.jpg") == payload(2)
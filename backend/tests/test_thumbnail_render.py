@@ -0,0 +1,108 @@
+"""
+缩略图按需渲染：并发请求合并、有界队列、失败记录的过期与清除、缩略图路由
+"""
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from conftest import photo_data, write_jpeg
+from app.api.routes import thumbs
+from app.core.thumbs import thumb_exists
+from app.db import get_db, PhotosRepository
+from app.services import thumbnail_service
+from app.services.thumbnail_service import ThumbnailRenderer
+
+
+@pytest.fixture
+def blocked_render(monkeypatch):
+    """渲染阻塞到测试放行为止"""
+    release = threading.Event()
+    calls = []
+
+    def generate(source_path, sha1):
+        calls.append(sha1)
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr(thumbnail_service, "generate_thumbnail", generate)
+    yield release, calls
+    release.set()
+
+
+def test_concurrent_requests_share_one_render(blocked_render, tmp_path):
+    release, calls = blocked_render
+    renderer = ThumbnailRenderer(workers=2, max_pending=4)
+
+    first = renderer.request("a" * 40, tmp_path / "a.jpg")
+    second = renderer.request("a" * 40, tmp_path / "a.jpg")
+    release.set()
+
+    assert first is second
+    assert first.result(timeout=5) is True
+    assert calls == ["a" * 40]
+    renderer.shutdown()
+
+
+def test_full_queue_rejects_new_requests(blocked_render, tmp_path):
+    release, _ = blocked_render
+    renderer = ThumbnailRenderer(workers=1, max_pending=1)
+
+    assert renderer.request("a" * 40, tmp_path / "a.jpg") is not None
+    assert renderer.request("b" * 40, tmp_path / "b.jpg") is None
+    release.set()
+    renderer.shutdown()
+
+
+def test_failures_expire_and_can_be_forgotten(monkeypatch, tmp_path):
+    monkeypatch.setattr(thumbnail_service, "generate_thumbnail", lambda source_path, sha1: False)
+
+    remembered = ThumbnailRenderer(workers=1, max_pending=4, failed_ttl=600)
+    remembered.request("a" * 40, tmp_path / "a.jpg").result(timeout=5)
+    assert remembered.has_failed("a" * 40)
+    remembered.forget_failures(["a" * 40])
+    assert not remembered.has_failed("a" * 40)
+
+    expired = ThumbnailRenderer(workers=1, max_pending=4, failed_ttl=0)
+    expired.request("a" * 40, tmp_path / "a.jpg").result(timeout=5)
+    assert not expired.has_failed("a" * 40)
+
+    remembered.shutdown()
+    expired.shutdown()
+
+
+@pytest.fixture
+def client(db, thumbs_dir, monkeypatch):
+    renderer = ThumbnailRenderer(workers=1, max_pending=4)
+    monkeypatch.setattr(thumbs, "get_thumbnail_renderer", lambda: renderer)
+    app = FastAPI()
+    app.include_router(thumbs.router)
+    app.dependency_overrides[get_db] = lambda: db
+    yield TestClient(app)
+    renderer.shutdown()
+
+
+def test_missing_thumbnail_is_rendered_on_request(client, db, tmp_path):
+    source = write_jpeg(tmp_path / "card" / "DSC00001.JPG", size=(640, 480))
+    PhotosRepository(db).bulk_upsert_by_sha1([photo_data(1, file_path=str(source))])
+    sha1 = photo_data(1)["sha1"]
+
+    response = client.get(f"/static/thumbs/{sha1}.jpg")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert thumb_exists(sha1, "grid")
+
+
+def test_unreadable_original_is_not_decoded_again(client, db, tmp_path, monkeypatch):
+    source = tmp_path / "card" / "DSC00001.JPG"
+    source.parent.mkdir(parents=True)
+    source.write_bytes(b"not a jpeg")
+    PhotosRepository(db).bulk_upsert_by_sha1([photo_data(1, file_path=str(source))])
+    sha1 = photo_data(1)["sha1"]
+
+    assert client.get(f"/static/thumbs/{sha1}.jpg").status_code == 500
+
+    monkeypatch.setattr(thumbnail_service, "generate_thumbnail", pytest.fail)
+    assert client.get(f"/static/thumbs/{sha1}.jpg").status_code == 500
@@ -6,15 +6,15 @@ import http from './http'
 /**
  * AI分类照片
  * @param {number[]} photoIds - 照片ID列表
- * @param {number} maxWorkers - 并发线程数
+ * @param {number|null} maxWorkers - 并发请求数（null则使用后端配置）
  * @param {boolean} skipClassified - 跳过已分类照片
  */
-export function classifyPhotos(photoIds, maxWorkers = 4, skipClassified = false) {
+export function classifyPhotos(photoIds, maxWorkers = null, skipClassified = false) {
   const payload = {
     photo_ids: photoIds,
-    max_workers: maxWorkers,
     skip_classified: skipClassified
   }
+  if (maxWorkers) payload.max_workers = maxWorkers
   console.log('AI classify request payload:', JSON.stringify(payload))
   console.log('photo_ids type:', typeof photoIds, 'isArray:', Array.isArray(photoIds))
   if (photoIds.length > 0) {
@@ -5,3 +5,4 @@ export * from './photos'
 export * from './ai'
 export * from './summary'
 export * from './export'
+export * from './jobs'
@@ -0,0 +1,54 @@
+/**
+ * 后台任务相关API
+ * 扫描/整理/导出/AI分类以后台任务执行，通过SSE获取进度
+ */
+import http from './http'
+
+/**
+ * 创建扫描任务
+ * @param {string} sdPath - SD卡路径
+ */
+export function createScanJob(sdPath) {
+  return http.post('/jobs/scan', { sd_path: sdPath })
+}
+
+/**
+ * 查询任务状态
+ * @param {string} jobId - 任务ID
+ */
+export function getJob(jobId) {
+  return http.get(`/jobs/${jobId}`)
+}
+
+/**
+ * 获取任务结果
+ * @param {string} jobId - 任务ID
+ */
+export function getJobResult(jobId) {
+  return http.get(`/jobs/${jobId}/result`)
+}
+
+/**
+ * 取消任务
+ * @param {string} jobId - 任务ID
+ */
+export function cancelJob(jobId) {
+  return http.post(`/jobs/${jobId}/cancel`)
+}
+
+/**
+ * 订阅任务进度（Server-Sent Events）
+ * @param {string} jobId - 任务ID
+ * @param {object} handlers - { onProgress(job), onDone(job), onError(event) }
+ * @returns {EventSource} 调用 close() 取消订阅
+ */
+export function subscribeJob(jobId, { onProgress, onDone, onError } = {}) {
+  const source = new EventSource(`${http.defaults.baseURL}/jobs/${jobId}/events`)
+  source.addEventListener('progress', (e) => onProgress?.(JSON.parse(e.data)))
+  source.addEventListener('done', (e) => {
+    source.close()
+    onDone?.(JSON.parse(e.data))
+  })
+  source.onerror = (e) => onError?.(e)
+  return source
+}